@@ -0,0 +1,86 @@
+"""Admission control: a cap on concurrent terminal sessions with a fair wait queue."""
+
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from metrics import registry
+
+
+class UnknownTicket(Exception):
+    """The ticket was never issued, was already admitted, or was abandoned."""
+
+
+@dataclass
+class Admission:
+    """Outcome of asking for a slot: admitted, or waiting at `position` (1-based)."""
+    admitted: bool
+    ticket: Optional[str] = None
+    position: int = 0
+
+
+class AdmissionQueue:
+    """Hands out up to `limit` session slots, first come first served.
+
+    A caller that can't get a slot is given a ticket and asks again with it;
+    tickets are admitted strictly in the order they were issued. A ticket
+    that isn't asked about for `ticket_ttl_seconds` is assumed abandoned and
+    gives up its place. A limit of 0 admits everyone.
+    """
+
+    def __init__(self, limit: int, ticket_ttl_seconds: float = 30):
+        self.limit = limit
+        self.ticket_ttl_seconds = ticket_ttl_seconds
+        self.in_use = 0
+        self._waiting: "OrderedDict[str, float]" = OrderedDict()  # ticket -> last seen
+        self._issued_at: Dict[str, float] = {}
+        self._queued = registry.counter("terminal.admission.queued")
+        self._abandoned = registry.counter("terminal.admission.abandoned")
+        self._wait_time = registry.histogram("terminal.admission.wait_seconds")
+        registry.gauge("terminal.admission.waiting", lambda: len(self._waiting))
+        registry.gauge("terminal.admission.in_use", lambda: self.in_use)
+
+    @property
+    def free(self) -> int:
+        if not self.limit:
+            return 1
+        return max(0, self.limit - self.in_use)
+
+    def acquire(self, ticket: Optional[str] = None) -> Admission:
+        """Take a slot for a new caller (no ticket) or a waiting one."""
+        now = time.monotonic()
+        self._prune(now)
+
+        if ticket is None:
+            if not self._waiting and self.free:
+                self.in_use += 1
+                return Admission(admitted=True)
+            ticket = str(uuid.uuid4())
+            self._waiting[ticket] = now
+            self._issued_at[ticket] = now
+            self._queued.inc()
+            return Admission(admitted=False, ticket=ticket, position=len(self._waiting))
+
+        if ticket not in self._waiting:
+            raise UnknownTicket(ticket)
+        self._waiting[ticket] = now
+        position = list(self._waiting).index(ticket) + 1
+        if position <= self.free:
+            del self._waiting[ticket]
+            self._wait_time.observe(now - self._issued_at.pop(ticket))
+            self.in_use += 1
+            return Admission(admitted=True)
+        return Admission(admitted=False, ticket=ticket, position=position)
+
+    def release(self) -> None:
+        """Give back a slot taken by `acquire`."""
+        self.in_use = max(0, self.in_use - 1)
+
+    def _prune(self, now: float) -> None:
+        for ticket, seen in list(self._waiting.items()):
+            if now - seen > self.ticket_ttl_seconds:
+                del self._waiting[ticket]
+                self._issued_at.pop(ticket, None)
+                self._abandoned.inc()
@@ -0,0 +1,32 @@
+"""add owner columns to terminal_sessions
+
+Revision ID: 7c3e9a1f2b64
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9a1f2b64'
+down_revision: Union[str, Sequence[str], None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('terminal_sessions', sa.Column('owner', sa.String(), nullable=True))
+    op.add_column('terminal_sessions', sa.Column('owner_url', sa.String(), nullable=True))
+    op.create_index(op.f('ix_terminal_sessions_owner'), 'terminal_sessions', ['owner'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_terminal_sessions_owner'), table_name='terminal_sessions')
+    op.drop_column('terminal_sessions', 'owner_url')
+    op.drop_column('terminal_sessions', 'owner')
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Content-hashed manifest of the assets served under the desk/ prefix.
+
+The manifest is generated from the local asset directory and published to
+the bucket next to the assets (desk/manifest.json). The API loads it to
+answer bundle requests and to let clients skip assets they already hold.
+
+Usage:
+    python asset_manifest.py ../desk/public
+    python asset_manifest.py ../desk/public --overlay ../desk/build/compact
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from assets import ASSET_PREFIX, content_type_for
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_file(path: str) -> str:
+    """Return the hex sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_asset_files(root: str):
+    """Yield (relative_path, absolute_path) for every asset under root."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.startswith(".") or name == MANIFEST_NAME:
+                continue
+            full_path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(full_path, root).replace(os.sep, "/")
+            yield rel_path, full_path
+
+
+def resolve_asset_files(root: str, overlay: Optional[str] = None):
+    """Yield (relative_path, file_to_publish, original_file) for every asset under root.
+
+    If overlay (e.g. the glb_compact.py output) holds a file with the same
+    relative path, that file is published instead of the original.
+    """
+    for rel_path, full_path in iter_asset_files(root):
+        published = full_path
+        if overlay:
+            candidate = os.path.join(overlay, *rel_path.split("/"))
+            if os.path.isfile(candidate):
+                published = candidate
+        yield rel_path, published, full_path
+
+
+def build_manifest(root: str, prefix: str = ASSET_PREFIX, overlay: Optional[str] = None) -> dict:
+    """Build a manifest of every asset under root, keyed by relative path."""
+    assets = {}
+    for rel_path, published, original in resolve_asset_files(root, overlay):
+        entry = {
+            "sha256": hash_file(published),
+            "size": os.path.getsize(published),
+            "type": content_type_for(rel_path),
+        }
+        if published != original:
+            entry["original_size"] = os.path.getsize(original)
+        assets[rel_path] = entry
+    return {"version": MANIFEST_VERSION, "prefix": prefix, "assets": assets}
+
+
+def write_manifest(manifest: dict, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+class ManifestCache:
+    """Loads the published manifest from the bucket and caches it for a while.
+
+    `get` reads the bucket (blocking); call it from a thread.
+    """
+
+    def __init__(self, ttl_seconds: int, retry_seconds: int = 30):
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self._manifest: Optional[dict] = None
+        self._loaded_at = 0.0
+        self._failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, s3, bucket: str) -> Optional[dict]:
+        """Return the cached manifest, reloading it once the TTL has passed.
+
+        Returns the last good manifest (or None) if the bucket can't be read,
+        and keeps doing so without asking the bucket again for retry_seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._manifest is not None and now - self._loaded_at < self.ttl_seconds:
+                return self._manifest
+            if self._failed_at is not None and now - self._failed_at < self.retry_seconds:
+                return self._manifest
+
+        try:
+            response = s3.get_object(Bucket=bucket, Key=f"{ASSET_PREFIX}/{MANIFEST_NAME}")
+            manifest = json.loads(response["Body"].read())
+        except Exception as e:
+            logger.warning(f"Failed to load asset manifest: {e}")
+            with self._lock:
+                self._failed_at = time.monotonic()
+                return self._manifest
+
+        with self._lock:
+            self._manifest = manifest
+            self._loaded_at = time.monotonic()
+            self._failed_at = None
+        return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the desk asset manifest.")
+    parser.add_argument("root", help="Local asset directory (e.g. ../desk/public)")
+    parser.add_argument("-o", "--output", help=f"Output path (default: <root>/{MANIFEST_NAME})")
+    parser.add_argument("--overlay", help="Directory of replacement files, e.g. glb_compact.py output")
+    args = parser.parse_args()
+
+    manifest = build_manifest(args.root, overlay=args.overlay)
+    output = args.output or os.path.join(args.root, MANIFEST_NAME)
+    write_manifest(manifest, output)
+    total = sum(a["size"] for a in manifest["assets"].values())
+    print(f"Wrote {output}: {len(manifest['assets'])} assets, {total} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""S3 asset helpers: client, content types, presigned URL caching and bundles."""
+
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+
+# Assets are stored under desk/ prefix in the bucket
+ASSET_PREFIX = "desk"
+
+CONTENT_TYPES = {
+    ".glb": "model/gltf-binary",
+    ".gltf": "model/gltf+json",
+    ".mp3": "audio/mpeg",
+    ".bin": "application/octet-stream",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".svg": "image/svg+xml",
+    ".mov": "video/quicktime",
+    ".mp4": "video/mp4",
+    ".json": "application/json",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+
+def get_s3_client():
+    return boto3.client(
+        's3',
+        endpoint_url=os.getenv('BUCKET_ENDPOINT'),
+        aws_access_key_id=os.getenv('BUCKET_ACCESS_KEY'),
+        aws_secret_access_key=os.getenv('BUCKET_SECRET_ACCESS_KEY'),
+        config=Config(signature_version='s3v4'),
+        region_name='auto'
+    )
+
+
+def content_type_for(path: str) -> str:
+    """Determine content type from file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(ext, "application/octet-stream")
+
+
+def parse_extensions(value: str) -> set:
+    """Parse a comma separated extension list (".glb,mp3") into a set of ".ext"."""
+    extensions = set()
+    for ext in value.split(","):
+        ext = ext.strip().lower()
+        if ext:
+            extensions.add(ext if ext.startswith(".") else f".{ext}")
+    return extensions
+
+
+@dataclass
+class _PresignedUrl:
+    url: str
+    expires_at: float
+
+
+class PresignedUrlCache:
+    """Caches presigned GET URLs per key and reuses them until near expiry.
+
+    Object sizes learned from the bucket are remembered as well, so the
+    size-threshold redirect decision doesn't need a request to S3 once a key
+    has been seen.
+
+    Keys come from request paths, so both maps are LRUs of at most
+    `max_entries` keys, and URLs are dropped once they are too close to
+    expiry to hand out.
+    """
+
+    def __init__(self, ttl_seconds: int, refresh_margin_seconds: int, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        # Never hand out a URL that expires before the client can follow it
+        self.refresh_margin_seconds = min(refresh_margin_seconds, ttl_seconds // 2)
+        self.max_entries = max_entries
+        self._urls: "OrderedDict[str, _PresignedUrl]" = OrderedDict()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_url(self, s3, bucket: str, key: str) -> str:
+        """Return a cached presigned URL for key, signing a new one if needed."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._urls.get(key)
+            if cached and self._usable(cached, now):
+                self._urls.move_to_end(key)
+                return cached.url
+            self._urls.pop(key, None)
+
+        url = s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=self.ttl_seconds,
+        )
+        with self._lock:
+            self._urls[key] = _PresignedUrl(url=url, expires_at=now + self.ttl_seconds)
+            self._urls.move_to_end(key)
+            # Least recently used first: drop what has expired there, then trim to size
+            while self._urls:
+                oldest = next(iter(self._urls.values()))
+                if len(self._urls) <= self.max_entries and self._usable(oldest, now):
+                    break
+                self._urls.popitem(last=False)
+        return url
+
+    def _usable(self, cached: _PresignedUrl, now: float) -> bool:
+        return cached.expires_at - self.refresh_margin_seconds > now
+
+    def get_size(self, key: str) -> Optional[int]:
+        with self._lock:
+            size = self._sizes.get(key)
+            if size is not None:
+                self._sizes.move_to_end(key)
+            return size
+
+    def set_size(self, key: str, size: int) -> None:
+        with self._lock:
+            self._sizes[key] = size
+            self._sizes.move_to_end(key)
+            while len(self._sizes) > self.max_entries:
+                self._sizes.popitem(last=False)
+
+
+# Bundle container: MAGIC, then per entry a big-endian u32 header length, a
+# JSON header ({"path", "status", "type", "size", "sha256"}) and `size` body
+# bytes. A zero header length terminates the bundle.
+BUNDLE_MAGIC = b"DSKB\x01"
+BUNDLE_END = struct.pack(">I", 0)
+
+
+def bundle_entry_header(path: str, status: str, size: int = 0,
+                        content_type: Optional[str] = None,
+                        sha256: Optional[str] = None) -> bytes:
+    """Encode the length-prefixed header for one bundle entry.
+
+    status is "ok" (followed by `size` body bytes), "unchanged" (the client
+    already holds this hash) or "missing".
+    """
+    header = {"path": path, "status": status, "size": size}
+    if content_type:
+        header["type"] = content_type
+    if sha256:
+        header["sha256"] = sha256
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    return struct.pack(">I", len(encoded)) + encoded
@@ -0,0 +1,121 @@
+"""Throughput of PTY output over the terminal WebSocket.
+
+Serves a throwaway app on localhost that pushes synthetic PTY chunks through
+OutputBridge, and reads them back with a real WebSocket client. Compares the
+original one-JSON-frame-per-chunk path with the framed JSON and binary paths:
+
+    uv run python benchmarks/output_framing.py --chunks 50000 --chunk-size 64
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+import uvicorn
+import websockets
+from fastapi import FastAPI, WebSocket
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from terminal_io import BINARY_SUBPROTOCOL, OutputBridge, OutputFramer, output_sender  # noqa: E402
+
+MODES = ("per-chunk", "framed-json", "framed-binary")
+
+
+def make_app(chunks: int, chunk_size: int, burst: int) -> FastAPI:
+    app = FastAPI()
+    payload = (b"x" * (chunk_size - 1)) + b"\n"
+
+    @app.websocket("/ws/{mode}")
+    async def pump(websocket: WebSocket, mode: str):
+        binary = mode == "framed-binary"
+        await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
+        bridge = OutputBridge()
+        send = output_sender(websocket, binary)
+        total = chunks * chunk_size
+        sent = 0
+
+        async def counted(data: bytes) -> None:
+            nonlocal sent
+            await send(data)
+            sent += len(data)
+
+        if mode == "per-chunk":
+            async def consume():
+                while True:
+                    await counted(await bridge.get())
+        else:
+            consume = OutputFramer(bridge, counted).run
+        consumer = asyncio.create_task(consume())
+
+        # The sandbox SDK delivers PTY output as a stream of events, awaits the
+        # callback when its buffer is full and yields between bursts
+        for i in range(chunks):
+            paused = bridge.put(payload)
+            if paused is not None:
+                await paused
+            if i % burst == burst - 1:
+                await asyncio.sleep(0)
+        while sent < total:
+            await asyncio.sleep(0.001)
+        consumer.cancel()
+        await websocket.close()
+
+    return app
+
+
+async def measure(port: int, mode: str) -> dict:
+    subprotocols = [BINARY_SUBPROTOCOL] if mode == "framed-binary" else None
+    frames = 0
+    received = 0
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/{mode}", subprotocols=subprotocols, max_size=None) as ws:
+        started = time.perf_counter()
+        try:
+            async for message in ws:
+                frames += 1
+                received += len(message)
+        except websockets.ConnectionClosed:
+            pass
+        elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "frames": frames,
+        "mb_per_s": received / elapsed / 1e6,
+        "frames_per_s": frames / elapsed,
+        "seconds": elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000, help="PTY chunks per run")
+    parser.add_argument("--chunk-size", type=int, default=64, help="bytes per chunk")
+    parser.add_argument("--burst", type=int, default=16, help="chunks delivered between yields")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    config = uvicorn.Config(make_app(args.chunks, args.chunk_size, args.burst), port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    print(f"{args.chunks} chunks x {args.chunk_size} bytes, bursts of {args.burst}")
+    print(f"{'mode':<15}{'frames':>10}{'MB/s':>10}{'frames/s':>12}{'seconds':>10}")
+    try:
+        for mode in args.modes:
+            r = await measure(port, mode)
+            print(f"{r['mode']:<15}{r['frames']:>10}{r['mb_per_s']:>10.1f}{r['frames_per_s']:>12.0f}{r['seconds']:>10.2f}")
+    finally:
+        server.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
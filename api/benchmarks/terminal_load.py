@@ -0,0 +1,332 @@
+"""Latency, throughput and memory of terminal sessions under concurrent load.
+
+Starts the API in a subprocess with the local sandbox backend (real PTYs,
+no E2B) and drives `--sessions` visitors at it at once, each through the
+same HTTP and WebSocket calls the desk terminal makes:
+
+1. start a session and connect its WebSocket, until the shell answers;
+2. type `--keystrokes` characters, timing each one's echo;
+3. send `--burst-keys` keystrokes back to back (a paste or a fast typist),
+   timing until the line they make has run;
+4. print `--output-bytes` of output, timing how fast it arrives.
+
+For the typing phases, the server's input counters give the PTY writes
+per typed character, which shows how much input batching saves.
+
+The server's memory is sampled before any session and once every session is
+connected. Results are printed as JSON (and written to `--json` if given),
+so runs can be compared across changes:
+
+    uv run python benchmarks/terminal_load.py --sessions 20 --json before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import httpx
+import websockets
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+from terminal_io import BINARY_SUBPROTOCOL  # noqa: E402
+
+# Printed by the shell once it is ready; typed split so the echoed command line doesn't match
+READY_COMMAND = b"echo RE''ADY\n"
+READY_MARKER = b"READY"
+DONE_MARKER = b"DONE"
+CLEAR_LINE = b"\x15"  # Ctrl-U
+
+
+def summarize(values: List[float], scale: float = 1.0) -> dict:
+    """Percentiles (nearest rank, as in metrics.Histogram) of `values` times `scale`."""
+    ordered = sorted(v * scale for v in values)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident memory of a process, where /proc has it."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Visitor:
+    """One simulated desk terminal: a session, its WebSocket and its output so far."""
+
+    def __init__(self, base_url: str, http: httpx.AsyncClient):
+        self.base_url = base_url
+        self.http = http
+        self.token: Optional[str] = None
+        self.ws = None
+        self.output = bytearray()
+        self._arrived = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+        self.start_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self.echo_seconds: List[float] = []
+        self.burst_seconds: Optional[float] = None
+        self.printed = 0
+        self.throughput: Optional[float] = None
+
+    async def connect(self) -> None:
+        started = time.perf_counter()
+        response = await self.http.post(f"{self.base_url}/api/terminal/session/start", json={})
+        response.raise_for_status()
+        self.token = response.json()["session_token"]
+        self.start_seconds = time.perf_counter() - started
+
+        ws_url = self.base_url.replace("http", "ws", 1) + f"/api/terminal/ws/{self.token}"
+        self.ws = await websockets.connect(
+            ws_url, subprotocols=[BINARY_SUBPROTOCOL], max_size=None, ping_interval=None,
+        )
+        self._reader = asyncio.create_task(self._read())
+        await self.send(READY_COMMAND)
+        await self.wait_for(READY_MARKER, 0)
+        self.ready_seconds = time.perf_counter() - started
+
+    async def _read(self) -> None:
+        async for message in self.ws:
+            if isinstance(message, bytes):
+                self.output += message
+                self._arrived.set()
+                continue
+            message = json.loads(message)
+            if message.get("type") == "ping":
+                await self.ws.send(json.dumps({"type": "pong", "id": message.get("id")}))
+
+    async def send(self, data: bytes) -> None:
+        await self.ws.send(json.dumps({"type": "input", "data": data.decode()}))
+
+    async def wait_for(self, needle: bytes, since: int, timeout: float = 30) -> None:
+        """Wait until `needle` appears in the output after offset `since`."""
+        deadline = time.perf_counter() + timeout
+        while self.output.find(needle, since) < 0:
+            self._arrived.clear()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"no {needle!r} within {timeout}s")
+            await asyncio.wait_for(self._arrived.wait(), remaining)
+
+    async def type_keys(self, count: int, interval: float) -> None:
+        for i in range(count):
+            key = b"abcdefghijklmnopqrstuvwxyz"[i % 26:i % 26 + 1]
+            since = len(self.output)
+            started = time.perf_counter()
+            await self.send(key)
+            await self.wait_for(key, since)
+            self.echo_seconds.append(time.perf_counter() - started)
+            await asyncio.sleep(interval)
+        await self.send(CLEAR_LINE)
+
+    async def burst(self, count: int) -> None:
+        since = len(self.output)
+        started = time.perf_counter()
+        for key in b": " + b"x" * count + b"; echo BU''RST\n":
+            await self.send(bytes([key]))
+        await self.wait_for(b"BURST", since)
+        self.burst_seconds = time.perf_counter() - started
+
+    async def print_output(self, size: int) -> None:
+        since = len(self.output)
+        started = time.perf_counter()
+        await self.send(f"head -c {size} /dev/zero | tr '\\0' x; echo; echo DO''NE\n".encode())
+        await self.wait_for(DONE_MARKER, since, timeout=120)
+        self.printed = len(self.output) - since
+        self.throughput = self.printed / (time.perf_counter() - started)
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.token:
+            await self.http.request(
+                "DELETE", f"{self.base_url}/api/terminal/session/end", json={"session_token": self.token},
+            )
+
+
+async def start_server(port: int, database_url: str, pool_size: int) -> asyncio.subprocess.Process:
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "SANDBOX_BACKEND": "local",
+        "SANDBOX_POOL_MIN_SIZE": str(pool_size),
+        "SANDBOX_POOL_MAX_SIZE": str(pool_size),
+        "TERMINAL_MAX_SESSIONS": "0",
+    }
+    server = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+        cwd=API_DIR, env=env,
+        stdout=sys.stderr,  # Keep stdout for the results
+    )
+    async with httpx.AsyncClient() as http:
+        for _ in range(300):
+            try:
+                if (await http.get(f"http://127.0.0.1:{port}/health")).status_code == 200:
+                    return server
+            except httpx.TransportError:
+                pass
+            if server.returncode is not None:
+                break
+            await asyncio.sleep(0.1)
+    server.kill()
+    raise RuntimeError("API server did not start")
+
+
+async def input_counters(http: httpx.AsyncClient, base_url: str) -> dict:
+    counters = (await http.get(f"{base_url}/api/metrics")).json()["counters"]
+    return {"chars": counters.get("terminal.input.bytes", 0), "pty_writes": counters.get("terminal.input.writes", 0)}
+
+
+def input_usage(before: dict, after: dict) -> dict:
+    chars = after["chars"] - before["chars"]
+    writes = after["pty_writes"] - before["pty_writes"]
+    return {"chars": chars, "pty_writes": writes, "writes_per_char": round(writes / chars, 3) if chars else None}
+
+
+def create_schema(database_url: str) -> None:
+    # Only for the throwaway database; a real one is set up with alembic
+    from sqlalchemy import create_engine
+
+    import models
+
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+
+    workdir = tempfile.mkdtemp(prefix="terminal-load-")
+    database_url = args.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(workdir, 'sessions.db')}"
+        create_schema(database_url)
+
+    server = await start_server(port, database_url, args.pool_size)
+    limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions)
+    try:
+        async with httpx.AsyncClient(timeout=60, limits=limits) as http:
+            visitors = [Visitor(base_url, http) for _ in range(args.sessions)]
+            rss_idle = rss_bytes(server.pid)
+
+            started = time.perf_counter()
+            connected = await asyncio.gather(*(v.connect() for v in visitors), return_exceptions=True)
+            connect_seconds = time.perf_counter() - started
+            rss_loaded = rss_bytes(server.pid)
+
+            live = [v for v, error in zip(visitors, connected) if not isinstance(error, BaseException)]
+            errors = [repr(e) for e in connected if isinstance(e, BaseException)]
+
+            counters = await input_counters(http, base_url)
+            typed = await asyncio.gather(
+                *(v.type_keys(args.keystrokes, args.keystroke_interval) for v in live), return_exceptions=True,
+            )
+            errors += [repr(e) for e in typed if isinstance(e, BaseException)]
+            typed_counters = await input_counters(http, base_url)
+
+            burst = await asyncio.gather(*(v.burst(args.burst_keys) for v in live), return_exceptions=True)
+            errors += [repr(e) for e in burst if isinstance(e, BaseException)]
+            burst_counters = await input_counters(http, base_url)
+
+            started = time.perf_counter()
+            printed = await asyncio.gather(*(v.print_output(args.output_bytes) for v in live), return_exceptions=True)
+            print_seconds = time.perf_counter() - started
+            errors += [repr(e) for e in printed if isinstance(e, BaseException)]
+
+            await asyncio.gather(*(v.close() for v in visitors), return_exceptions=True)
+    finally:
+        server.terminate()
+        await server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rates = [v.throughput for v in live if v.throughput is not None]
+    per_session = None
+    if rss_idle is not None and rss_loaded is not None and live:
+        per_session = (rss_loaded - rss_idle) // len(live)
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "keystrokes": args.keystrokes,
+            "keystroke_interval_seconds": args.keystroke_interval,
+            "burst_keys": args.burst_keys,
+            "output_bytes": args.output_bytes,
+            "pool_size": args.pool_size,
+            "backend": "local",
+        },
+        "sessions_connected": len(live),
+        "connect_all_seconds": round(connect_seconds, 3),
+        "session_start_ms": summarize([v.start_seconds for v in live], 1000),
+        "time_to_ready_ms": summarize([v.ready_seconds for v in live], 1000),
+        "echo_latency_ms": summarize([s for v in live for s in v.echo_seconds], 1000),
+        "burst_ms": summarize([v.burst_seconds for v in live if v.burst_seconds is not None], 1000),
+        "input": {
+            "typing": input_usage(counters, typed_counters),
+            "burst": input_usage(typed_counters, burst_counters),
+        },
+        "output_mb_per_s": {
+            "per_session": summarize(rates, 1e-6),
+            "aggregate": round(sum(v.printed for v in live) / 1e6 / print_seconds, 3) if live else None,
+        },
+        "server_memory": {
+            "rss_idle_bytes": rss_idle,
+            "rss_loaded_bytes": rss_loaded,
+            "per_session_bytes": per_session,
+        },
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent visitors")
+    parser.add_argument("--keystrokes", type=int, default=50, help="keys typed per visitor")
+    parser.add_argument("--keystroke-interval", type=float, default=0.02, help="pause between keys, in seconds")
+    parser.add_argument("--burst-keys", type=int, default=200, help="keys sent back to back per visitor")
+    parser.add_argument("--output-bytes", type=int, default=1_000_000, help="output printed per visitor")
+    parser.add_argument("--pool-size", type=int, default=0, help="warm sandbox pool size (0 = cold starts)")
+    parser.add_argument("--database-url", help="database for session rows (default: a throwaway SQLite file)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results here")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,92 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import time
+from typing import AsyncIterator
+
+from sqlalchemy import exc
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
+from metrics import registry
+
+# Async drivers used in place of the ones in DATABASE_URL. Alembic still
+# migrates with DATABASE_URL as written (psycopg2).
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+_checkout_wait = registry.histogram("database.pool.wait_seconds")
+_checkout_timeouts = registry.counter("database.pool.timeouts")
+
+
+def async_database_url(database_url: str) -> URL:
+    """`database_url` with its driver swapped for the async one."""
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name())
+    if drivername is None:
+        return url
+    url = url.set(drivername=drivername)
+    if drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        # asyncpg spells libpq's sslmode as ssl
+        sslmode = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+    return url
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """The async engine's queue pool, timing how long each checkout takes.
+
+    A checkout waits for a free connection when the pool and its overflow are
+    all in use, and includes opening (or pre-pinging) the connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+
+    def connect(self):
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            _checkout_timeouts.inc()
+            raise
+        finally:
+            self.waiting -= 1
+            _checkout_wait.observe(time.monotonic() - started)
+
+
+engine = create_async_engine(
+    async_database_url(settings.database_url),
+    poolclass=InstrumentedPool,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_timeout=settings.database_pool_timeout_seconds,
+    pool_recycle=settings.database_pool_recycle_seconds,
+    pool_pre_ping=settings.database_pool_pre_ping,
+)
+
+# engine.pool is read on each snapshot: dispose() replaces it
+registry.gauge("database.pool.size", lambda: engine.pool.size())
+registry.gauge("database.pool.checked_out", lambda: engine.pool.checkedout())
+registry.gauge("database.pool.idle", lambda: engine.pool.checkedin())
+registry.gauge("database.pool.overflow", lambda: max(engine.pool.overflow(), 0))
+registry.gauge("database.pool.waiting", lambda: engine.pool.waiting)
+
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: a session for the request.
 
-engine = create_engine(settings.database_url)
+    The session is closed when the request ends, however it ends, which rolls
+    back anything uncommitted and returns its connection to the pool.
+    """
+    async with SessionLocal() as db:
+        yield db
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class Base(DeclarativeBase):
     pass
@@ -1,21 +1,38 @@
-"""E2B sandbox setup and file population."""
+"""E2B sandbox setup and file population.
 
-from e2b_code_interpreter import Sandbox
+Everything a sandbox needs is packed once, at import time, into a gzipped
+tar archive (with file modes) identified by a content hash. Populating a
+sandbox is then a single upload plus a single extract command.
+"""
 
+import gzip
+import hashlib
+import io
+import tarfile
+import time
+from typing import List, Tuple
 
-def populate_example_files(sandbox: Sandbox) -> None:
-    """Populate E2B sandbox with example files."""
-    
-    # Create bin directory first
-    sandbox.commands.run("mkdir -p /home/user/bin")
-    sandbox.commands.run("echo 'export PATH=\"/home/user/bin:$PATH\"' >> /home/user/.bashrc")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # nowplaying.sh - Last.fm integration
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/nowplaying.sh",
-        '''#!/bin/bash
+from sandbox_backend import HOME_DIR, Sandbox
+
+# Appended to ~/.bashrc when the payload is extracted
+BASHRC_LINES = [
+    'export PATH="$HOME/bin:$PATH"',
+]
+
+# (path relative to HOME_DIR, mode, content)
+PAYLOAD_FILES: List[Tuple[str, int, str]] = []
+
+
+def _add_file(path: str, content: str, mode: int = 0o644) -> None:
+    PAYLOAD_FILES.append((path, mode, content))
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# nowplaying.sh - Last.fm integration
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "nowplaying.sh",
+    '''#!/bin/bash
 curl -s -X POST https://api.braelyn.ai/slurp -H "Content-Type: application/json" -d '{"event_type":"nowplaying_started"}' > /dev/null 2>&1 &
 # Fetch the last scrobbled song from Last.fm via braelyn.ai API
 
@@ -55,16 +72,16 @@ echo "🎤 $artist"
 echo "🎶 $track"
 echo "💿 $album"
 echo ""
-'''
-    )
-    sandbox.commands.run("chmod +x /home/user/nowplaying.sh")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # welcome.sh - ASCII Welcome Banner
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/welcome.sh",
-        r'''#!/bin/bash
+''',
+    mode=0o755,
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# welcome.sh - ASCII Welcome Banner
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "welcome.sh",
+    r'''#!/bin/bash
 curl -s -X POST https://api.braelyn.ai/slurp -H "Content-Type: application/json" -d '{"event_type":"welcome_started"}' > /dev/null 2>&1 &
 clear
 echo ""
@@ -81,16 +98,16 @@ echo "  │                                                         │"
 echo "  │  Try: ./nowplaying.sh  ./hack.sh  ./zork.sh             │"
 echo "  └─────────────────────────────────────────────────────────┘"
 echo ""
-'''
-    )
-    sandbox.commands.run("chmod +x /home/user/welcome.sh")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # hack.sh - Hacker Simulator
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/hack.sh",
-        r'''#!/usr/bin/env python3
+''',
+    mode=0o755,
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# hack.sh - Hacker Simulator
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "hack.sh",
+    r'''#!/usr/bin/env python3
 import random
 import time
 import sys
@@ -180,16 +197,16 @@ def hack_animation():
 
 if __name__ == "__main__":
     hack_animation()
-'''
-    )
-    sandbox.commands.run("chmod +x /home/user/hack.sh")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # zork.sh - Text Adventure Game
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/zork.sh",
-        r'''#!/usr/bin/env python3
+''',
+    mode=0o755,
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# zork.sh - Text Adventure Game
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "zork.sh",
+    r'''#!/usr/bin/env python3
 """
 ZORK: The Braelyn Edition
 A mini text adventure
@@ -437,16 +454,16 @@ Available commands:
 if __name__ == "__main__":
     game = Game()
     game.run()
-'''
-    )
-    sandbox.commands.run("chmod +x /home/user/zork.sh")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # sudo - The Incident Reporter
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/bin/sudo",
-        r'''#!/bin/bash
+''',
+    mode=0o755,
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# sudo - The Incident Reporter
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "bin/sudo",
+    r'''#!/bin/bash
 echo ""
 echo "  ╔════════════════════════════════════════════════════════════╗"
 echo "  ║                    ⚠️  SECURITY ALERT ⚠️                    ║"
@@ -465,16 +482,16 @@ echo "  ║     - The HDD warranty voiders association                 ║"
 echo "  ║                                                            ║"
 echo "  ╚════════════════════════════════════════════════════════════╝"
 echo ""
-'''
-    )
-    sandbox.commands.run("chmod +x /home/user/bin/sudo")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # rm - Chaotic Meltdown Edition
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/bin/rm",
-        r'''#!/usr/bin/env python3
+''',
+    mode=0o755,
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# rm - Chaotic Meltdown Edition
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "bin/rm",
+    r'''#!/usr/bin/env python3
 import sys
 import time
 import random
@@ -554,16 +571,16 @@ def meltdown():
 
 if __name__ == "__main__":
     meltdown()
-'''
-    )
-    sandbox.commands.run("chmod +x /home/user/bin/rm")
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # README.md
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/README.md",
-        """# Welcome to my terminal
+''',
+    mode=0o755,
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# README.md
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "README.md",
+    """# Welcome to my terminal
 
 This is a live terminal powered by E2B. You have full access to do anything.
 
@@ -584,14 +601,14 @@ Try `rm -rf /` or `sudo` for a surprise...
 
 You have full access to a Linux environment with Python, Node.js, and common tools.
 """
-    )
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # hello.py - Simple Python script
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/hello.py",
-        """#!/usr/bin/env python3
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# hello.py - Simple Python script
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    "hello.py",
+    """#!/usr/bin/env python3
 import sys
 
 def main():
@@ -606,12 +623,69 @@ def main():
 if __name__ == "__main__":
     main()
 """
+)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Fake SSH key easter egg
+# ═══════════════════════════════════════════════════════════════════════════
+_add_file(
+    ".ssh/id_rsa",
+    """nice try""",
+    mode=0o600,
+)
+
+
+def _payload_version() -> str:
+    """Hash of everything that goes into the payload."""
+    digest = hashlib.sha256()
+    for path, mode, content in PAYLOAD_FILES:
+        digest.update(f"{path}\0{mode:o}\0".encode())
+        digest.update(content.encode())
+        digest.update(b"\0")
+    digest.update("\n".join(BASHRC_LINES).encode())
+    return digest.hexdigest()[:16]
+
+
+def _build_payload() -> bytes:
+    """Pack PAYLOAD_FILES into a gzipped tar archive, preserving modes."""
+    mtime = int(time.time())
+    raw = io.BytesIO()
+    with tarfile.open(fileobj=raw, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        directories = sorted({path.rsplit("/", 1)[0] for path, _, _ in PAYLOAD_FILES if "/" in path})
+        for directory in directories:
+            info = tarfile.TarInfo(directory)
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o700 if directory == ".ssh" else 0o755
+            info.mtime = mtime
+            tar.addfile(info)
+        for path, mode, content in PAYLOAD_FILES:
+            data = content.encode()
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            info.mode = mode
+            info.mtime = mtime
+            tar.addfile(info, io.BytesIO(data))
+    return gzip.compress(raw.getvalue(), mtime=0)
+
+
+PAYLOAD_VERSION = _payload_version()
+PAYLOAD_ARCHIVE = _build_payload()
+
+
+def _extract_command(archive_path: str) -> str:
+    """Shell command that unpacks the payload once per version and cleans up."""
+    bashrc = " ".join(f"'{line}'" for line in BASHRC_LINES)
+    return (
+        f"cd {HOME_DIR} && "
+        f"if [ \"$(cat .payload_version 2>/dev/null)\" != '{PAYLOAD_VERSION}' ]; then "
+        f"tar -xzf {archive_path} && printf '%s\\n' {bashrc} >> .bashrc && "
+        f"echo '{PAYLOAD_VERSION}' > .payload_version; "
+        f"fi; status=$?; /bin/rm -f {archive_path}; exit $status"
     )
-    
-    # ═══════════════════════════════════════════════════════════════════════════
-    # Fake SSH key easter egg
-    # ═══════════════════════════════════════════════════════════════════════════
-    sandbox.files.write(
-        "/home/user/.ssh/id_rsa",
-        """nice try"""
-    )
+
+
+async def populate_example_files(sandbox: Sandbox) -> None:
+    """Populate the sandbox with example files (one upload, one command)."""
+    archive_path = f"/tmp/payload-{PAYLOAD_VERSION}.tar.gz"
+    await sandbox.files.write(archive_path, PAYLOAD_ARCHIVE)
+    await sandbox.commands.run(_extract_command(archive_path))
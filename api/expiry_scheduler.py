@@ -0,0 +1,98 @@
+"""Deadline scheduler for terminal session expiry."""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    """Calls `on_expired` with the keys whose deadline has passed, as soon as it passes.
+
+    Deadlines are wall-clock timestamps (`time.time()`) kept in a min-heap, so
+    the scheduler sleeps exactly until the earliest one. Rescheduling or
+    cancelling a key doesn't touch the heap: stale entries are skipped when
+    they surface, and the heap is rebuilt once they outnumber live ones.
+
+    `on_expired` is a plain function and must not block; it is expected to
+    hand the actual cleanup off to tasks. If it raises, the error is logged
+    and counted, and the scheduler carries on with later deadlines.
+    """
+
+    def __init__(self, on_expired: Callable[[List[str]], None]):
+        self._on_expired = on_expired
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._lag = registry.histogram("terminal.expiry.lag_seconds")
+        self._failures = registry.counter("terminal.expiry.failures")
+        registry.gauge("terminal.expiry.scheduled", lambda: len(self._deadlines))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        # wait_for (3.11) can swallow a cancel that races its wakeup;
+        # the flag makes _run stop on its next pass anyway
+        self._closing = True
+        self._wakeup.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def schedule(self, key: str, deadline: float) -> None:
+        """Set (or move) the deadline for `key`."""
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, k) for k, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        if self._heap[0] == (deadline, key):
+            self._wakeup.set()  # New earliest deadline; re-arm the timer
+
+    def cancel(self, key: str) -> None:
+        self._deadlines.pop(key, None)
+
+    def deadline(self, key: str) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def _pop_due(self, now: float) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) != deadline:
+                continue  # Cancelled or rescheduled
+            del self._deadlines[key]
+            self._lag.observe(now - deadline)
+            due.append(key)
+        return due
+
+    async def _run(self) -> None:
+        while not self._closing:
+            due = self._pop_due(time.time())
+            if due:
+                try:
+                    self._on_expired(due)
+                except Exception as e:
+                    self._failures.inc()
+                    logger.error(f"Failed to expire {len(due)} sessions: {e}")
+
+            timeout = max(0.0, self._heap[0][0] - time.time()) if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+"""Offline GLB compaction for the desk models.
+
+Rewrites exported GLBs so they're cheaper to download:
+- strips nodes that aren't reachable from a scene, and anything (meshes,
+  accessors, buffer views, materials, textures, images) left unused
+- deduplicates accessors with identical data
+- quantizes positions to 16-bit integers and normals to 8-bit
+  (KHR_mesh_quantization); --keep-positions leaves the positions of models
+  whose code reads their mesh bounds or node transforms alone
+- downscales and recompresses embedded images to a size budget (needs Pillow)
+
+Compacted files are written to a separate directory mirroring the source
+tree, together with report.json. Pass that directory to asset_manifest.py
+with --overlay so the manifest (and the sync) use the compacted versions.
+
+Usage:
+    python glb_compact.py ../desk/public --out ../desk/build/compact
+"""
+
+import argparse
+import fnmatch
+import io
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+FLOAT = 5126
+BYTE = 5120
+UNSIGNED_SHORT = 5123
+
+COMPONENT_DTYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+
+# Files using these are already compressed and are left alone
+UNSUPPORTED_EXTENSIONS = {"KHR_draco_mesh_compression", "EXT_meshopt_compression"}
+QUANTIZATION_EXTENSION = "KHR_mesh_quantization"
+
+REPORT_NAME = "report.json"
+
+
+class UnsupportedGlb(Exception):
+    """Raised for GLBs this tool can't safely rewrite."""
+
+
+def _align4(n: int) -> int:
+    return (n + 3) & ~3
+
+
+def read_glb(data: bytes):
+    """Split a GLB into its JSON document and binary chunk."""
+    magic, version, length = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise UnsupportedGlb("not a glTF 2.0 binary")
+
+    gltf = None
+    binary = b""
+    offset = 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise UnsupportedGlb("missing JSON chunk")
+    return gltf, binary
+
+
+def write_glb(gltf: dict, binary: bytes) -> bytes:
+    """Assemble a GLB from a JSON document and binary chunk."""
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode()
+    json_bytes += b" " * (_align4(len(json_bytes)) - len(json_bytes))
+    binary += b"\0" * (_align4(len(binary)) - len(binary))
+
+    out = io.BytesIO()
+    length = 12 + 8 + len(json_bytes) + (8 + len(binary) if binary else 0)
+    out.write(struct.pack("<III", GLB_MAGIC, 2, length))
+    out.write(struct.pack("<II", len(json_bytes), CHUNK_JSON))
+    out.write(json_bytes)
+    if binary:
+        out.write(struct.pack("<II", len(binary), CHUNK_BIN))
+        out.write(binary)
+    return out.getvalue()
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Index references
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _texture_infos(value):
+    """Yield every textureInfo dict ({"index": ...}) nested in a material."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if key.endswith("Texture") and isinstance(child, dict) and "index" in child:
+                yield child
+            else:
+                yield from _texture_infos(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _texture_infos(child)
+
+
+def _refs(gltf: dict, kind: str):
+    """Yield (container, key) pairs where container[key] indexes gltf[kind]."""
+    if kind == "nodes":
+        for scene in gltf.get("scenes", []):
+            nodes = scene.get("nodes", [])
+            yield from ((nodes, i) for i in range(len(nodes)))
+        for node in gltf.get("nodes", []):
+            children = node.get("children", [])
+            yield from ((children, i) for i in range(len(children)))
+        for skin in gltf.get("skins", []):
+            joints = skin.get("joints", [])
+            yield from ((joints, i) for i in range(len(joints)))
+            if "skeleton" in skin:
+                yield skin, "skeleton"
+        for animation in gltf.get("animations", []):
+            for channel in animation.get("channels", []):
+                if "node" in channel.get("target", {}):
+                    yield channel["target"], "node"
+    elif kind in ("meshes", "skins", "cameras"):
+        key = {"meshes": "mesh", "skins": "skin", "cameras": "camera"}[kind]
+        for node in gltf.get("nodes", []):
+            if key in node:
+                yield node, key
+    elif kind == "materials":
+        for mesh in gltf.get("meshes", []):
+            for primitive in mesh.get("primitives", []):
+                if "material" in primitive:
+                    yield primitive, "material"
+    elif kind == "accessors":
+        for mesh in gltf.get("meshes", []):
+            for primitive in mesh.get("primitives", []):
+                attributes = primitive.get("attributes", {})
+                yield from ((attributes, name) for name in attributes)
+                if "indices" in primitive:
+                    yield primitive, "indices"
+                for target in primitive.get("targets", []):
+                    yield from ((target, name) for name in target)
+        for skin in gltf.get("skins", []):
+            if "inverseBindMatrices" in skin:
+                yield skin, "inverseBindMatrices"
+        for animation in gltf.get("animations", []):
+            for sampler in animation.get("samplers", []):
+                yield sampler, "input"
+                yield sampler, "output"
+        for node in gltf.get("nodes", []):
+            instancing = node.get("extensions", {}).get("EXT_mesh_gpu_instancing", {})
+            attributes = instancing.get("attributes", {})
+            yield from ((attributes, name) for name in attributes)
+    elif kind == "bufferViews":
+        for accessor in gltf.get("accessors", []):
+            if "bufferView" in accessor:
+                yield accessor, "bufferView"
+            sparse = accessor.get("sparse")
+            if sparse:
+                yield sparse["indices"], "bufferView"
+                yield sparse["values"], "bufferView"
+        for image in gltf.get("images", []):
+            if "bufferView" in image:
+                yield image, "bufferView"
+    elif kind == "textures":
+        for material in gltf.get("materials", []):
+            yield from ((info, "index") for info in _texture_infos(material))
+    elif kind == "images":
+        for texture in gltf.get("textures", []):
+            if "source" in texture:
+                yield texture, "source"
+            for extension in texture.get("extensions", {}).values():
+                if isinstance(extension, dict) and "source" in extension:
+                    yield extension, "source"
+    elif kind == "samplers":
+        for texture in gltf.get("textures", []):
+            if "sampler" in texture:
+                yield texture, "sampler"
+
+
+def _used(gltf: dict, kind: str) -> Set[int]:
+    return {container[key] for container, key in _refs(gltf, kind)}
+
+
+def _remap(gltf: dict, kind: str, mapping: Dict[int, int]) -> None:
+    for container, key in _refs(gltf, kind):
+        container[key] = mapping[container[key]]
+
+
+def _keep(gltf: dict, kind: str, keep: Set[int], views: Optional[List[bytes]] = None) -> int:
+    """Drop every gltf[kind] item not in keep, remapping references. Returns the count removed."""
+    items = gltf.get(kind, [])
+    kept = [i for i in range(len(items)) if i in keep]
+    if len(kept) == len(items):
+        return 0
+    mapping = {old: new for new, old in enumerate(kept)}
+    # Swap the list first so references held by dropped items aren't remapped
+    gltf[kind] = [items[i] for i in kept]
+    _remap(gltf, kind, mapping)
+    if views is not None:
+        views[:] = [views[i] for i in kept]
+    if not gltf[kind]:
+        del gltf[kind]
+    return len(items) - len(kept)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Passes
+# ═══════════════════════════════════════════════════════════════════════════
+
+def prune_nodes(gltf: dict) -> int:
+    """Remove nodes not reachable from any scene, and animation channels targeting them."""
+    if not gltf.get("scenes"):
+        return 0
+    nodes = gltf.get("nodes", [])
+    reachable: Set[int] = set()
+    pending = [n for scene in gltf["scenes"] for n in scene.get("nodes", [])]
+    while pending:
+        index = pending.pop()
+        if index in reachable:
+            continue
+        reachable.add(index)
+        node = nodes[index]
+        pending.extend(node.get("children", []))
+        if "skin" in node:
+            skin = gltf["skins"][node["skin"]]
+            pending.extend(skin.get("joints", []))
+            if "skeleton" in skin:
+                pending.append(skin["skeleton"])
+
+    for animation in gltf.get("animations", []):
+        channels = animation.get("channels", [])
+        channels[:] = [
+            c for c in channels
+            if "node" not in c.get("target", {}) or c["target"]["node"] in reachable
+        ]
+        used_samplers = sorted({c["sampler"] for c in channels})
+        mapping = {old: new for new, old in enumerate(used_samplers)}
+        animation["samplers"] = [animation["samplers"][i] for i in used_samplers]
+        for channel in channels:
+            channel["sampler"] = mapping[channel["sampler"]]
+    if "animations" in gltf:
+        gltf["animations"] = [a for a in gltf["animations"] if a.get("channels")]
+        if not gltf["animations"]:
+            del gltf["animations"]
+
+    # Skins only used by dropped nodes would still reference them as joints
+    for index, node in enumerate(nodes):
+        if index not in reachable:
+            node.pop("skin", None)
+    _keep(gltf, "skins", _used(gltf, "skins"))
+
+    return _keep(gltf, "nodes", reachable)
+
+
+def read_accessor(gltf: dict, views: List[bytes], index: int) -> Optional[np.ndarray]:
+    """Read an accessor into a (count, components) array, or None if it can't be read plainly."""
+    accessor = gltf["accessors"][index]
+    if "bufferView" not in accessor or "sparse" in accessor:
+        return None
+    dtype = np.dtype(COMPONENT_DTYPES[accessor["componentType"]]).newbyteorder("<")
+    components = TYPE_SIZES[accessor["type"]]
+    if accessor["type"].startswith("MAT") and dtype.itemsize < 4:
+        return None  # column padding rules, not worth handling
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    element_size = dtype.itemsize * components
+    stride = view.get("byteStride") or element_size
+    array = np.ndarray(
+        shape=(accessor["count"], components),
+        dtype=dtype,
+        buffer=views[accessor["bufferView"]],
+        offset=accessor.get("byteOffset", 0),
+        strides=(stride, dtype.itemsize),
+    )
+    return array.copy()
+
+
+def add_accessor(gltf: dict, views: List[bytes], array: np.ndarray, component_type: int,
+                 accessor_type: str, target: Optional[int], **extra) -> int:
+    """Append an accessor (and its own buffer view) holding array. Returns its index."""
+    count, components = array.shape
+    row = np.ascontiguousarray(array).view(np.uint8).reshape(count, -1)
+    view = {"buffer": 0, "byteLength": 0}
+    if target == ARRAY_BUFFER and row.shape[1] % 4:
+        # Vertex attribute elements must start on 4-byte boundaries
+        stride = _align4(row.shape[1])
+        padded = np.zeros((count, stride), dtype=np.uint8)
+        padded[:, :row.shape[1]] = row
+        row = padded
+        view["byteStride"] = stride
+    if target is not None:
+        view["target"] = target
+    data = row.tobytes()
+    view["byteLength"] = len(data)
+
+    gltf.setdefault("bufferViews", []).append(view)
+    views.append(data)
+    accessor = {
+        "bufferView": len(gltf["bufferViews"]) - 1,
+        "componentType": component_type,
+        "count": count,
+        "type": accessor_type,
+        **extra,
+    }
+    gltf.setdefault("accessors", []).append(accessor)
+    return len(gltf["accessors"]) - 1
+
+
+def quantize_meshes(gltf: dict, views: List[bytes], position_bits: int = 14, positions: bool = True) -> int:
+    """Quantize POSITION to unsigned shorts and NORMAL to normalized bytes.
+
+    Positions are stored on a uniform grid over the mesh bounds, and the
+    dequantization offset and scale are folded into the transform of each
+    node using the mesh, so nothing changes visually. A node whose transform
+    can't absorb them (it has children, is animated, ...) instead hands the
+    mesh and its name to a new child node carrying them, so the mesh still
+    goes by the node's name. Skinned and morphed meshes, and meshes sharing
+    position data with another mesh, are left alone.
+
+    World-space geometry is unchanged, but a mesh's local bounds and its
+    node's transform are not, which breaks code that reads them (Door.ts
+    builds its hinge from them). With `positions` off only normals are
+    quantized and both are left as they are.
+    """
+    meshes = gltf.get("meshes", [])
+    nodes = gltf.get("nodes", [])
+    pinned = _pinned_nodes(gltf)
+    referenced = {n["mesh"] for n in nodes if "mesh" in n}
+    skinned = {n["mesh"] for n in nodes if "mesh" in n and "skin" in n}
+    instanced = {n["mesh"] for n in nodes if "mesh" in n and "EXT_mesh_gpu_instancing" in n.get("extensions", {})}
+    position_owners: Dict[int, Set[int]] = {}
+    for mesh_index, mesh in enumerate(meshes):
+        for primitive in mesh.get("primitives", []):
+            if "POSITION" in primitive.get("attributes", {}):
+                position_owners.setdefault(primitive["attributes"]["POSITION"], set()).add(mesh_index)
+
+    levels = (1 << position_bits) - 1
+    quantized = 0
+    for mesh_index, mesh in enumerate(meshes):
+        primitives = mesh.get("primitives", [])
+        if mesh_index not in referenced or mesh_index in skinned or mesh_index in instanced or not primitives:
+            continue
+        if any(p.get("targets") or "POSITION" not in p.get("attributes", {}) for p in primitives):
+            continue
+        if not positions:
+            if _quantize_normals(gltf, views, primitives):
+                quantized += 1
+            continue
+        position_indices = [p["attributes"]["POSITION"] for p in primitives]
+        if any(len(position_owners[i]) > 1 for i in position_indices):
+            continue
+        accessors = gltf["accessors"]
+        if any(accessors[i]["componentType"] != FLOAT for i in position_indices):
+            continue
+        positions = {i: read_accessor(gltf, views, i) for i in set(position_indices)}
+        if any(p is None or not len(p) for p in positions.values()):
+            continue
+
+        stacked = np.concatenate(list(positions.values()))
+        offset = stacked.min(axis=0).astype(np.float64)
+        extent = float((stacked.max(axis=0) - offset).max())
+        scale = extent / levels if extent > 0 else 1.0
+
+        replaced: Dict[int, int] = {}
+        for index, values in positions.items():
+            q = np.rint((values - offset) / scale).clip(0, levels).astype(np.uint16)
+            replaced[index] = add_accessor(
+                gltf, views, q, UNSIGNED_SHORT, "VEC3", ARRAY_BUFFER,
+                min=q.min(axis=0).tolist(), max=q.max(axis=0).tolist(),
+            )
+        for primitive in primitives:
+            primitive["attributes"]["POSITION"] = replaced[primitive["attributes"]["POSITION"]]
+        _quantize_normals(gltf, views, primitives)
+
+        dequantize = {
+            "translation": offset.tolist(),
+            "scale": [scale, scale, scale],
+        }
+        for index, node in enumerate(list(nodes)):
+            if node.get("mesh") != mesh_index:
+                continue
+            if index not in pinned and not node.get("children"):
+                _fold_dequantize(node, offset, scale)
+                continue
+            # Move the mesh onto a child node carrying the dequantization transform
+            child = {"mesh": mesh_index, **dequantize}
+            if "name" in node:
+                child["name"] = node.pop("name")
+            if "weights" in node:
+                child["weights"] = node.pop("weights")
+            del node["mesh"]
+            nodes.append(child)
+            node.setdefault("children", []).append(len(nodes) - 1)
+        quantized += 1
+
+    if quantized:
+        for key in ("extensionsUsed", "extensionsRequired"):
+            extensions = gltf.setdefault(key, [])
+            if QUANTIZATION_EXTENSION not in extensions:
+                extensions.append(QUANTIZATION_EXTENSION)
+    return quantized
+
+
+def _quantize_normals(gltf: dict, views: List[bytes], primitives: List[dict]) -> bool:
+    """Store float NORMALs as normalized bytes. True if any were."""
+    changed = False
+    for primitive in primitives:
+        attributes = primitive["attributes"]
+        normal_index = attributes.get("NORMAL")
+        if normal_index is None or gltf["accessors"][normal_index]["componentType"] != FLOAT:
+            continue
+        normals = read_accessor(gltf, views, normal_index)
+        if normals is None:
+            continue
+        q = np.rint(normals.clip(-1, 1) * 127).astype(np.int8)
+        attributes["NORMAL"] = add_accessor(gltf, views, q, BYTE, "VEC3", ARRAY_BUFFER, normalized=True)
+        changed = True
+    return changed
+
+
+def _pinned_nodes(gltf: dict) -> Set[int]:
+    """Nodes whose own transform must stay as it is.
+
+    Animations drive their transform, skins use them as joints, and a camera
+    or extension (e.g. a light) attached to them would pick up the scale.
+    """
+    pinned = set()
+    for animation in gltf.get("animations", []):
+        for channel in animation.get("channels", []):
+            if "node" in channel.get("target", {}):
+                pinned.add(channel["target"]["node"])
+    for skin in gltf.get("skins", []):
+        pinned.update(skin.get("joints", []))
+        if "skeleton" in skin:
+            pinned.add(skin["skeleton"])
+    for index, node in enumerate(gltf.get("nodes", [])):
+        if "camera" in node or node.get("extensions"):
+            pinned.add(index)
+    return pinned
+
+
+def _fold_dequantize(node: dict, offset: np.ndarray, scale: float) -> None:
+    """Apply translate(offset) * scale(scale) after the node's own transform."""
+    if "matrix" in node:
+        matrix = np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T  # stored column-major
+        dequantize = np.diag([scale, scale, scale, 1.0])
+        dequantize[:3, 3] = offset
+        node["matrix"] = (matrix @ dequantize).T.reshape(-1).tolist()
+        return
+    x, y, z, w = node.get("rotation", [0.0, 0.0, 0.0, 1.0])
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    node_scale = np.array(node.get("scale", [1.0, 1.0, 1.0]), dtype=np.float64)
+    translation = np.array(node.get("translation", [0.0, 0.0, 0.0]), dtype=np.float64)
+    node["translation"] = (translation + rotation @ (node_scale * offset)).tolist()
+    node["scale"] = (node_scale * scale).tolist()
+
+
+def dedupe_accessors(gltf: dict, views: List[bytes]) -> int:
+    """Point references to accessors with identical data at a single copy."""
+    seen: Dict[tuple, int] = {}
+    mapping: Dict[int, int] = {}
+    for index, accessor in enumerate(gltf.get("accessors", [])):
+        mapping[index] = index
+        array = read_accessor(gltf, views, index)
+        if array is None:
+            continue
+        target = gltf["bufferViews"][accessor["bufferView"]].get("target")
+        key = (
+            accessor["componentType"],
+            accessor["type"],
+            accessor.get("normalized", False),
+            target,
+            array.tobytes(),
+        )
+        mapping[index] = seen.setdefault(key, index)
+    duplicates = sum(1 for old, new in mapping.items() if old != new)
+    if duplicates:
+        _remap(gltf, "accessors", mapping)
+    return duplicates
+
+
+def recompress_images(gltf: dict, views: List[bytes], max_size: int, budget: int,
+                      jpeg_quality: int) -> int:
+    """Downscale embedded images to max_size and recompress them until they fit budget bytes.
+
+    Opaque PNGs are re-encoded as JPEG when that is smaller. Returns the
+    number of bytes saved. Needs Pillow; without it images are left as-is.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        print("  Pillow not installed, skipping images")
+        return 0
+
+    images = gltf.get("images", [])
+    embedded = [i for i, image in enumerate(images) if "bufferView" in image]
+    if not embedded:
+        return 0
+
+    def encode(picture, mime_type):
+        out = io.BytesIO()
+        if mime_type == "image/jpeg":
+            picture.convert("RGB").save(out, "JPEG", quality=jpeg_quality, optimize=True)
+        else:
+            picture.save(out, "PNG", optimize=True)
+        return out.getvalue()
+
+    pictures = {}
+    for index in embedded:
+        image = images[index]
+        try:
+            picture = Image.open(io.BytesIO(views[image["bufferView"]]))
+            picture.load()
+        except Exception:
+            continue
+        pictures[index] = picture
+
+    original = {i: len(views[images[i]["bufferView"]]) for i in pictures}
+    encoded = {}
+    limit = max_size
+    while True:
+        for index, picture in pictures.items():
+            image = images[index]
+            if max(picture.size) > limit:
+                ratio = limit / max(picture.size)
+                size = (max(1, round(picture.width * ratio)), max(1, round(picture.height * ratio)))
+                picture = picture.resize(size, Image.LANCZOS)
+            mime_type = image.get("mimeType", "image/png")
+            data = encode(picture, mime_type)
+            opaque = picture.mode in ("RGB", "L", "P") and "transparency" not in picture.info
+            if mime_type == "image/png" and opaque:
+                as_jpeg = encode(picture, "image/jpeg")
+                if len(as_jpeg) < len(data):
+                    mime_type, data = "image/jpeg", as_jpeg
+            encoded[index] = (mime_type, data)
+        total = sum(len(data) for _, data in encoded.values())
+        if total <= budget or limit <= 256:
+            break
+        limit //= 2
+
+    saved = 0
+    for index, (mime_type, data) in encoded.items():
+        if len(data) >= original[index]:
+            continue
+        image = images[index]
+        # Give the image its own view in case the old one is shared
+        gltf["bufferViews"].append({"buffer": 0, "byteLength": len(data)})
+        views.append(data)
+        image["bufferView"] = len(gltf["bufferViews"]) - 1
+        image["mimeType"] = mime_type
+        saved += original[index] - len(data)
+    return saved
+
+
+def remove_unused(gltf: dict, views: List[bytes]) -> Dict[str, int]:
+    """Drop everything no longer referenced, top-down so each level sees the last."""
+    removed = {}
+    for kind in ("meshes", "skins", "cameras", "materials", "textures", "images",
+                 "samplers", "accessors", "bufferViews"):
+        count = _keep(gltf, kind, _used(gltf, kind), views if kind == "bufferViews" else None)
+        if count:
+            removed[kind] = count
+    return removed
+
+
+def repack(gltf: dict, views: List[bytes]) -> bytes:
+    """Lay the remaining buffer views out back to back in a single buffer."""
+    binary = bytearray()
+    for view, data in zip(gltf.get("bufferViews", []), views):
+        binary += b"\0" * (_align4(len(binary)) - len(binary))
+        view["buffer"] = 0
+        view["byteOffset"] = len(binary)
+        view["byteLength"] = len(data)
+        binary += data
+    if binary:
+        gltf["buffers"] = [{"byteLength": len(binary)}]
+    else:
+        gltf.pop("buffers", None)
+    return bytes(binary)
+
+
+def compact_glb(data: bytes, max_texture_size: int = 2048, texture_budget: int = 4 * 1024 * 1024,
+                jpeg_quality: int = 85, position_bits: int = 14, quantize_positions: bool = True) -> tuple:
+    """Compact a GLB. Returns (new_bytes, stats)."""
+    gltf, binary = read_glb(data)
+    used_extensions = set(gltf.get("extensionsUsed", []))
+    if used_extensions & UNSUPPORTED_EXTENSIONS:
+        raise UnsupportedGlb(f"already compressed ({', '.join(sorted(used_extensions & UNSUPPORTED_EXTENSIONS))})")
+    if len(gltf.get("buffers", [])) > 1 or any("uri" in b for b in gltf.get("buffers", [])):
+        raise UnsupportedGlb("external buffers")
+
+    views = []
+    for view in gltf.get("bufferViews", []):
+        start = view.get("byteOffset", 0)
+        views.append(binary[start:start + view["byteLength"]])
+
+    stats = {"nodes_removed": prune_nodes(gltf)}
+    stats["meshes_quantized"] = quantize_meshes(gltf, views, position_bits, quantize_positions)
+    stats["accessors_deduplicated"] = dedupe_accessors(gltf, views)
+    stats["image_bytes_saved"] = recompress_images(gltf, views, max_texture_size, texture_budget, jpeg_quality)
+    stats["removed"] = remove_unused(gltf, views)
+    return write_glb(gltf, repack(gltf, views)), stats
+
+
+def _format_bytes(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.2f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact GLB models for the desk scene.")
+    parser.add_argument("root", help="Source asset directory (e.g. ../desk/public)")
+    parser.add_argument("--out", required=True, help="Output directory for compacted models")
+    parser.add_argument("--max-texture-size", type=int, default=2048)
+    parser.add_argument("--texture-budget", type=int, default=4 * 1024 * 1024,
+                        help="Target bytes for all embedded images in one model")
+    parser.add_argument("--jpeg-quality", type=int, default=85)
+    parser.add_argument("--position-bits", type=int, default=14, choices=range(8, 17))
+    parser.add_argument("--keep-positions", action="append", default=[], metavar="PATTERN",
+                        help="Leave positions (and node transforms) of matching models as they are, "
+                             "for models whose code reads their local bounds; repeatable, e.g. door.glb")
+    args = parser.parse_args()
+
+    report = {}
+    for dirpath, dirnames, filenames in os.walk(args.root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.lower().endswith(".glb"):
+                continue
+            source = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(source, args.root).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            entry = {"original_size": len(data)}
+            try:
+                compacted, stats = compact_glb(
+                    data,
+                    max_texture_size=args.max_texture_size,
+                    texture_budget=args.texture_budget,
+                    jpeg_quality=args.jpeg_quality,
+                    position_bits=args.position_bits,
+                    quantize_positions=not any(fnmatch.fnmatch(rel_path, p) for p in args.keep_positions),
+                )
+            except (UnsupportedGlb, struct.error) as e:
+                entry["skipped"] = str(e) or type(e).__name__
+                print(f"{rel_path}: skipped ({entry['skipped']})")
+                report[rel_path] = entry
+                continue
+
+            entry.update(stats)
+            entry["compacted_size"] = len(compacted)
+            destination = os.path.join(args.out, rel_path)
+            if len(compacted) < len(data):
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                with open(destination, "wb") as f:
+                    f.write(compacted)
+            else:
+                # Not worth it; make sure a stale compacted copy doesn't linger
+                entry["skipped"] = "no reduction"
+                if os.path.exists(destination):
+                    os.remove(destination)
+            report[rel_path] = entry
+            ratio = len(compacted) / len(data) if data else 1
+            print(f"{rel_path}: {_format_bytes(len(data))} -> {_format_bytes(len(compacted))} ({ratio:.0%})")
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, REPORT_NAME), "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    before = sum(e["original_size"] for e in report.values())
+    after = sum(e.get("compacted_size", e["original_size"]) if "skipped" not in e else e["original_size"]
+                for e in report.values())
+    print(f"\nTotal: {_format_bytes(before)} -> {_format_bytes(after)}")
+
+
+if __name__ == "__main__":
+    main()
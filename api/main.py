@@ -2,18 +2,36 @@ import asyncio
 import json
 import logging
 import os
-import queue
+import secrets
+import uuid
 from contextlib import asynccontextmanager
-from typing import Optional
-from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import RedirectResponse, StreamingResponse
+from typing import Dict, List, Optional
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
-import boto3
-from botocore.config import Config
+from assets import (
+    ASSET_PREFIX,
+    BUNDLE_END,
+    BUNDLE_MAGIC,
+    PresignedUrlCache,
+    bundle_entry_header,
+    content_type_for,
+    get_s3_client,
+    parse_extensions,
+)
+from admission import UnknownTicket
+from asset_manifest import ManifestCache
+from config import settings
+from metrics import registry
 from session_manager import session_manager
-from database import SessionLocal
+from session_recording import CONTENT_TYPE as RECORDING_CONTENT_TYPE
+from session_routing import forward_request, is_forwarded, proxy_websocket
+from terminal_io import BINARY_SUBPROTOCOL, OutputBridge, OutputFramer, output_sender
+from database import engine, get_db
 from models import Event
 
 logger = logging.getLogger(__name__)
@@ -24,6 +42,17 @@ class ExecuteCommandRequest(BaseModel):
     command: str
 
 
+class StartSessionRequest(BaseModel):
+    ticket: Optional[str] = None  # from an earlier "queued" response
+
+
+class StreamCommandRequest(BaseModel):
+    session_token: str
+    command: str
+    timeout: Optional[float] = Field(default=None, gt=0)  # seconds; defaults to TERMINAL_EXECUTE_TIMEOUT_SECONDS
+    max_output_bytes: Optional[int] = Field(default=None, gt=0)
+
+
 class EndSessionRequest(BaseModel):
     session_token: str
 
@@ -33,8 +62,13 @@ class SlurpEventRequest(BaseModel):
     event_data: Optional[str] = None
 
 
+class AssetBundleRequest(BaseModel):
+    paths: List[str]
+    have: Dict[str, str] = {}  # path -> sha256 the client already holds
+
+
 async def cleanup_task():
-    """Background task to clean up expired sessions every minute."""
+    """Background task to sweep expired session rows every minute."""
     while True:
         await asyncio.sleep(60)  # Run every minute
         await session_manager.cleanup_expired()
@@ -43,11 +77,15 @@ async def cleanup_task():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan events."""
-    # Startup: Start background cleanup task
+    # Startup: Start session writer, expiry and sweep tasks, fill the sandbox pool
+    session_manager.start()
     cleanup_job = asyncio.create_task(cleanup_task())
     yield
-    # Shutdown: Cancel cleanup task
+    # Shutdown: Cancel sweep task, kill live and pooled sandboxes in parallel, flush session writes,
+    # then close the database connections
     cleanup_job.cancel()
+    await session_manager.close()
+    await engine.dispose()
 
 
 app = FastAPI(title="Personal Site API", version="1.0.0", lifespan=lifespan)
@@ -80,7 +118,7 @@ async def health_check():
 
 
 @app.post("/slurp")
-async def slurp_event(request: Request, event: SlurpEventRequest):
+async def slurp_event(request: Request, event: SlurpEventRequest, db: AsyncSession = Depends(get_db)):
     """Record an event from the frontend."""
     import logging
     logger = logging.getLogger(__name__)
@@ -96,7 +134,6 @@ async def slurp_event(request: Request, event: SlurpEventRequest):
     user_agent = request.headers.get("user-agent")
     
     try:
-        db = SessionLocal()
         db_event = Event(
             event_type=event.event_type,
             event_data=event.event_data,
@@ -104,8 +141,7 @@ async def slurp_event(request: Request, event: SlurpEventRequest):
             user_agent=user_agent,
         )
         db.add(db_event)
-        db.commit()
-        db.close()
+        await db.commit()
         
         logger.info(f"Event recorded: {event.event_type}")
         return {"status": "ok"}
@@ -114,6 +150,43 @@ async def slurp_event(request: Request, event: SlurpEventRequest):
         raise HTTPException(status_code=500, detail="Failed to record event")
 
 
+def check_bearer_token(authorization: Optional[str], token: str, what: str) -> None:
+    """Reject a request unless it carries `Authorization: Bearer <token>`.
+
+    An empty `token` means access isn't configured, and everything is refused.
+    """
+    if not token:
+        raise HTTPException(status_code=403, detail=f"{what} access not configured")
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(credentials.encode(), token.encode()):
+        raise HTTPException(
+            status_code=401, detail="Invalid access token", headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+def require_recording_access(authorization: Optional[str] = Header(default=None)) -> None:
+    """FastAPI dependency: the request carries TERMINAL_RECORDING_ACCESS_TOKEN.
+
+    Recordings hold everything typed into and printed by a session, so they are
+    only served with the token; with none configured they aren't served at all.
+    """
+    check_bearer_token(authorization, settings.terminal_recording_access_token, "Recording")
+
+
+def require_metrics_access(authorization: Optional[str] = Header(default=None)) -> None:
+    """FastAPI dependency: the request carries METRICS_ACCESS_TOKEN.
+
+    Metrics give away pool and session counts and database pool state.
+    """
+    check_bearer_token(authorization, settings.metrics_access_token, "Metrics")
+
+
+@app.get("/api/metrics", dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    """In-process metrics (terminal pool, timings, ...) as JSON."""
+    return {"terminal_pool": session_manager.pool.stats(), **registry.snapshot()}
+
+
 @app.get("/api/hello")
 async def hello():
     """Simple hello endpoint"""
@@ -121,7 +194,7 @@ async def hello():
 
 
 @app.get("/api/admin/stats")
-async def get_admin_stats():
+async def get_admin_stats(db: AsyncSession = Depends(get_db)):
     """Get statistics for the admin dashboard."""
     from sqlalchemy import func as sql_func
     from datetime import datetime, timedelta
@@ -129,74 +202,72 @@ async def get_admin_stats():
     logger = logging.getLogger(__name__)
     
     try:
-        db = SessionLocal()
-        
+        count_events = select(sql_func.count(Event.id))
+
         # Total events
-        total_events = db.query(Event).count()
+        total_events = await db.scalar(count_events)
         
         # Events by type
-        events_by_type = db.query(
+        events_by_type = (await db.execute(select(
             Event.event_type,
             sql_func.count(Event.id).label('count')
-        ).group_by(Event.event_type).all()
+        ).group_by(Event.event_type))).all()
         
         # Events in last 24 hours
         yesterday = datetime.now() - timedelta(days=1)
-        events_last_24h = db.query(Event).filter(Event.created_at >= yesterday).count()
+        events_last_24h = await db.scalar(count_events.where(Event.created_at >= yesterday))
         
         # Events in last 7 days
         last_week = datetime.now() - timedelta(days=7)
-        events_last_7d = db.query(Event).filter(Event.created_at >= last_week).count()
+        events_last_7d = await db.scalar(count_events.where(Event.created_at >= last_week))
         
         # Unique IPs
-        unique_ips = db.query(sql_func.count(sql_func.distinct(Event.ip_address))).scalar()
+        unique_ips = await db.scalar(select(sql_func.count(sql_func.distinct(Event.ip_address))))
         
         # Events by day (last 30 days)
         last_30_days = datetime.now() - timedelta(days=30)
-        events_by_day = db.query(
+        events_by_day = (await db.execute(select(
             sql_func.date(Event.created_at).label('date'),
             sql_func.count(Event.id).label('count')
-        ).filter(Event.created_at >= last_30_days).group_by(
+        ).where(Event.created_at >= last_30_days).group_by(
             sql_func.date(Event.created_at)
-        ).order_by(sql_func.date(Event.created_at)).all()
+        ).order_by(sql_func.date(Event.created_at)))).all()
         
         # Social clicks by type
-        social_clicks = db.query(
+        social_clicks = (await db.execute(select(
             Event.event_data,
             sql_func.count(Event.id).label('count')
-        ).filter(Event.event_type == 'social_click').group_by(Event.event_data).all()
+        ).where(Event.event_type == 'social_click').group_by(Event.event_data))).all()
 
         # Blog post views (blog_post_click events grouped by event_data)
-        blog_post_views = db.query(
+        blog_post_views = (await db.execute(select(
             Event.event_data,
             sql_func.count(Event.id).label('count')
-        ).filter(
+        ).where(
             Event.event_type == 'blog_post_click',
             Event.event_data.isnot(None)
-        ).group_by(Event.event_data).order_by(sql_func.count(Event.id).desc()).all()
+        ).group_by(Event.event_data).order_by(sql_func.count(Event.id).desc()))).all()
 
         # Blog post visits (blog_post_read events grouped by event_data)
-        blog_post_visits = db.query(
+        blog_post_visits = (await db.execute(select(
             Event.event_data,
             sql_func.count(Event.id).label('count')
-        ).filter(
+        ).where(
             Event.event_type == 'blog_post_read',
             Event.event_data.isnot(None)
-        ).group_by(Event.event_data).order_by(sql_func.count(Event.id).desc()).all()
+        ).group_by(Event.event_data).order_by(sql_func.count(Event.id).desc()))).all()
 
         # Top referrers (referral events grouped by event_data)
-        top_referrers = db.query(
+        top_referrers = (await db.execute(select(
             Event.event_data,
             sql_func.count(Event.id).label('count')
-        ).filter(
+        ).where(
             Event.event_type == 'referral',
             Event.event_data.isnot(None)
-        ).group_by(Event.event_data).order_by(sql_func.count(Event.id).desc()).limit(20).all()
+        ).group_by(Event.event_data).order_by(sql_func.count(Event.id).desc()).limit(20))).all()
 
         # Recent events (last 50)
-        recent_events = db.query(Event).order_by(Event.created_at.desc()).limit(50).all()
-
-        db.close()
+        recent_events = (await db.scalars(select(Event).order_by(Event.created_at.desc()).limit(50))).all()
 
         return {
             "total_events": total_events,
@@ -279,21 +350,80 @@ async def get_lastfm_now_playing():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# S3 client for presigned URLs
-def get_s3_client():
-    return boto3.client(
-        's3',
-        endpoint_url=os.getenv('BUCKET_ENDPOINT'),
-        aws_access_key_id=os.getenv('BUCKET_ACCESS_KEY'),
-        aws_secret_access_key=os.getenv('BUCKET_SECRET_ACCESS_KEY'),
-        config=Config(signature_version='s3v4'),
-        region_name='auto'
-    )
+# Presigned URLs are reused across requests until they're close to expiring
+presigned_urls = PresignedUrlCache(
+    ttl_seconds=settings.asset_presign_ttl_seconds,
+    refresh_margin_seconds=settings.asset_presign_refresh_margin_seconds,
+    max_entries=settings.asset_presign_cache_entries,
+)
+redirect_extensions = parse_extensions(settings.asset_redirect_extensions)
+asset_manifest = ManifestCache(ttl_seconds=settings.asset_manifest_ttl_seconds)
+
+
+def should_redirect_asset(path: str, size: Optional[int]) -> bool:
+    """Whether an asset should be served via a redirect to the bucket."""
+    if os.path.splitext(path)[1].lower() in redirect_extensions:
+        return True
+    min_bytes = settings.asset_redirect_min_bytes
+    return bool(min_bytes) and size is not None and size >= min_bytes
+
+
+@app.post("/api/assets/bundle")
+async def get_asset_bundle(request: AssetBundleRequest):
+    """Stream several assets in one response as a length-prefixed bundle.
+
+    Assets whose manifest hash matches the one the client sent in `have` are
+    returned as "unchanged" entries without a body.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    bucket_name = os.getenv('BUCKET_NAME')
+    if not bucket_name:
+        logger.error("BUCKET_NAME not configured")
+        raise HTTPException(status_code=500, detail="Storage not configured")
+
+    if len(request.paths) > settings.asset_bundle_max_assets:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many assets requested (max {settings.asset_bundle_max_assets})",
+        )
+
+    s3 = get_s3_client()
+    manifest = await asyncio.to_thread(asset_manifest.get, s3, bucket_name) or {}
+    manifest_assets = manifest.get("assets", {})
+
+    def iterbundle():
+        yield BUNDLE_MAGIC
+        for path in dict.fromkeys(request.paths):
+            entry = manifest_assets.get(path)
+            sha256 = entry["sha256"] if entry else None
+            if sha256 and request.have.get(path) == sha256:
+                yield bundle_entry_header(path, "unchanged", sha256=sha256)
+                continue
+            try:
+                response = s3.get_object(Bucket=bucket_name, Key=f"{ASSET_PREFIX}/{path}")
+            except Exception as e:
+                logger.error(f"Failed to fetch bundled asset {path}: {e}")
+                yield bundle_entry_header(path, "missing")
+                continue
+            yield bundle_entry_header(
+                path,
+                "ok",
+                size=response['ContentLength'],
+                content_type=content_type_for(path),
+                sha256=sha256,
+            )
+            for chunk in response['Body'].iter_chunks(chunk_size=64 * 1024):
+                yield chunk
+        yield BUNDLE_END
+
+    return StreamingResponse(iterbundle(), media_type="application/octet-stream")
 
 
 @app.get("/api/assets/{path:path}")
 async def get_asset(path: str):
-    """Proxy an asset from S3 storage."""
+    """Proxy an asset from S3 storage, or redirect to a presigned URL."""
     import logging
     logger = logging.getLogger(__name__)
     
@@ -304,25 +434,21 @@ async def get_asset(path: str):
     
     try:
         s3 = get_s3_client()
-        # Assets are stored under desk/ prefix in the bucket
-        key = f"desk/{path}"
+        key = f"{ASSET_PREFIX}/{path}"
+
+        # Known large or matching assets never touch the API beyond signing
+        if should_redirect_asset(path, presigned_urls.get_size(key)):
+            return RedirectResponse(presigned_urls.get_url(s3, bucket_name, key), status_code=302)
         
         response = s3.get_object(Bucket=bucket_name, Key=key)
+        presigned_urls.set_size(key, response['ContentLength'])
+
+        # First request for a large asset: drop the body and redirect instead
+        if should_redirect_asset(path, response['ContentLength']):
+            response['Body'].close()
+            return RedirectResponse(presigned_urls.get_url(s3, bucket_name, key), status_code=302)
         
-        # Determine content type from file extension
-        content_type = "application/octet-stream"
-        if path.endswith('.glb'):
-            content_type = "model/gltf-binary"
-        elif path.endswith('.gltf'):
-            content_type = "model/gltf+json"
-        elif path.endswith('.mp3'):
-            content_type = "audio/mpeg"
-        elif path.endswith('.bin'):
-            content_type = "application/octet-stream"
-        elif path.endswith('.jpg') or path.endswith('.jpeg'):
-            content_type = "image/jpeg"
-        elif path.endswith('.png'):
-            content_type = "image/png"
+        content_type = content_type_for(path)
         
         def iterfile():
             for chunk in response['Body'].iter_chunks(chunk_size=64 * 1024):
@@ -342,90 +468,215 @@ async def get_asset(path: str):
 
 
 @app.post("/api/terminal/session/start")
-async def start_terminal_session():
-    """Start a new E2B terminal session."""
+async def start_terminal_session(request: Optional[StartSessionRequest] = None):
+    """Start a new E2B terminal session.
+    
+    When every session slot is taken this returns 202 with a queue ticket and
+    position; the client retries after `retry_after` seconds, passing the ticket.
+    """
     import logging
     logger = logging.getLogger(__name__)
     
     try:
         logger.info("Starting new terminal session...")
-        result = await session_manager.start_session()
+        result = await session_manager.start_session(ticket=request.ticket if request else None)
+        if result.get("status") == "queued":
+            return JSONResponse(status_code=202, content=result)
         logger.info(f"Session started successfully: {result['session_token']}")
         return result
+    except UnknownTicket:
+        raise HTTPException(status_code=404, detail="Queue ticket not found or expired")
     except Exception as e:
         logger.error(f"Failed to start session: {type(e).__name__}: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
 
+async def forward_to_owner(http_request: Request, session_token: str) -> Optional[Response]:
+    """Forward a request for a session held by another worker to that worker."""
+    if is_forwarded(http_request.headers):
+        return None
+    owner_url = await session_manager.find_owner(session_token)
+    if owner_url is None:
+        return None
+    return await forward_request(http_request, owner_url)
+
+
 @app.post("/api/terminal/session/execute")
-async def execute_terminal_command(request: ExecuteCommandRequest):
+async def execute_terminal_command(request: ExecuteCommandRequest, http_request: Request):
     """Execute a command in an active terminal session."""
+    forwarded = await forward_to_owner(http_request, request.session_token)
+    if forwarded is not None:
+        return forwarded
     result = await session_manager.execute_command(request.session_token, request.command)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
+@app.post("/api/terminal/session/execute/stream")
+async def stream_terminal_command(request: StreamCommandRequest, http_request: Request):
+    """Execute a command, streaming its output as NDJSON.
+    
+    Each line is one JSON object: {"type": "stdout" | "stderr", "data": "..."}
+    as output arrives, then {"type": "exit", "exit_code": N}, or
+    {"type": "error", "reason": "...", "message": "..."} if the command timed
+    out or exceeded the output cap. Disconnecting kills the command.
+    """
+    forwarded = await forward_to_owner(http_request, request.session_token)
+    if forwarded is not None:
+        return forwarded
+    timeout = min(
+        request.timeout or settings.terminal_execute_timeout_seconds,
+        settings.terminal_execute_max_timeout_seconds,
+    )
+    max_output_bytes = min(
+        request.max_output_bytes or settings.terminal_execute_max_output_bytes,
+        settings.terminal_execute_max_output_bytes,
+    )
+    
+    async def frames():
+        async for frame in session_manager.stream_command(
+            request.session_token, request.command, timeout, max_output_bytes
+        ):
+            yield json.dumps(frame) + "\n"
+    
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
 @app.delete("/api/terminal/session/end")
-async def end_terminal_session(request: EndSessionRequest):
+async def end_terminal_session(request: EndSessionRequest, http_request: Request):
     """End a terminal session."""
-    session_manager.close_session(request.session_token)
+    forwarded = await forward_to_owner(http_request, request.session_token)
+    if forwarded is not None:
+        return forwarded
+    await session_manager.close_session(request.session_token)
     return {"status": "session closed"}
 
 
+@app.get("/api/terminal/recordings/{session_id}", dependencies=[Depends(require_recording_access)])
+async def get_terminal_recording(session_id: str, http_request: Request):
+    """Stream a finished session recording (asciicast v2) for playback.
+
+    Sent gzipped as stored when the client accepts gzip, otherwise inflated
+    on the fly; the recording is never held in memory whole.
+    """
+    try:
+        session_id = str(uuid.UUID(session_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    gzipped = "gzip" in http_request.headers.get("accept-encoding", "")
+    chunks = await asyncio.to_thread(session_manager.recordings.playback, session_id, not gzipped)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    headers = {"Content-Encoding": "gzip"} if gzipped else {}
+    return StreamingResponse(chunks, media_type=RECORDING_CONTENT_TYPE, headers=headers)
+
+
 @app.websocket("/api/terminal/ws/{session_token}")
-async def terminal_websocket(websocket: WebSocket, session_token: str):
+async def terminal_websocket(websocket: WebSocket, session_token: str, since: int = 0):
     """WebSocket endpoint for interactive PTY terminal sessions.
     
     Protocol:
     - Client sends: {"type": "input", "data": "..."} for keyboard input
     - Client sends: {"type": "resize", "rows": N, "cols": M} for terminal resize
+    - Client sends: {"type": "pong", "id": N} in answer to a ping
+    - Server sends: {"type": "attached", "offset": N} once, before any output
+    - Server sends: {"type": "ping", "id": N} every heartbeat interval
     - Server sends: {"type": "output", "data": "..."} for PTY output
     - Server sends: {"type": "error", "message": "..."} for errors
+
+    Clients that offer the "terminal.v2" subprotocol get PTY output as binary
+    frames of the raw PTY bytes instead; JSON text frames then carry control
+    messages only.
+
+    Output is first replayed from the session's scrollback, starting at the
+    `since` query parameter (a byte offset into the session's output). The
+    "attached" message gives the offset the replay actually starts at; a
+    client that adds the byte length of all output it receives (UTF-8 length
+    for JSON output) can pass its total as `since` when it reconnects.
+
+    A connection for a session held by another worker is relayed to it.
+
+    A client must send something (a pong, at least) within the heartbeat
+    timeout of the first ping, and of every message after that, or it is
+    considered dead: the connection is closed with code 4002 and the session
+    detached, keeping its sandbox for the detach grace period in case the
+    client comes back.
     """
-    await websocket.accept()
+    # Verify session exists, here or on another worker
+    session = await session_manager.get_session(session_token)
+    if not session and not is_forwarded(websocket.headers):
+        owner_url = await session_manager.find_owner(session_token)
+        if owner_url:
+            logger.info(f"Relaying WebSocket for session {session_token} to {owner_url}")
+            await proxy_websocket(websocket, owner_url)
+            return
+    
+    binary_output = BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary_output else None)
     logger.info(f"WebSocket connection accepted for session: {session_token}")
     
-    # Verify session exists
-    session = session_manager.get_session(session_token)
     if not session:
         await websocket.send_json({"type": "error", "message": "Session not found or expired"})
         await websocket.close(code=4001)
         return
     
-    # Use a thread-safe queue since PTY output comes from a background thread
-    output_queue: queue.Queue[str] = queue.Queue()
+    # PTY output is handed to this connection through a bounded buffer
+    output_bridge = OutputBridge()
     
-    def on_pty_output(data: str):
-        """Callback when PTY produces output (called from background thread)."""
-        output_queue.put(data)
+    # Set up the output callback, replaying whatever the client missed first
+    attached = session_manager.attach_output(session_token, output_bridge.put, since)
+    if attached is None:
+        await websocket.close(code=4001)
+        return
+    offset, replay = attached
+    output_bridge.prime(replay)
+    await websocket.send_json({"type": "attached", "offset": offset})
     
-    # Set up the output callback
-    session_manager.set_output_callback(session_token, on_pty_output)
+    # Bursts of PTY output are merged into as few frames as possible
+    output_framer = OutputFramer(output_bridge, output_sender(websocket, binary_output))
     
     async def send_output():
         """Task to send PTY output to WebSocket."""
         try:
-            while True:
-                # Poll the thread-safe queue
-                try:
-                    # Use a small timeout to allow checking for cancellation
-                    data = await asyncio.get_event_loop().run_in_executor(
-                        None, lambda: output_queue.get(timeout=0.1)
-                    )
-                    await websocket.send_json({"type": "output", "data": data})
-                except queue.Empty:
-                    continue
+            await output_framer.run()
         except asyncio.CancelledError:
             pass
         except Exception as e:
             logger.error(f"Error sending output: {e}")
     
-    # Start output sender task
+    async def send_heartbeats():
+        """Task to ping the client every heartbeat interval."""
+        ping_id = 0
+        try:
+            while True:
+                await asyncio.sleep(settings.terminal_heartbeat_interval_seconds)
+                ping_id += 1
+                await websocket.send_json({"type": "ping", "id": ping_id})
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending heartbeat: {e}")
+    
+    # Start output sender and heartbeat tasks
     output_task = asyncio.create_task(send_output())
+    heartbeat_task = asyncio.create_task(send_heartbeats())
+    # The first ping goes out one interval in; from then on the client has to
+    # be heard from every heartbeat timeout
+    loop = asyncio.get_running_loop()
+    heartbeat_deadline = (
+        loop.time() + settings.terminal_heartbeat_interval_seconds + settings.terminal_heartbeat_timeout_seconds
+    )
     
     try:
         while True:
             # Receive messages from client
-            raw_message = await websocket.receive_text()
+            try:
+                raw_message = await asyncio.wait_for(
+                    websocket.receive_text(), timeout=max(0.0, heartbeat_deadline - loop.time())
+                )
+            except asyncio.TimeoutError:
+                logger.info(f"Heartbeat missed, detaching session: {session_token}")
+                await websocket.close(code=4002)
+                break
+            heartbeat_deadline = loop.time() + settings.terminal_heartbeat_timeout_seconds
             
             try:
                 message = json.loads(raw_message)
@@ -439,15 +690,22 @@ async def terminal_websocket(websocket: WebSocket, session_token: str):
                 # Send input to PTY
                 data = message.get("data", "")
                 if data:
-                    success = session_manager.send_input(session_token, data)
+                    success = await session_manager.send_input(session_token, data)
                     if not success:
                         await websocket.send_json({"type": "error", "message": "Failed to send input"})
+                        if session_token not in session_manager.sessions:
+                            # Closed while connected (expired or idle)
+                            await websocket.close(code=4001)
+                            break
+            
+            elif msg_type == "pong":
+                pass  # Only resets the heartbeat deadline
             
             elif msg_type == "resize":
                 # Resize PTY
                 rows = message.get("rows", 24)
                 cols = message.get("cols", 80)
-                session_manager.resize_pty(session_token, rows, cols)
+                await session_manager.resize_pty(session_token, rows, cols)
             
             else:
                 await websocket.send_json({"type": "error", "message": f"Unknown message type: {msg_type}"})
@@ -458,13 +716,15 @@ async def terminal_websocket(websocket: WebSocket, session_token: str):
         logger.error(f"WebSocket error: {e}")
     finally:
         # Clean up
-        output_task.cancel()
-        try:
-            await output_task
-        except asyncio.CancelledError:
-            pass
-        # Clear the callback
-        session_manager.set_output_callback(session_token, lambda _: None)
+        for task in (output_task, heartbeat_task):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        # Detach, then release the PTY if it was paused on this connection
+        session_manager.detach_output(session_token, output_bridge.put)
+        output_bridge.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,123 @@
+"""In-process metrics: counters, gauges and histograms exposed as JSON."""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+
+class Counter:
+    """A monotonically increasing count."""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Histogram:
+    """Count/sum/max of observations plus percentiles over the most recent ones."""
+
+    def __init__(self, window: int = 1024):
+        self._recent = deque(maxlen=window)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._recent.append(value)
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total, maximum = self._count, self._sum, self._max
+
+        def percentile(p: float):
+            if not recent:
+                return None
+            return recent[min(len(recent) - 1, int(p * len(recent)))]
+
+        return {
+            "count": count,
+            "sum": total,
+            "max": maximum,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        }
+
+
+class Registry:
+    """Named metrics, created on first use."""
+
+    def __init__(self):
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        with self._lock:
+            return self._counters.setdefault(name, Counter())
+
+    def histogram(self, name: str) -> Histogram:
+        with self._lock:
+            return self._histograms.setdefault(name, Histogram())
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Register a gauge whose value is read when a snapshot is taken."""
+        with self._lock:
+            self._gauges[name] = read
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+            gauges = dict(self._gauges)
+        return {
+            "counters": {name: c.value for name, c in sorted(counters.items())},
+            "gauges": {name: read() for name, read in sorted(gauges.items())},
+            "histograms": {name: h.snapshot() for name, h in sorted(histograms.items())},
+        }
+
+
+# Global metrics registry
+registry = Registry()
+
+
+class PhaseTimer:
+    """Durations of the phases of one operation (e.g. a session's start).
+
+    Each phase is also observed into the `<prefix>.<phase>_seconds` histogram.
+    Phases that raise are not recorded.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.durations: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        yield
+        self.record(name, time.monotonic() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        registry.histogram(f"{self.prefix}.{name}_seconds").observe(seconds)
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.durations.items())
@@ -11,6 +11,8 @@ class TerminalSession(Base):
     token = Column(String, unique=True, index=True, nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
+    owner = Column(String, nullable=True, index=True)  # process holding the sandbox
+    owner_url = Column(String, nullable=True)  # where other workers can reach the owner
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
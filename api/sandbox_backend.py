@@ -0,0 +1,421 @@
+"""Sandbox backends for terminal sessions.
+
+The session manager talks to a sandbox through the surface of the E2B
+`AsyncSandbox` it was written against: `files`, `commands`, `pty`,
+`set_timeout` and `kill`. `Sandbox` spells that surface out, and
+`create_sandbox` picks the implementation named by `settings.sandbox_backend`:
+
+- "e2b": a remote E2B sandbox (the default).
+- "local": a `LocalSandbox` on this machine, a temp directory with real
+  PTYs (`os.openpty`) and subprocesses. It needs no network or API key, so
+  the session manager and WebSocket path can be profiled and load tested
+  offline. It is not isolated in any way; never serve it to the public.
+"""
+
+import asyncio
+import codecs
+import fcntl
+import inspect
+import os
+import re
+import shutil
+import signal
+import struct
+import tempfile
+import termios
+from typing import IO, Any, Callable, Dict, Optional, Protocol, Set, Union
+
+from e2b import CommandExitException, CommandResult, SandboxException
+from e2b.sandbox.commands.command_handle import PtySize
+from e2b_code_interpreter import AsyncSandbox
+
+from config import settings
+
+# Home directory of the sandbox user; PTYs and commands start here
+HOME_DIR = "/home/user"
+
+# Largest read from a PTY or a command's pipes
+READ_SIZE = 64 * 1024
+
+# Sandbox paths that a LocalSandbox keeps inside its temp directory
+_LOCAL_PATHS = re.compile(r"(?<![\w.~-])(/home/user|/tmp)(?![\w.-])")
+
+
+class Sandbox(Protocol):
+    """What a session needs from a sandbox (a subset of E2B's `AsyncSandbox`).
+
+    `files.write(path, data)` writes a file. `commands.run(cmd, background=...,
+    on_stdout=..., on_stderr=..., timeout=...)` runs a shell command and returns
+    its result, or with `background=True` a handle with `wait()` and `kill()`.
+    `pty.create(size, on_data, cwd=..., timeout=...)` starts a shell on a PTY
+    and returns a handle with `pid`, `exit_code` and `wait()`; its output is
+    passed to `on_data`, which may return an awaitable to hold the PTY back.
+    `pty.send_stdin`, `pty.resize` and `pty.kill` take that pid.
+    """
+
+    files: Any
+    commands: Any
+    pty: Any
+
+    async def set_timeout(self, timeout: int) -> None: ...
+
+    async def kill(self) -> Any: ...
+
+
+async def create_sandbox(timeout: int) -> Sandbox:
+    """Create a sandbox with the configured backend, killed after `timeout` seconds."""
+    if settings.sandbox_backend == "local":
+        return await LocalSandbox.create(timeout=timeout)
+    return await AsyncSandbox.create(timeout=timeout)
+
+
+async def _maybe_await(result: Any) -> None:
+    if inspect.isawaitable(result):
+        await result
+
+
+def _set_window_size(fd: int, size: PtySize) -> None:
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack("HHHH", size.rows, size.cols, 0, 0))
+
+
+def _new_terminal_session(fd: int) -> Callable[[], None]:
+    # Runs in the child before exec: start a session with the PTY as its
+    # terminal, so the shell gets job control, SIGWINCH and SIGHUP. Uses the
+    # PTY's own fd, as uvloop runs this before stdin is set up.
+    def setup() -> None:
+        os.setsid()
+        fcntl.ioctl(fd, termios.TIOCSCTTY, 0)
+    return setup
+
+
+def _kill_group(pid: int) -> bool:
+    """SIGKILL everything a sandbox process started.
+
+    Each process runs as the leader of its own session. Kill its process
+    group and then, where /proc lists them, every other process in the
+    session: the shell's background jobs sit in groups of their own.
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        return False
+    if os.path.isdir("/proc"):
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                if os.getsid(int(entry)) == pid:
+                    os.kill(int(entry), signal.SIGKILL)
+            except OSError:
+                pass
+    return True
+
+
+class LocalCommandHandle:
+    """A command started by `LocalCommands.run`; mirrors E2B's `AsyncCommandHandle`."""
+
+    def __init__(
+        self,
+        process: asyncio.subprocess.Process,
+        on_stdout: Optional[Callable[[str], Any]],
+        on_stderr: Optional[Callable[[str], Any]],
+    ):
+        self.process = process
+        self.pid = process.pid
+        self.exit_code: Optional[int] = None
+        self._stdout: list = []
+        self._stderr: list = []
+        self._pumps = [
+            asyncio.create_task(self._pump(process.stdout, self._stdout, on_stdout)),
+            asyncio.create_task(self._pump(process.stderr, self._stderr, on_stderr)),
+        ]
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, parts: list, callback: Optional[Callable[[str], Any]]) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        while True:
+            data = await stream.read(READ_SIZE)
+            text = decoder.decode(data, final=not data)
+            if text:
+                parts.append(text)
+                if callback:
+                    await _maybe_await(callback(text))
+            if not data:
+                return
+
+    async def wait(self) -> CommandResult:
+        """Wait for the command to finish; raises CommandExitException on a non-zero exit."""
+        await asyncio.gather(*self._pumps)
+        self.exit_code = await self.process.wait()
+        if self._timer:
+            self._timer.cancel()
+        result = dict(stdout="".join(self._stdout), stderr="".join(self._stderr), exit_code=self.exit_code, error=None)
+        if self.exit_code:
+            raise CommandExitException(**result)
+        return CommandResult(**result)
+
+    async def kill(self) -> bool:
+        return _kill_group(self.pid)
+
+
+class LocalPtyHandle:
+    """A shell running on a PTY; mirrors the handle E2B's `pty.create` returns.
+
+    Output is read off the PTY master by a task and handed to `on_data`. When
+    `on_data` returns an awaitable, nothing more is read until it resolves,
+    so the kernel's PTY buffer fills up and the shell blocks on its writes.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process, fd: int, on_data: Callable[[bytes], Any]):
+        self.process = process
+        self.pid = process.pid
+        self.fd = fd
+        self.exit_code: Optional[int] = None
+        self.killed = False  # Set when the sandbox itself goes away
+        self._on_data = on_data
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self.fd, readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                try:
+                    data = os.read(self.fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    return  # EIO: every process on the terminal has gone
+                if not data:
+                    return
+                await _maybe_await(self._on_data(data))
+        finally:
+            self._close_fd()
+
+    def _close_fd(self) -> None:
+        if self.fd >= 0:
+            asyncio.get_running_loop().remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = -1
+
+    async def write(self, data: bytes) -> None:
+        loop = asyncio.get_running_loop()
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                # The shell isn't reading its input; wait until the PTY takes more
+                writable = loop.create_future()
+                loop.add_writer(self.fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(self.fd)
+
+    async def wait(self) -> CommandResult:
+        """Wait for the shell to exit. Raises CommandExitException on a non-zero
+        exit, and SandboxException (with no exit code) if the sandbox was killed."""
+        await asyncio.wait([self._reader])
+        code = await self.process.wait()
+        if self.killed:
+            raise SandboxException("Sandbox was killed")
+        self.exit_code = code
+        if code:
+            raise CommandExitException(stdout="", stderr="", exit_code=code, error=None)
+        return CommandResult(stdout="", stderr="", exit_code=code, error=None)
+
+    def close(self) -> None:
+        """Kill the shell's process group and hang up the terminal."""
+        self.killed = True
+        self._reader.cancel()
+        _kill_group(self.pid)
+        self._close_fd()  # Hangs up: the kernel sends SIGHUP to the shell's jobs
+
+
+class LocalFiles:
+    def __init__(self, sandbox: "LocalSandbox"):
+        self._sandbox = sandbox
+
+    async def read(self, path: str, format: str = "text") -> Union[str, bytes]:
+        with open(self._sandbox.path(path), "rb") as f:
+            data = await asyncio.to_thread(f.read)
+        return data if format == "bytes" else data.decode()
+
+    async def write(self, path: str, data: Union[str, bytes, IO]) -> None:
+        path = self._sandbox.path(path)
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            await asyncio.to_thread(f.write, data)
+
+
+class LocalCommands:
+    def __init__(self, sandbox: "LocalSandbox"):
+        self._sandbox = sandbox
+        self._running: Set[LocalCommandHandle] = set()
+
+    async def run(
+        self,
+        cmd: str,
+        background: bool = False,
+        envs: Optional[Dict[str, str]] = None,
+        cwd: Optional[str] = None,
+        on_stdout: Optional[Callable[[str], Any]] = None,
+        on_stderr: Optional[Callable[[str], Any]] = None,
+        timeout: Optional[float] = 60,
+        **_: Any,
+    ) -> Union[CommandResult, LocalCommandHandle]:
+        """Run `cmd` with bash; like E2B, `timeout` (0 for none) kills it when it runs over."""
+        process = await asyncio.create_subprocess_exec(
+            "bash", "-c", self._sandbox.translate(cmd),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self._sandbox.path(cwd or HOME_DIR),
+            env=self._sandbox.environment(envs),
+            start_new_session=True,
+        )
+        handle = LocalCommandHandle(process, on_stdout, on_stderr)
+        self._running.add(handle)
+        process_done = asyncio.ensure_future(process.wait())
+        process_done.add_done_callback(lambda _: self._running.discard(handle))
+        if timeout:
+            handle._timer = asyncio.get_running_loop().call_later(timeout, _kill_group, handle.pid)
+        if background:
+            return handle
+        return await handle.wait()
+
+    def close(self) -> None:
+        for handle in self._running:
+            _kill_group(handle.pid)
+        self._running.clear()
+
+
+class LocalPty:
+    def __init__(self, sandbox: "LocalSandbox"):
+        self._sandbox = sandbox
+        self._handles: Dict[int, LocalPtyHandle] = {}
+
+    async def create(
+        self,
+        size: PtySize,
+        on_data: Callable[[bytes], Any],
+        cwd: Optional[str] = None,
+        envs: Optional[Dict[str, str]] = None,
+        **_: Any,
+    ) -> LocalPtyHandle:
+        """Start an interactive bash on a new PTY. There's no timeout; it runs until killed."""
+        master, slave = os.openpty()
+        try:
+            _set_window_size(master, size)
+            process = await asyncio.create_subprocess_exec(
+                "bash", "-i",
+                stdin=slave, stdout=slave, stderr=slave,
+                cwd=self._sandbox.path(cwd or HOME_DIR),
+                env=self._sandbox.environment({"TERM": "xterm-256color", **(envs or {})}),
+                preexec_fn=_new_terminal_session(slave),
+            )
+        except Exception:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        os.set_blocking(master, False)
+        handle = LocalPtyHandle(process, master, on_data)
+        self._handles[handle.pid] = handle
+        return handle
+
+    def _handle(self, pid: int) -> LocalPtyHandle:
+        handle = self._handles.get(pid)
+        if handle is None:
+            raise SandboxException(f"PTY {pid} not found")
+        return handle
+
+    async def send_stdin(self, pid: int, data: bytes) -> None:
+        await self._handle(pid).write(data)
+
+    async def resize(self, pid: int, size: PtySize) -> None:
+        # The kernel sends SIGWINCH to the terminal's foreground job
+        _set_window_size(self._handle(pid).fd, size)
+
+    async def kill(self, pid: int) -> bool:
+        handle = self._handles.get(pid)
+        return _kill_group(pid) if handle else False
+
+    def close(self) -> None:
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+
+
+class LocalSandbox:
+    """A sandbox made of a temp directory and processes on this machine.
+
+    Sandbox paths under /home/user and /tmp are kept inside the temp
+    directory: file paths are mapped, and so are those two prefixes where
+    they appear in command lines. Everything else is the host's. Like an E2B
+    sandbox, it kills itself `timeout` seconds after creation or the last
+    `set_timeout`.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.sandbox_id = f"local-{os.path.basename(root)}"
+        self.home = self.path(HOME_DIR)
+        self.files = LocalFiles(self)
+        self.commands = LocalCommands(self)
+        self.pty = LocalPty(self)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._killed = False
+        os.makedirs(self.home)
+        os.makedirs(self.path("/tmp"))
+
+    @classmethod
+    async def create(cls, timeout: Optional[int] = None, **_: Any) -> "LocalSandbox":
+        sandbox = cls(tempfile.mkdtemp(prefix="sandbox-"))
+        if timeout:
+            await sandbox.set_timeout(timeout)
+        return sandbox
+
+    def path(self, path: str) -> str:
+        """Where a sandbox path lives on this machine."""
+        if not path.startswith("/"):
+            return os.path.join(self.path(HOME_DIR), path)
+        return self.root + path if _LOCAL_PATHS.match(path) else path
+
+    def translate(self, command: str) -> str:
+        return _LOCAL_PATHS.sub(lambda m: self.root + m.group(1), command)
+
+    def environment(self, envs: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        return {
+            "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+            "HOME": self.home,
+            "USER": "user",
+            "LANG": "C.UTF-8",
+            "TMPDIR": self.path("/tmp"),
+            **(envs or {}),
+        }
+
+    async def set_timeout(self, timeout: int) -> None:
+        if self._timer:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(timeout, lambda: asyncio.create_task(self.kill()))
+
+    async def kill(self) -> bool:
+        if self._killed:
+            return False
+        self._killed = True
+        if self._timer:
+            self._timer.cancel()
+        self.pty.close()
+        self.commands.close()
+        await asyncio.to_thread(shutil.rmtree, self.root, True)
+        return True
@@ -0,0 +1,173 @@
+"""Warm pool of pre-provisioned terminal sandboxes."""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Optional, Set
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmSandbox:
+    """A session whose sandbox is populated and has its PTY created, ready to hand out."""
+    session: Any
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SandboxPool:
+    """Keeps ready sandboxes around so starting a session doesn't wait on provisioning.
+
+    The pool aims for `min_size` ready sandboxes. Every miss raises the target
+    by one (up to `max_size`); after `max_age_seconds` without misses it decays
+    back toward `min_size`. Sandboxes older than `max_age_seconds` are killed
+    and replaced, which must be shorter than the timeout they were created with.
+
+    `create` and `kill` are coroutine functions.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[], Awaitable[WarmSandbox]],
+        kill: Callable[[WarmSandbox], Awaitable[None]],
+        min_size: int,
+        max_size: int,
+        max_age_seconds: float,
+        retry_seconds: float = 30,
+    ):
+        self._create = create
+        self._kill = kill
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.max_age_seconds = max_age_seconds
+        self.retry_seconds = retry_seconds
+
+        self._ready: Deque[WarmSandbox] = deque()
+        self._provisioning = 0
+        self._target = min_size
+        self._last_miss_at = 0.0
+        self._retry_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._pending: Set[asyncio.Task] = set()
+
+        self._hits = registry.counter("terminal.pool.hits")
+        self._misses = registry.counter("terminal.pool.misses")
+        self._expired = registry.counter("terminal.pool.expired")
+        self._failures = registry.counter("terminal.pool.provision_failures")
+        self._provision_time = registry.histogram("terminal.pool.provision_seconds")
+        registry.gauge("terminal.pool.ready", lambda: len(self._ready))
+        registry.gauge("terminal.pool.target", lambda: self._target)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop refilling and kill every sandbox still in the pool."""
+        if self._task:
+            # wait_for (3.11) can swallow a cancel that races its wakeup;
+            # the flag makes _run stop on its next pass anyway
+            self._closing = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let in-flight provisioning finish so those sandboxes get killed too
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        ready, self._ready = list(self._ready), deque()
+        await asyncio.gather(*(self._kill(w) for w in ready), return_exceptions=True)
+
+    def acquire(self) -> Optional[WarmSandbox]:
+        """Take the oldest usable sandbox from the pool, or None on a miss."""
+        now = time.monotonic()
+        warm = None
+        while self._ready:
+            candidate = self._ready.popleft()
+            if now - candidate.created_at < self.max_age_seconds:
+                warm = candidate
+                break
+            self._discard(candidate)
+
+        if warm:
+            self._hits.inc()
+        elif self.enabled:
+            self._misses.inc()
+            self._last_miss_at = now
+            self._target = min(self.max_size, self._target + 1)
+        self._wakeup.set()
+        return warm
+
+    def stats(self) -> dict:
+        return {
+            "ready": len(self._ready),
+            "provisioning": self._provisioning,
+            "target": self._target,
+            "hits": self._hits.value,
+            "misses": self._misses.value,
+        }
+
+    def _discard(self, warm: WarmSandbox) -> None:
+        self._expired.inc()
+        self._spawn(self._kill(warm))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _provision(self) -> None:
+        started = time.monotonic()
+        try:
+            warm = await self._create()
+        except Exception as e:
+            self._failures.inc()
+            self._retry_at = time.monotonic() + self.retry_seconds
+            logger.warning(f"Failed to provision pooled sandbox: {type(e).__name__}: {e}")
+            return
+        finally:
+            self._provisioning -= 1
+            self._wakeup.set()
+        self._provision_time.observe(time.monotonic() - started)
+        self._ready.append(warm)
+
+    async def _run(self) -> None:
+        while not self._closing:
+            now = time.monotonic()
+
+            # Age out sandboxes before their timeout runs out
+            while self._ready and now - self._ready[0].created_at >= self.max_age_seconds:
+                self._discard(self._ready.popleft())
+
+            if self._target > self.min_size and now - self._last_miss_at > self.max_age_seconds:
+                self._target -= 1
+                self._last_miss_at = now
+
+            if now >= self._retry_at:
+                while len(self._ready) + self._provisioning < self._target:
+                    self._provisioning += 1
+                    self._spawn(self._provision())
+
+            # Sleep until the oldest sandbox ages out, a retry is due or something changes
+            timeout = self.max_age_seconds
+            if self._ready:
+                timeout = max(0.0, self._ready[0].created_at + self.max_age_seconds - now)
+            if self._retry_at > now:
+                timeout = min(timeout, self._retry_at - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
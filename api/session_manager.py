@@ -1,28 +1,73 @@
 import uuid
 import asyncio
-import threading
+import logging
+import os
+import socket
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional, Callable
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Callable, Set, Tuple
 from dataclasses import dataclass, field
-from e2b_code_interpreter import Sandbox
 from e2b.sandbox.commands.command_handle import PtySize
-from database import SessionLocal
-from models import TerminalSession
+from admission import AdmissionQueue
+from config import settings
+from metrics import PhaseTimer, registry
 from e2b_setup import populate_example_files
+from sandbox_backend import HOME_DIR, Sandbox, create_sandbox
+from expiry_scheduler import ExpiryScheduler
+from sandbox_pool import SandboxPool, WarmSandbox
+from session_recording import RecordingWriter, SessionRecorder
+from session_store import SessionStore
+from terminal_io import InputPipeline, ScrollbackBuffer
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SESSION_TTL_SECONDS = 600
 
+# Sandboxes outlive their session's expiry by this much, so the sandbox is
+# still there when an active session's TTL is extended at the deadline
+SANDBOX_TIMEOUT_GRACE_SECONDS = 30
+
+# How often a waiting client should ask again for a session slot
+QUEUE_RETRY_SECONDS = 2
+
+# Identifies the process that owns (holds the sandbox for) a session
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Receives raw PTY output; may return an awaitable to hold the PTY back
+OutputCallback = Callable[[bytes], Optional[Awaitable[None]]]
+
 
 @dataclass
 class PtySession:
-    """Holds PTY session state."""
+    """Holds PTY session state.
+
+    All sandbox I/O goes through the async sandbox backend (the E2B SDK, or a
+    local stand-in, see sandbox_backend.py) on the event loop; PTY output is
+    delivered by the backend's own reader task, so no threads are used.
+    The in-memory session is authoritative; the database only records
+    lifecycle transitions (see session_store.py).
+    """
     sandbox: Sandbox
-    pty_pid: int
-    output_callback: Optional[Callable[[str], None]] = None
-    _event_thread: Optional[threading.Thread] = field(default=None, repr=False)
-    _stop_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    pty_pid: int = 0
+    session_id: str = ""
+    expires_at: Optional[datetime] = None
+    started_at: float = field(default_factory=time.time)
+    last_activity: float = field(default_factory=time.time)
+    connections: int = 0
+    detached_at: Optional[float] = None  # when its last WebSocket went away; None while attached
+    is_active: bool = True
+    owner: str = PROCESS_ID
+    pty_handle: Any = field(default=None, repr=False)
+    output_callback: Optional[OutputCallback] = None
+    input: Optional[InputPipeline] = field(default=None, repr=False)
+    scrollback: ScrollbackBuffer = field(default_factory=ScrollbackBuffer, repr=False)
+    recorder: Optional[SessionRecorder] = field(default=None, repr=False)
+    # Provisioning and teardown phases, see SessionManager._provision_sandbox
+    timings: PhaseTimer = field(default_factory=lambda: PhaseTimer("terminal.phase"), repr=False)
+    pty_started: float = 0.0  # monotonic time pty.create was called, until the first byte
+    _watch_task: Optional[asyncio.Task] = field(default=None, repr=False)
 
 
 class SessionManager:
@@ -30,174 +75,334 @@ class SessionManager:
 
     def __init__(self):
         self.sessions: Dict[str, PtySession] = {}  # token -> PtySession
-        self._lock = threading.Lock()
-
-    async def start_session(self, on_output: Optional[Callable[[str], None]] = None) -> dict:
-        """Create a new E2B terminal session with PTY."""
-        session_id = str(uuid.uuid4())
-        token = str(uuid.uuid4())
-        expires_at = datetime.now(timezone.utc) + timedelta(seconds=SESSION_TTL_SECONDS)
-
+        self.store = SessionStore()
+        self.recordings = RecordingWriter(
+            settings.terminal_recording,
+            settings.terminal_recording_dir,
+            settings.terminal_recording_max_bytes,
+            bucket=os.getenv("BUCKET_NAME"),
+        )
+        self.pool = SandboxPool(
+            # Pooled sandboxes must outlive their time in the pool plus a full session
+            create=lambda: self._provision_sandbox(SESSION_TTL_SECONDS + settings.sandbox_pool_max_age_seconds),
+            kill=self._kill_warm_sandbox,
+            min_size=settings.sandbox_pool_min_size,
+            max_size=settings.sandbox_pool_max_size,
+            max_age_seconds=settings.sandbox_pool_max_age_seconds,
+        )
+        # Sessions are closed the moment they expire, a bounded number of kills at a time
+        self.expiry = ExpiryScheduler(self._expire)
+        self._kill_slots = asyncio.Semaphore(settings.sandbox_kill_concurrency)
+        self._pending: Set[asyncio.Task] = set()
+        self.admission = AdmissionQueue(
+            settings.terminal_max_sessions,
+            ticket_ttl_seconds=settings.terminal_queue_ticket_ttl_seconds,
+        )
+        self._time_to_prompt = registry.histogram("terminal.time_to_prompt_seconds")
+        self._kill_time = registry.histogram("terminal.sandbox.kill_seconds")
+        self._expired = registry.counter("terminal.sessions.expired")
+        self._idle_closed = registry.counter("terminal.sessions.idle_closed")
+        self._extended = registry.counter("terminal.sessions.extended")
+        self._abandoned = registry.counter("terminal.sessions.abandoned")
+        self._commands_killed = registry.counter("terminal.execute.killed")
+        registry.gauge("terminal.sessions.active", lambda: len(self.sessions))
+
+    def start(self) -> None:
+        """Start the background work: session writes, recordings, expiry and the sandbox pool."""
+        self.store.start()
+        self.recordings.start()
+        self.expiry.start()
+        self.pool.start()
+
+    async def close(self) -> None:
+        """Kill every live and pooled sandbox in parallel, then flush recordings and session writes."""
+        await self.expiry.close()
+        tokens = list(self.sessions)
+        await asyncio.gather(
+            *(self._close_session_internal(token) for token in tokens),
+            *self._pending,
+            self.pool.close(),
+            return_exceptions=True,
+        )
+        await self.recordings.close()
+        self.store.deactivated(*tokens)
+        await self.store.close()
+
+    async def _provision_sandbox(self, timeout: int) -> WarmSandbox:
+        """Create a sandbox, populate it and start its PTY.
+
+        Each step is timed into a terminal.phase.*_seconds histogram:
+        sandbox_create, populate, pty_create and pty_first_byte (from
+        pty.create to the shell's first output, recorded when it arrives).
+        """
+        timings = PhaseTimer("terminal.phase")
+        with timings.phase("sandbox_create"):
+            sandbox = await create_sandbox(timeout)
+        pty_session = PtySession(sandbox=sandbox, timings=timings)
         try:
-            sandbox = Sandbox.create(timeout=SESSION_TTL_SECONDS)
-            populate_example_files(sandbox)
+            with timings.phase("populate"):
+                await populate_example_files(sandbox)
 
             # Create PTY session for interactive terminal
             # timeout=0 disables the timeout for long-running sessions
             size = PtySize(rows=24, cols=80)
-            pty_handle = sandbox.pty.create(
-                size=size,
-                cwd="/home/user",
-                timeout=0,  # Disable timeout for interactive PTY
-            )
+            pty_session.pty_started = time.monotonic()
+            with timings.phase("pty_create"):
+                pty_handle = await sandbox.pty.create(
+                    size=size,
+                    on_data=lambda data: self._handle_pty_output(pty_session, data),
+                    cwd=HOME_DIR,
+                    timeout=0,  # Disable timeout for interactive PTY
+                )
+        except Exception:
+            await sandbox.kill()
+            raise
+        pty_session.pty_pid = pty_handle.pid
+        pty_session.pty_handle = pty_handle
+        pty_session.input = self._input_pipeline(pty_session)
+        return WarmSandbox(session=pty_session)
+
+    @staticmethod
+    async def _kill_warm_sandbox(warm: WarmSandbox) -> None:
+        try:
+            await warm.session.sandbox.kill()
+        except Exception:
+            pass  # Ignore errors during cleanup
 
-            pty_session = PtySession(
-                sandbox=sandbox,
-                pty_pid=pty_handle.pid,
-                output_callback=on_output,
-            )
-            with self._lock:
-                self.sessions[token] = pty_session
+    async def start_session(self, on_output: Optional[OutputCallback] = None, ticket: Optional[str] = None) -> dict:
+        """Create a new E2B terminal session with PTY.
 
-            # Start background thread to read PTY output
-            self._start_output_reader(token, pty_handle)
+        If all session slots are taken, no sandbox is created; the result is
+        {"status": "queued", "ticket", "position", "retry_after"} and the caller
+        asks again with the ticket. Raises UnknownTicket for a stale ticket.
+        """
+        admission = self.admission.acquire(ticket)
+        if not admission.admitted:
+            return {
+                "status": "queued",
+                "ticket": admission.ticket,
+                "position": admission.position,
+                "retry_after": QUEUE_RETRY_SECONDS,
+            }
 
-            # Store in database
-            db = SessionLocal()
-            try:
-                db_session = TerminalSession(
-                    session_id=session_id,
-                    token=token,
-                    expires_at=expires_at,
-                    is_active=True
-                )
-                db.add(db_session)
-                db.commit()
-            finally:
-                db.close()
+        started = time.monotonic()
+        session_id = str(uuid.uuid4())
+        token = str(uuid.uuid4())
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=SESSION_TTL_SECONDS)
+        timings = PhaseTimer("terminal.phase")
 
+        warm: Optional[WarmSandbox] = None
+        try:
+            warm = self.pool.acquire()
+            pool_hit = warm is not None
+            if warm:
+                # Pooled sandboxes were created with a longer timeout; pin it to this session
+                with timings.phase("set_timeout"):
+                    await warm.session.sandbox.set_timeout(SESSION_TTL_SECONDS + SANDBOX_TIMEOUT_GRACE_SECONDS)
+            else:
+                warm = await self._provision_sandbox(SESSION_TTL_SECONDS + SANDBOX_TIMEOUT_GRACE_SECONDS)
+                timings.durations.update(warm.session.timings.durations)
+
+            pty_session = warm.session
+            pty_session.session_id = session_id
+            pty_session.expires_at = expires_at
+            pty_session.started_at = pty_session.last_activity = time.time()
+            pty_session.output_callback = on_output
+            pty_session.recorder = self.recordings.open(session_id)
+            if pty_session.recorder:
+                # A pooled sandbox printed its prompt before the session began
+                pty_session.recorder.output(pty_session.scrollback.read_since(0))
+            self.sessions[token] = pty_session
+            self.expiry.schedule(token, self._next_deadline(pty_session))
+
+            # Watch the PTY event stream so a dead sandbox is noticed
+            pty_session._watch_task = asyncio.create_task(self._watch_pty(token, pty_session))
+
+            # Record the session in the database (write-behind). Other workers
+            # route to this one by that row, so with routing on, wait for it.
+            written = self.store.created(session_id, token, expires_at, PROCESS_ID, settings.worker_url or None)
+            insert_started = time.monotonic()
+
+            def observe_insert(future: asyncio.Future) -> None:
+                if not future.cancelled() and future.exception() is None:
+                    registry.histogram("terminal.phase.db_insert_seconds").observe(time.monotonic() - insert_started)
+            written.add_done_callback(observe_insert)
+            if settings.worker_url:
+                with timings.phase("db_insert_wait"):
+                    await written
+
+            elapsed = time.monotonic() - started
+            self._time_to_prompt.observe(elapsed)
+            logger.info(
+                f"Session {session_id} [{token[:8]}] started in {elapsed * 1000:.1f}ms "
+                f"(pool {'hit' if pool_hit else 'miss'}): {timings.summary()}"
+            )
             return {
                 "session_token": token,
                 "expires_at": expires_at.isoformat(),
                 "expires_in": SESSION_TTL_SECONDS
             }
         except Exception as e:
+            if token in self.sessions:
+                # Registered, but without its row other workers can't route to it
+                await self._close_session_internal(token)
+            else:
+                self.admission.release()
+                if warm is not None:
+                    # Never handed out, so nothing else would kill it before its timeout
+                    if warm.session.input:
+                        warm.session.input.close()
+                    if warm.session.recorder:
+                        self.recordings.finish(warm.session.recorder)
+                    await self._kill_warm_sandbox(warm)
             raise Exception(f"Failed to create session: {str(e)}") from e
 
-    def _start_output_reader(self, token: str, pty_handle) -> None:
-        """Start a background thread to read PTY output events."""
-        with self._lock:
-            session = self.sessions.get(token)
-        if not session:
-            return
+    async def _watch_pty(self, token: str, session: PtySession) -> None:
+        """Wait for the PTY event stream to end; if it breaks, the sandbox is gone."""
+        try:
+            await session.pty_handle.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if session.pty_handle.exit_code is not None:
+                return  # The shell exited on its own
+            print(f"PTY output reader error: {e}")
+            # Sandbox is dead — clean up in-memory state only (skip sandbox.kill)
+            await self._close_session_internal(token, sandbox_dead=True)
+            self.store.deactivated(token)
+
+    def _handle_pty_output(self, session: PtySession, data: bytes) -> Optional[Awaitable[None]]:
+        """Handle output from PTY and forward to callback.
+
+        Output stays bytes; it is only decoded where text is needed (see
+        terminal_io.output_sender). It is always recorded in the session's
+        scrollback, so it can be replayed to a client that connects later, and
+        queued for the session recording when recording is on. If the callback
+        returns an awaitable (its buffer is full), it is handed back to the
+        SDK, which awaits it before reading more PTY output.
+        """
+        session.last_activity = time.time()
+        if session.pty_started:
+            session.timings.record("pty_first_byte", time.monotonic() - session.pty_started)
+            session.pty_started = 0.0
+        session.scrollback.write(data)
+        if session.recorder:
+            session.recorder.output(data)
+        if not session.output_callback:
+            return None
+        try:
+            return session.output_callback(data)
+        except Exception as e:
+            print(f"Output callback error: {e}")
+            return None
 
-        def read_events():
-            try:
-                # Iterator yields tuples: (stdout, stderr, pty)
-                for stdout, stderr, pty in pty_handle:
-                    if session._stop_event.is_set():
-                        break
-                    # Handle stdout output
-                    if stdout is not None:
-                        self._handle_pty_output(token, stdout)
-                    # Handle stderr output
-                    if stderr is not None:
-                        self._handle_pty_output(token, stderr)
-                    # Handle PTY output (raw bytes)
-                    if pty is not None:
-                        # PTY output is bytes, decode to string
-                        if isinstance(pty, bytes):
-                            self._handle_pty_output(token, pty.decode('utf-8', 'replace'))
-                        else:
-                            self._handle_pty_output(token, str(pty))
-            except Exception as e:
-                print(f"PTY output reader error: {e}")
-                # Sandbox is dead — clean up in-memory state only (skip sandbox.kill)
-                self._close_session_internal(token, sandbox_dead=True)
+    def attach_output(self, token: str, callback: OutputCallback, since: int = 0) -> Optional[Tuple[int, bytes]]:
+        """Set the output callback for a session and return the scrollback after `since`.
 
-        thread = threading.Thread(target=read_events, daemon=True)
-        session._event_thread = thread
-        thread.start()
+        Returns the stream offset the replayed bytes start at, and the bytes;
+        output produced from then on goes to the callback, with no gap or
+        overlap. Returns None if there is no such session.
+        """
+        session = self.sessions.get(token)
+        if session is None:
+            return None
+        start = min(max(since, session.scrollback.start), session.scrollback.end)
+        replay = session.scrollback.read_since(start)
+        if start > since:
+            # The ring wrapped past `since`; don't replay half of a character
+            skip = 0
+            while skip < min(3, len(replay)) and replay[skip] & 0xC0 == 0x80:
+                skip += 1
+            start, replay = start + skip, replay[skip:]
+        session.output_callback = callback
+        session.connections += 1
+        session.detached_at = None
+        return start, replay
+
+    def detach_output(self, token: str, callback: OutputCallback) -> None:
+        """Undo `attach_output` when a connection goes away.
+
+        Output keeps going to the scrollback. Once no client is connected, the
+        session is torn down unless one attaches within the detach grace period.
+        """
+        session = self.sessions.get(token)
+        if session is None:
+            return
+        # A newer connection may have attached already; leave its callback alone
+        if session.output_callback == callback:
+            session.output_callback = None
+        session.connections = max(0, session.connections - 1)
+        if session.connections == 0:
+            session.detached_at = time.time()
+            self.expiry.schedule(token, self._next_deadline(session))
+
+    async def find_owner(self, token: str) -> Optional[str]:
+        """URL of the other worker that owns a session this process doesn't hold, if any."""
+        if token in self.sessions:
+            return None
+        owner = await self.store.lookup_owner(token)
+        if owner is None:
+            return None
+        process_id, owner_url = owner
+        if process_id == PROCESS_ID or not owner_url or owner_url == settings.worker_url:
+            return None
+        return owner_url
+
+    async def get_session(self, token: str) -> Optional[PtySession]:
+        """Retrieve an active session by token."""
+        session = self.sessions.get(token)
+        if session is None:
+            return None
 
-    def _handle_pty_output(self, token: str, data: str) -> None:
-        """Handle output from PTY and forward to callback."""
-        with self._lock:
-            session = self.sessions.get(token)
-        if session and session.output_callback:
-            try:
-                session.output_callback(data)
-            except Exception as e:
-                print(f"Output callback error: {e}")
+        if not session.is_active or session.expires_at <= datetime.now(timezone.utc):
+            # Session expired
+            await self._close_session_internal(token)
+            self.store.deactivated(token)
+            return None
 
-    def set_output_callback(self, token: str, callback: Callable[[str], None]) -> bool:
-        """Set the output callback for a session (used when WebSocket connects)."""
-        with self._lock:
-            if token in self.sessions:
-                self.sessions[token].output_callback = callback
-                return True
-        return False
+        return session
 
-    def get_session(self, token: str) -> Optional[PtySession]:
-        """Retrieve an active session by token."""
-        with self._lock:
-            if token not in self.sessions:
-                return None
+    @staticmethod
+    def _input_pipeline(session: PtySession) -> InputPipeline:
+        """The ordered, batching path for the session's keystrokes and resizes."""
+        async def write(data: bytes) -> None:
+            await session.sandbox.pty.send_stdin(session.pty_pid, data)
 
-        # Verify session is still valid in database
-        db = SessionLocal()
-        try:
-            db_session = db.query(TerminalSession).filter(
-                TerminalSession.token == token,
-                TerminalSession.is_active == True,
-                TerminalSession.expires_at > datetime.now(timezone.utc)
-            ).first()
-
-            if not db_session:
-                # Session expired or doesn't exist
-                self._close_session_internal(token)
-                return None
-
-            with self._lock:
-                return self.sessions.get(token)
-        finally:
-            db.close()
+        async def resize(rows: int, cols: int) -> None:
+            await session.sandbox.pty.resize(session.pty_pid, size=PtySize(rows=rows, cols=cols))
+            if session.recorder:
+                session.recorder.resize(cols, rows)
+
+        return InputPipeline(write, resize, on_error=lambda what, e: print(f"Failed to send {what} to PTY: {e}"))
 
-    def send_input(self, token: str, data: str) -> bool:
-        """Send input to the PTY session."""
-        session = self.get_session(token)
+    async def send_input(self, token: str, data: str) -> bool:
+        """Queue input for the PTY session; False if the session is gone."""
+        session = await self.get_session(token)
         if not session:
             return False
 
-        try:
-            session.sandbox.pty.send_stdin(session.pty_pid, data.encode())
-            return True
-        except Exception as e:
-            print(f"Failed to send input: {e}")
-            return False
+        session.last_activity = time.time()
+        session.input.send(data.encode())
+        return True
 
-    def resize_pty(self, token: str, rows: int, cols: int) -> bool:
-        """Resize the PTY terminal."""
-        session = self.get_session(token)
+    async def resize_pty(self, token: str, rows: int, cols: int) -> bool:
+        """Queue a resize of the PTY terminal; False if the session is gone."""
+        session = await self.get_session(token)
         if not session:
             return False
 
-        try:
-            size = PtySize(rows=rows, cols=cols)
-            session.sandbox.pty.resize(session.pty_pid, size=size)
-            return True
-        except Exception as e:
-            print(f"Failed to resize PTY: {e}")
-            return False
+        session.input.resize(rows, cols)
+        return True
 
     async def execute_command(self, token: str, command: str) -> dict:
         """Execute a command in the session's E2B sandbox (legacy HTTP mode)."""
-        session = self.get_session(token)
+        session = await self.get_session(token)
         if not session:
             return {"error": "Session not found or expired"}
 
         try:
             # For legacy support, use commands.run
-            result = session.sandbox.commands.run(command)
+            result = await session.sandbox.commands.run(command)
 
             return {
                 "output": result.stdout + result.stderr,
@@ -206,57 +411,225 @@ class SessionManager:
         except Exception as e:
             return {"error": f"Command execution failed: {str(e)}"}
 
-    def close_session(self, token: str):
-        """Manually close a session."""
-        self._close_session_internal(token)
+    async def stream_command(
+        self, token: str, command: str, timeout: float, max_output_bytes: int
+    ) -> AsyncIterator[dict]:
+        """Run a command in the session's sandbox, yielding its output as it arrives.
+
+        Yields {"type": "stdout" | "stderr", "data"} frames, then one final
+        frame: {"type": "exit", "exit_code"}, or {"type": "error", "reason",
+        "message"} if the session is gone, the command ran past `timeout`
+        seconds or produced more than `max_output_bytes` (reason "timeout" /
+        "output_limit"; the command is killed). If the consumer stops early
+        (the client disconnected), the command is killed too.
+        """
+        session = await self.get_session(token)
+        if not session:
+            yield {"type": "error", "reason": "not_found", "message": "Session not found or expired"}
+            return
+
+        # Small queue: when the client reads slowly, the SDK stops reading the command's output
+        chunks: "asyncio.Queue[Tuple[str, Optional[str]]]" = asyncio.Queue(maxsize=64)
+        finished = False
+
+        async def on_output(stream: str, data: Optional[str]) -> None:
+            if not finished:
+                await chunks.put((stream, data))
 
-        # Mark as inactive in database
-        db = SessionLocal()
+        session.last_activity = time.time()
         try:
-            db_session = db.query(TerminalSession).filter(
-                TerminalSession.token == token
-            ).first()
+            handle = await session.sandbox.commands.run(
+                command,
+                background=True,
+                on_stdout=lambda data: on_output("stdout", data),
+                on_stderr=lambda data: on_output("stderr", data),
+                timeout=0,  # The deadline is enforced here
+            )
+        except Exception as e:
+            yield {"type": "error", "reason": "failed", "message": f"Command execution failed: {str(e)}"}
+            return
+
+        async def wait_for_exit() -> Optional[int]:
+            try:
+                result = await handle.wait()
+                return result.exit_code
+            except Exception as e:
+                return getattr(e, "exit_code", None)
+            finally:
+                await on_output("exit", None)
 
-            if db_session:
-                db_session.is_active = False
-                db.commit()
+        waiter = asyncio.create_task(wait_for_exit())
+        deadline = time.monotonic() + timeout
+        sent = 0
+        try:
+            while True:
+                try:
+                    stream, data = await asyncio.wait_for(chunks.get(), timeout=max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    yield {"type": "error", "reason": "timeout", "message": f"Command timed out after {timeout:g}s"}
+                    return
+                if stream == "exit":
+                    yield {"type": "exit", "exit_code": await waiter}
+                    return
+
+                session.last_activity = time.time()
+                size = len(data.encode())
+                if sent + size > max_output_bytes:
+                    remaining = data.encode()[:max_output_bytes - sent].decode(errors="ignore")
+                    if remaining:
+                        yield {"type": stream, "data": remaining}
+                    yield {"type": "error", "reason": "output_limit", "message": f"Output exceeded {max_output_bytes} bytes"}
+                    return
+                sent += size
+                yield {"type": stream, "data": data}
         finally:
-            db.close()
+            # Unblock the SDK if it is waiting on a full queue
+            finished = True
+            while not chunks.empty():
+                chunks.get_nowait()
+            if not waiter.done():
+                # Runs in the background: this generator may be closing because it was cancelled
+                self._spawn(self._kill_command(handle, waiter))
+
+    async def _kill_command(self, handle: Any, waiter: asyncio.Task) -> None:
+        self._commands_killed.inc()
+        try:
+            await handle.kill()
+        except Exception as e:
+            print(f"Failed to kill command: {e}")
+        waiter.cancel()
 
-    def _close_session_internal(self, token: str, sandbox_dead: bool = False):
+    async def close_session(self, token: str):
+        """Manually close a session."""
+        await self._close_session_internal(token)
+
+        # Mark as inactive in database (write-behind)
+        self.store.deactivated(token)
+
+    async def _close_session_internal(self, token: str, sandbox_dead: bool = False):
         """Internal method to close E2B sandbox and remove from memory."""
-        with self._lock:
-            session = self.sessions.pop(token, None)
+        session = self.sessions.pop(token, None)
         if session is None:
             return
+        session.is_active = False
+        self.expiry.cancel(token)
+        self.admission.release()
+        if session.recorder:
+            self.recordings.finish(session.recorder)
+        if session.input:
+            session.input.close()
+        if session._watch_task and session._watch_task is not asyncio.current_task():
+            session._watch_task.cancel()
+        if sandbox_dead:
+            print(f"Session {session.session_id} [{token[:8]}] lost its sandbox")
+            return
+        timings = PhaseTimer("terminal.phase")
+        queued = time.monotonic()
+        async with self._kill_slots:
+            started = time.monotonic()
+            timings.record("kill_wait", started - queued)
+            try:
+                with timings.phase("pty_kill"):
+                    try:
+                        await session.sandbox.pty.kill(session.pty_pid)
+                    except Exception:
+                        pass
+                with timings.phase("sandbox_kill"):
+                    await session.sandbox.kill()
+            except Exception:
+                pass  # Ignore errors during cleanup
+            self._kill_time.observe(time.monotonic() - started)
+        logger.info(
+            f"Session {session.session_id} [{token[:8]}] closed after {time.time() - session.started_at:.0f}s: "
+            f"{timings.summary()}"
+        )
+
+    @staticmethod
+    def _next_deadline(session: PtySession) -> float:
+        """When the session next needs looking at: its expiry, when it would go idle,
+        or when its detach grace runs out."""
+        deadline = session.expires_at.timestamp()
+        if settings.terminal_idle_timeout_seconds > 0:
+            deadline = min(deadline, session.last_activity + settings.terminal_idle_timeout_seconds)
+        if session.detached_at is not None:
+            deadline = min(deadline, session.detached_at + settings.terminal_detach_grace_seconds)
+        return deadline
+
+    def _expire(self, tokens: List[str]) -> None:
+        """Handle sessions whose deadline just passed (called by the expiry scheduler).
+
+        Abandoned (detached past the grace period), idle and expired sessions
+        are closed. An expired session that is
+        still active gets its TTL extended if sliding TTLs are on; a session
+        that saw activity since its idle check was scheduled is rescheduled.
+        """
+        now = time.time()
+        due = []
+        for token in tokens:
+            session = self.sessions.get(token)
+            if session is None:
+                continue
+            idle_timeout = settings.terminal_idle_timeout_seconds
+            if session.detached_at is not None and now - session.detached_at >= settings.terminal_detach_grace_seconds:
+                self._abandoned.inc()
+                due.append(token)
+            elif idle_timeout > 0 and now - session.last_activity >= idle_timeout:
+                self._idle_closed.inc()
+                due.append(token)
+            elif now >= session.expires_at.timestamp():
+                if not self._extend(token, session, now):
+                    self._expired.inc()
+                    due.append(token)
+            else:
+                self.expiry.schedule(token, self._next_deadline(session))
+        self._close_expired(due)
+
+    def _extend(self, token: str, session: PtySession, now: float) -> bool:
+        """Slide an active session's expiry to a full TTL after its last activity."""
+        if not settings.terminal_sliding_ttl:
+            return False
+        new_expiry = min(
+            session.last_activity + SESSION_TTL_SECONDS,
+            session.started_at + settings.terminal_max_lifetime_seconds,
+        )
+        if new_expiry <= now:
+            return False
+        session.expires_at = datetime.fromtimestamp(new_expiry, timezone.utc)
+        self._spawn(self._extend_sandbox(session, int(new_expiry - now) + SANDBOX_TIMEOUT_GRACE_SECONDS))
+        self.expiry.schedule(token, self._next_deadline(session))
+        self.store.extended(token, session.expires_at)
+        self._extended.inc()
+        return True
+
+    @staticmethod
+    async def _extend_sandbox(session: PtySession, timeout: int) -> None:
         try:
-            session._stop_event.set()
-            if not sandbox_dead:
-                try:
-                    session.sandbox.pty.kill(session.pty_pid)
-                except Exception:
-                    pass
-                session.sandbox.kill()
-        except Exception:
-            pass  # Ignore errors during cleanup
+            await session.sandbox.set_timeout(timeout)
+        except Exception as e:
+            print(f"Failed to extend sandbox timeout: {e}")
 
-    async def cleanup_expired(self):
-        """Clean up expired sessions (to be called periodically)."""
-        db = SessionLocal()
-        try:
-            # Find expired sessions
-            expired = db.query(TerminalSession).filter(
-                TerminalSession.is_active == True,
-                TerminalSession.expires_at <= datetime.now(timezone.utc)
-            ).all()
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
 
-            for session in expired:
-                self._close_session_internal(session.token)
-                session.is_active = False
+    def _close_expired(self, tokens: List[str]) -> None:
+        tokens = [token for token in tokens if token in self.sessions]
+        for token in tokens:
+            self._spawn(self._close_session_internal(token))
+        # One bulk UPDATE for the whole batch (write-behind)
+        self.store.deactivated(*tokens)
 
-            db.commit()
-        finally:
-            db.close()
+    async def cleanup_expired(self):
+        """Sweep expired sessions (to be called periodically).
+
+        In-process sessions are closed on time by the expiry scheduler; this is
+        a safety net for them and deactivates rows left active by other or
+        crashed processes, in one UPDATE.
+        """
+        now = datetime.now(timezone.utc)
+        self._expire([token for token, session in self.sessions.items() if session.expires_at <= now])
+        self.store.expire_before(now)
 
 
 # Global session manager instance
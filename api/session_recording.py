@@ -0,0 +1,284 @@
+"""Recordings of terminal sessions in asciicast v2 format.
+
+Recording is off unless `settings.terminal_recording` says where to keep
+recordings. The PTY output path only appends (time, bytes) to the session's
+`SessionRecorder`; a `RecordingWriter` task hands what has piled up to a
+worker thread once a second, which encodes it, gzips it into the recording
+file and checks the size cap. Finished recordings are
+`<session_id>.cast.gz` in the recording directory, or objects under
+`recordings/` in the bucket, and are served back still compressed.
+"""
+
+import asyncio
+import codecs
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Dict, IO, Iterator, List, Optional, Set, Tuple
+
+from assets import get_s3_client
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Bucket prefix for uploaded recordings
+RECORDING_PREFIX = "recordings"
+CONTENT_TYPE = "application/x-asciicast"
+
+# How often pending output is written out
+FLUSH_INTERVAL_SECONDS = 1.0
+# Read size when streaming a recording back
+PLAYBACK_CHUNK_BYTES = 64 * 1024
+
+# Last event of a recording that hit its size cap
+TRUNCATED_NOTICE = "\r\n\x1b[0m[recording stopped: size limit reached]\r\n"
+
+_recorded_bytes = registry.counter("terminal.recording.bytes")
+_written_bytes = registry.counter("terminal.recording.written_bytes")
+_truncated = registry.counter("terminal.recording.truncated")
+_failures = registry.counter("terminal.recording.failures")
+
+Event = Tuple[float, str, bytes]  # (seconds since start, "o" | "r", data)
+
+
+class SessionRecorder:
+    """One session's recording.
+
+    `output` and `resize` are called on the event loop and only queue the
+    event. `take` (on the loop) hands the queued events over; `write` and
+    `finish` (in a worker thread) append them to the file.
+
+    `max_bytes` caps the compressed file, and also the output queued between
+    writes. Once either is reached the recording ends with a notice and
+    further output is ignored.
+    """
+
+    def __init__(self, session_id: str, path: str, max_bytes: int, width: int = 80, height: int = 24):
+        self.session_id = session_id
+        self.path = path
+        self.max_bytes = max_bytes
+        self.width = width
+        self.height = height
+        self.started = time.monotonic()
+        self.started_at = int(time.time())
+        self.stopped = False
+        self._ended = False  # The truncation notice has been written
+        self._events: List[Event] = []
+        self._queued = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._raw: Optional[IO[bytes]] = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        self.lock = asyncio.Lock()  # One write to the file at a time
+
+    def output(self, data: bytes) -> None:
+        if self.stopped:
+            return
+        if self._queued + len(data) > self.max_bytes:
+            self.stopped = True
+            return
+        self._events.append((time.monotonic() - self.started, "o", data))
+        self._queued += len(data)
+        _recorded_bytes.inc(len(data))
+
+    def resize(self, cols: int, rows: int) -> None:
+        if not self.stopped:
+            self._events.append((time.monotonic() - self.started, "r", f"{cols}x{rows}".encode()))
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._events)
+
+    def take(self) -> List[Event]:
+        events, self._events, self._queued = self._events, [], 0
+        return events
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._raw = open(self.path + ".part", "wb")
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0)
+        header = {
+            "version": 2,
+            "width": self.width,
+            "height": self.height,
+            "timestamp": self.started_at,
+            "env": {"TERM": "xterm-256color"},
+        }
+        self._gzip.write((json.dumps(header) + "\n").encode())
+
+    def write(self, events: List[Event]) -> None:
+        if self._gzip is None:
+            self._open()
+        if self._ended:
+            return
+        lines = []
+        for at, kind, data in events:
+            text = self._decoder.decode(data) if kind == "o" else data.decode()
+            if text:
+                lines.append(json.dumps([round(at, 6), kind, text]))
+        if self.stopped or self._raw.tell() >= self.max_bytes:
+            self.stopped = self._ended = True
+            _truncated.inc()
+            lines.append(json.dumps([round(time.monotonic() - self.started, 6), "o", TRUNCATED_NOTICE]))
+        if lines:
+            self._gzip.write(("\n".join(lines) + "\n").encode())
+            # zlib holds back compressed output; flush so the size check sees it
+            self._gzip.flush()
+
+    def finish(self, events: List[Event]) -> None:
+        """Write the last events and close the file under its final name."""
+        try:
+            self.write(events)
+            self._gzip.close()
+            _written_bytes.inc(self._raw.tell())
+        finally:
+            if self._raw is not None:
+                self._raw.close()
+        os.replace(self.path + ".part", self.path)
+
+
+class RecordingWriter:
+    """Writes every live session's recording in the background.
+
+    `mode` is "off", "disk" (keep recordings in `directory`) or "bucket"
+    (write them in `directory`, then upload them to `bucket` when the
+    session ends and delete the local copy).
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        directory: str,
+        max_bytes: int,
+        bucket: Optional[str] = None,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+    ):
+        if mode not in ("off", "disk", "bucket"):
+            raise ValueError(f"Unknown recording mode: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bucket = bucket
+        self.flush_interval = flush_interval
+        self._recorders: Dict[str, SessionRecorder] = {}
+        self._finishing: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        registry.gauge("terminal.recording.active", lambda: len(self._recorders))
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the writer and finish every recording still open."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for recorder in list(self._recorders.values()):
+            self.finish(recorder)
+        await asyncio.gather(*self._finishing, return_exceptions=True)
+
+    def open(self, session_id: str) -> Optional[SessionRecorder]:
+        """Start recording a session, or None when recording is off."""
+        if not self.enabled:
+            return None
+        recorder = SessionRecorder(session_id, self._local_path(session_id), self.max_bytes)
+        self._recorders[session_id] = recorder
+        return recorder
+
+    def finish(self, recorder: SessionRecorder) -> None:
+        """Close a session's recording (and upload it) in the background."""
+        if self._recorders.pop(recorder.session_id, None) is None:
+            return
+        task = asyncio.create_task(self._finish(recorder, recorder.take()))
+        self._finishing.add(task)
+        task.add_done_callback(self._finishing.discard)
+
+    def _local_path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.cast.gz")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            for recorder in list(self._recorders.values()):
+                if recorder.pending:
+                    try:
+                        async with recorder.lock:
+                            await asyncio.to_thread(recorder.write, recorder.take())
+                    except Exception as e:
+                        self._failed(recorder, e)
+
+    async def _finish(self, recorder: SessionRecorder, events: List[Event]) -> None:
+        try:
+            async with recorder.lock:
+                await asyncio.to_thread(recorder.finish, events)
+            if self.mode == "bucket":
+                await asyncio.to_thread(self._upload, recorder.path, recorder.session_id)
+        except Exception as e:
+            self._failed(recorder, e)
+
+    @staticmethod
+    def _failed(recorder: SessionRecorder, error: Exception) -> None:
+        recorder.stopped = True
+        _failures.inc()
+        logger.error(f"Recording of session {recorder.session_id} failed: {error}")
+
+    def _upload(self, path: str, session_id: str) -> None:
+        get_s3_client().upload_file(
+            path,
+            self.bucket,
+            f"{RECORDING_PREFIX}/{session_id}.cast.gz",
+            ExtraArgs={"ContentType": CONTENT_TYPE, "ContentEncoding": "gzip"},
+        )
+        os.remove(path)
+
+    def playback(self, session_id: str, decompress: bool) -> Optional[Iterator[bytes]]:
+        """A finished recording as a stream of chunks, or None if there is none.
+
+        Chunks are the gzipped file as stored, or with `decompress` the plain
+        asciicast, inflated a chunk at a time. Blocking; call from a thread.
+        """
+        if self.mode == "bucket":
+            try:
+                body = get_s3_client().get_object(
+                    Bucket=self.bucket, Key=f"{RECORDING_PREFIX}/{session_id}.cast.gz"
+                )["Body"]
+            except Exception:
+                return None
+            read, close = body.read, body.close
+        else:
+            try:
+                f = open(self._local_path(session_id), "rb")
+            except FileNotFoundError:
+                return None
+            read, close = f.read, f.close
+        return _stream(read, close, decompress)
+
+
+def _stream(read, close, decompress: bool) -> Iterator[bytes]:
+    inflater = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS) if decompress else None
+    try:
+        while True:
+            chunk = read(PLAYBACK_CHUNK_BYTES)
+            if not chunk:
+                return
+            if inflater is None:
+                yield chunk
+                continue
+            # Bound each piece: a highly compressed chunk can inflate a lot
+            data = inflater.decompress(chunk, PLAYBACK_CHUNK_BYTES)
+            while data:
+                yield data
+                data = inflater.decompress(inflater.unconsumed_tail, PLAYBACK_CHUNK_BYTES)
+    finally:
+        close()
@@ -0,0 +1,136 @@
+"""Forwarding of terminal requests to the worker that owns the session.
+
+A session's sandbox and PTY live in the process that started it. With more
+than one worker, a request can land on a process that doesn't hold the
+session; these helpers pass it through to the owner (found in the shared
+`terminal_sessions` table, see SessionManager.find_owner).
+"""
+
+import asyncio
+import logging
+
+import httpx
+from fastapi import Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Set on forwarded requests so the owner never forwards them again
+FORWARDED_HEADER = "x-terminal-forwarded"
+
+# Headers that describe a single hop and must not be copied across
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+
+_forwarded_requests = registry.counter("terminal.routing.forwarded_requests")
+_forwarded_websockets = registry.counter("terminal.routing.forwarded_websockets")
+_forward_failures = registry.counter("terminal.routing.failures")
+
+
+def is_forwarded(headers) -> bool:
+    return FORWARDED_HEADER in headers
+
+
+def _copy_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+
+
+async def forward_request(request: Request, owner_url: str) -> Response:
+    """Replay an HTTP request against the owning worker and stream back its response."""
+    headers = _copy_headers(request.headers)
+    headers[FORWARDED_HEADER] = "1"
+    # No read timeout: streamed responses (execute/stream) carry their own deadline
+    client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, read=None))
+    try:
+        upstream = await client.send(
+            client.build_request(
+                request.method,
+                owner_url.rstrip("/") + request.url.path,
+                params=request.query_params,
+                content=await request.body(),
+                headers=headers,
+            ),
+            stream=True,
+        )
+    except httpx.HTTPError as e:
+        await client.aclose()
+        _forward_failures.inc()
+        logger.error(f"Failed to forward {request.url.path} to {owner_url}: {e}")
+        return Response(status_code=502, content="Session owner unreachable")
+    _forwarded_requests.inc()
+
+    async def body():
+        # Closing the upstream response also ends the owner's stream if our client went away
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+            await client.aclose()
+
+    return StreamingResponse(body(), status_code=upstream.status_code, headers=_copy_headers(upstream.headers))
+
+
+async def proxy_websocket(websocket: WebSocket, owner_url: str) -> None:
+    """Accept `websocket` and relay it, frame for frame, to the owning worker."""
+    url = owner_url.rstrip("/").replace("http", "ws", 1) + websocket.url.path
+    if websocket.url.query:
+        url += "?" + websocket.url.query
+    try:
+        upstream = await connect(
+            url,
+            subprotocols=websocket.scope.get("subprotocols") or None,
+            additional_headers={FORWARDED_HEADER: "1"},
+            max_size=None,
+            ping_interval=None,  # The terminal protocol has its own heartbeat
+        )
+    except Exception as e:
+        _forward_failures.inc()
+        logger.error(f"Failed to reach session owner {owner_url}: {e}")
+        await websocket.accept()
+        await websocket.send_json({"type": "error", "message": "Session not found or expired"})
+        await websocket.close(code=4001)
+        return
+
+    _forwarded_websockets.inc()
+    await websocket.accept(subprotocol=upstream.subprotocol)
+
+    async def to_client():
+        try:
+            async for message in upstream:
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+        except ConnectionClosed:
+            pass
+        # 1005/1006 are reserved for "no status" and can't be sent on
+        code = upstream.close_code
+        await websocket.close(code=code if code and code not in (1005, 1006) else 1000)
+
+    async def to_owner():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                await upstream.send(message["bytes"])
+            elif message.get("text") is not None:
+                await upstream.send(message["text"])
+
+    tasks = [asyncio.create_task(to_client()), asyncio.create_task(to_owner())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except Exception as e:
+        logger.error(f"WebSocket relay error: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await upstream.close()
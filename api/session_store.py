@@ -0,0 +1,219 @@
+"""Write-behind persistence of terminal session lifecycle transitions.
+
+The session manager keeps the authoritative session state in memory; the
+`terminal_sessions` table is only a record of lifecycle transitions
+(create / extend / expire / close). Those writes are queued here and applied in
+batches by a background task, off the request and keystroke paths.
+
+A batch that fails is retried with backoff, ahead of anything queued since,
+except for its creates: those fail their `written` future instead, and the
+caller decides. Updates still failing after `max_attempts` are dropped, and
+logged and counted as such.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Union
+
+from sqlalchemy import select, update
+
+from database import SessionLocal
+from metrics import registry
+from models import TerminalSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CreateSession:
+    session_id: str
+    token: str
+    expires_at: datetime
+    owner: str
+    owner_url: Optional[str] = None
+    written: Optional[asyncio.Future] = None  # resolved once the batch is applied (or failed)
+
+
+@dataclass
+class ExtendSession:
+    token: str
+    expires_at: datetime
+
+
+@dataclass
+class DeactivateSessions:
+    tokens: List[str]
+
+
+@dataclass
+class ExpireSessionsBefore:
+    """Deactivate every active row that expired before `now` (any owner)."""
+    now: datetime
+
+
+Operation = Union[CreateSession, ExtendSession, DeactivateSessions, ExpireSessionsBefore]
+
+
+class SessionStore:
+    """Queues session lifecycle writes and applies them in the background."""
+
+    def __init__(
+        self,
+        max_batch: int = 500,
+        max_attempts: int = 6,
+        retry_seconds: float = 0.5,
+        max_retry_seconds: float = 30,
+    ):
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._queue: "asyncio.Queue[Operation]" = asyncio.Queue()
+        self._retry: List[Operation] = []  # failed updates, written before anything newer
+        self._attempts = 0  # consecutive failures of _retry
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Optional[asyncio.Future] = None
+        self._failures = registry.counter("terminal.store.write_failures")
+        self._dropped = registry.counter("terminal.store.dropped_updates")
+        registry.gauge("terminal.store.pending", lambda: self._queue.qsize())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the writer after flushing everything queued so far."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._in_flight is not None:
+            await self._in_flight
+        await self._flush(self._take_batch())
+        # No more attempts once closed
+        self._drop(self._retry)
+        self._retry = []
+
+    def created(
+        self, session_id: str, token: str, expires_at: datetime, owner: str, owner_url: Optional[str] = None
+    ) -> asyncio.Future:
+        """Queue the new session's row.
+
+        The returned future resolves once the row has been written, or fails
+        with the error if the batch holding it couldn't be.
+        """
+        written = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(CreateSession(session_id, token, expires_at, owner, owner_url, written))
+        return written
+
+    def extended(self, token: str, expires_at: datetime) -> None:
+        self._queue.put_nowait(ExtendSession(token, expires_at))
+
+    def deactivated(self, *tokens: str) -> None:
+        if tokens:
+            self._queue.put_nowait(DeactivateSessions(list(tokens)))
+
+    def expire_before(self, now: datetime) -> None:
+        self._queue.put_nowait(ExpireSessionsBefore(now))
+
+    def _take_batch(self) -> List[Operation]:
+        """Operations to retry, then queued ones, up to max_batch in all."""
+        operations, self._retry = self._retry, []
+        while not self._queue.empty() and len(operations) < self.max_batch:
+            operations.append(self._queue.get_nowait())
+        return operations
+
+    async def _run(self) -> None:
+        while True:
+            if self._retry:
+                await asyncio.sleep(min(self.retry_seconds * 2 ** (self._attempts - 1), self.max_retry_seconds))
+                operations = self._take_batch()
+            else:
+                operations = [await self._queue.get()]
+                operations.extend(self._take_batch())
+            # Shielded so that close() finishes the batch instead of rolling it back
+            self._in_flight = asyncio.ensure_future(self._flush(operations))
+            await asyncio.shield(self._in_flight)
+
+    async def _flush(self, operations: List[Operation]) -> None:
+        if not operations:
+            return
+        error: Optional[Exception] = None
+        try:
+            await self._write(operations)
+            self._attempts = 0
+        except Exception as e:
+            error = e
+            self._failures.inc()
+            self._attempts += 1
+            logger.error(f"Failed to persist {len(operations)} session updates: {e}")
+            updates = [op for op in operations if not isinstance(op, CreateSession)]
+            if updates and self._attempts < self.max_attempts:
+                self._retry = updates
+            else:
+                self._drop(updates)
+        for op in operations:
+            if isinstance(op, CreateSession) and op.written and not op.written.done():
+                if error is None:
+                    op.written.set_result(None)
+                else:
+                    op.written.set_exception(error)
+
+    def _drop(self, operations: List[Operation]) -> None:
+        if operations:
+            self._dropped.inc(len(operations))
+            logger.error(f"Dropped {len(operations)} session updates after {self._attempts} failed attempts")
+        self._attempts = 0
+
+    async def lookup_owner(self, token: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(owner, owner_url) of an active, unexpired session, read from the database."""
+        async with SessionLocal() as db:
+            row = (await db.execute(
+                select(TerminalSession.owner, TerminalSession.owner_url).where(
+                    TerminalSession.token == token,
+                    TerminalSession.is_active == True,
+                    TerminalSession.expires_at > datetime.now(timezone.utc),
+                )
+            )).first()
+            return tuple(row) if row else None
+
+    @staticmethod
+    async def _write(operations: List[Operation]) -> None:
+        """Apply a batch of operations in order, in one transaction."""
+        async with SessionLocal() as db:
+            for op in operations:
+                if isinstance(op, CreateSession):
+                    db.add(TerminalSession(
+                        session_id=op.session_id,
+                        token=op.token,
+                        expires_at=op.expires_at,
+                        is_active=True,
+                        owner=op.owner,
+                        owner_url=op.owner_url,
+                    ))
+                    await db.flush()
+                elif isinstance(op, ExtendSession):
+                    await db.execute(
+                        update(TerminalSession)
+                        .where(TerminalSession.token == op.token)
+                        .values(expires_at=op.expires_at)
+                    )
+                elif isinstance(op, DeactivateSessions):
+                    await db.execute(
+                        update(TerminalSession)
+                        .where(TerminalSession.token.in_(op.tokens))
+                        .values(is_active=False)
+                    )
+                elif isinstance(op, ExpireSessionsBefore):
+                    await db.execute(
+                        update(TerminalSession)
+                        .where(TerminalSession.is_active == True, TerminalSession.expires_at <= op.now)
+                        .values(is_active=False)
+                    )
+            await db.commit()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Upload a local asset directory to the bucket, by content hash.
+
+Builds a manifest of the local files (see asset_manifest.py), compares it to
+the manifest published under the same prefix on the previous sync, and only
+uploads objects whose sha256 changed (or that are missing from the bucket).
+Uploads run in parallel (large files as multipart uploads) with Content-Type
+and Cache-Control set per object; any other key under the prefix, listed
+from the bucket itself, is deleted. The new manifest is written last, so an
+interrupted sync is simply redone on the next run.
+
+Usage:
+    python sync_assets.py ../desk/public --prefix desk --overlay ../desk/build/compact
+    python sync_assets.py ../blog/assets --prefix blog/assets
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from boto3.s3.transfer import TransferConfig
+
+from assets import content_type_for, get_s3_client
+from asset_manifest import MANIFEST_NAME, build_manifest, resolve_asset_files
+
+MULTIPART_CHUNK_BYTES = 8 * 1024 * 1024
+ASSET_CACHE_CONTROL = "public, max-age=31536000"
+MANIFEST_CACHE_CONTROL = "public, max-age=60"
+
+
+@dataclass
+class SyncResult:
+    uploaded: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+
+
+def load_remote_manifest(s3, bucket: str, prefix: str) -> dict:
+    """Return the manifest from the previous sync, or an empty one.
+
+    An unreadable manifest counts as empty: every file is uploaded again.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=f"{prefix}/{MANIFEST_NAME}")
+        return json.loads(response["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return {"assets": {}}
+    except ValueError as e:
+        print(f"Ignoring unreadable {prefix}/{MANIFEST_NAME}: {e}", file=sys.stderr)
+        return {"assets": {}}
+
+
+def list_remote_keys(s3, bucket: str, prefix: str) -> Set[str]:
+    """Paths (relative to prefix) of every object under it, except the manifest."""
+    keys = set()
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/"):
+        for obj in page.get("Contents", []):
+            keys.add(obj["Key"][len(prefix) + 1:])
+    keys.discard(MANIFEST_NAME)
+    return keys
+
+
+def sync(s3, bucket: str, root: str, prefix: str, overlay: Optional[str] = None,
+         workers: int = 8, acl: Optional[str] = None, prune: bool = True,
+         dry_run: bool = False) -> SyncResult:
+    """Sync root to s3://bucket/prefix/ and return what was done."""
+    manifest = build_manifest(root, prefix=prefix, overlay=overlay)
+    remote_assets = load_remote_manifest(s3, bucket, prefix).get("assets", {})
+    remote_keys = list_remote_keys(s3, bucket, prefix)
+    local_files = {rel_path: published for rel_path, published, _ in resolve_asset_files(root, overlay)}
+
+    result = SyncResult()
+    changed = []
+    for rel_path, entry in manifest["assets"].items():
+        remote = remote_assets.get(rel_path)
+        if remote and remote.get("sha256") == entry["sha256"] and rel_path in remote_keys:
+            result.unchanged.append(rel_path)
+        else:
+            changed.append(rel_path)
+    removed = sorted(remote_keys - set(manifest["assets"])) if prune else []
+
+    if dry_run:
+        result.uploaded, result.deleted = changed, removed
+        return result
+
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_CHUNK_BYTES,
+        multipart_chunksize=MULTIPART_CHUNK_BYTES,
+        max_concurrency=4,
+    )
+
+    def upload(rel_path: str):
+        extra_args = {
+            "ContentType": content_type_for(rel_path),
+            "CacheControl": ASSET_CACHE_CONTROL,
+            "Metadata": {"sha256": manifest["assets"][rel_path]["sha256"]},
+        }
+        if acl:
+            extra_args["ACL"] = acl
+        s3.upload_file(local_files[rel_path], bucket, f"{prefix}/{rel_path}",
+                       ExtraArgs=extra_args, Config=transfer_config)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload, rel_path): rel_path for rel_path in changed}
+        for future in as_completed(futures):
+            rel_path = futures[future]
+            try:
+                future.result()
+                result.uploaded.append(rel_path)
+                print(f"Uploaded: {rel_path}")
+            except Exception as e:
+                result.failed.append(rel_path)
+                print(f"Failed: {rel_path}: {e}", file=sys.stderr)
+
+    if result.failed:
+        # Keep the old manifest so the failed files are retried next time
+        return result
+
+    for start in range(0, len(removed), 1000):
+        batch = removed[start:start + 1000]
+        s3.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": f"{prefix}/{rel_path}"} for rel_path in batch], "Quiet": True},
+        )
+        result.deleted.extend(batch)
+        for rel_path in batch:
+            print(f"Deleted: {rel_path}")
+
+    extra_args = {"ContentType": "application/json", "CacheControl": MANIFEST_CACHE_CONTROL}
+    if acl:
+        extra_args["ACL"] = acl
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{prefix}/{MANIFEST_NAME}",
+        Body=json.dumps(manifest, indent=2, sort_keys=True).encode(),
+        **extra_args,
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync an asset directory to the bucket by content hash.")
+    parser.add_argument("root", help="Local asset directory (e.g. ../desk/public)")
+    parser.add_argument("--prefix", required=True, help="Key prefix in the bucket (e.g. desk)")
+    parser.add_argument("--overlay", help="Directory of replacement files, e.g. glb_compact.py output")
+    parser.add_argument("--bucket", default=os.getenv("BUCKET_NAME"), help="Bucket name (default: $BUCKET_NAME)")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel uploads")
+    parser.add_argument("--acl", help="Canned ACL for uploaded objects (e.g. public-read)")
+    parser.add_argument("--no-prune", action="store_true", help="Keep objects deleted locally")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would change")
+    args = parser.parse_args()
+
+    if not args.bucket:
+        parser.error("--bucket or BUCKET_NAME is required")
+
+    result = sync(
+        get_s3_client(),
+        args.bucket,
+        args.root,
+        args.prefix.strip("/"),
+        overlay=args.overlay,
+        workers=args.workers,
+        acl=args.acl,
+        prune=not args.no_prune,
+        dry_run=args.dry_run,
+    )
+    action = "Would upload" if args.dry_run else "Uploaded"
+    print(f"\n{action}: {len(result.uploaded)}, Unchanged: {len(result.unchanged)}, "
+          f"Deleted: {len(result.deleted)}, Failed: {len(result.failed)}")
+    if args.dry_run:
+        for rel_path in result.uploaded:
+            print(f"  upload {rel_path}")
+        for rel_path in result.deleted:
+            print(f"  delete {rel_path}")
+    sys.exit(1 if result.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""Plumbing between a session's PTY and its WebSockets."""
+
+import asyncio
+import codecs
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Set, Tuple
+
+from config import settings
+from metrics import registry
+
+# WebSocket subprotocol for clients that take PTY output as binary frames.
+# Clients that don't offer it get the original JSON {"type": "output"} frames.
+BINARY_SUBPROTOCOL = "terminal.v2"
+
+# How long to keep collecting a burst of output before sending it
+FLUSH_INTERVAL_SECONDS = 0.005
+# Upper bound on one output frame, in bytes
+MAX_FRAME_BYTES = 64 * 1024
+
+# How long to keep collecting a burst of input before writing it to the PTY
+INPUT_COALESCE_SECONDS = 0.002
+# Upper bound on one PTY write, in bytes
+MAX_INPUT_BATCH_BYTES = 16 * 1024
+
+# Shown in place of output discarded by the "drop" policy
+TRUNCATION_MARKER = "\r\n\x1b[0m[... {} bytes of output dropped ...]\r\n"
+# Written before the tail kept by the "refresh" policy
+REFRESH_PREFIX = b"\x1b[0m\x1b[2J\x1b[H"
+
+_frames_sent = registry.counter("terminal.output.frames")
+_chunks_sent = registry.counter("terminal.output.chunks")
+_bytes_sent = registry.counter("terminal.output.bytes")
+_dropped = registry.counter("terminal.output.dropped")
+_paused = registry.counter("terminal.output.paused")
+_pause_time = registry.histogram("terminal.output.pause_seconds")
+_input_messages = registry.counter("terminal.input.messages")
+_input_bytes = registry.counter("terminal.input.bytes")
+_input_writes = registry.counter("terminal.input.writes")
+_input_failures = registry.counter("terminal.input.failures")
+_resizes = registry.counter("terminal.input.resizes")
+_resizes_skipped = registry.counter("terminal.input.resizes_skipped")
+
+
+class OutputBudget:
+    """PTY output buffered across all connections, held under a global ceiling."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._waiters: Set[asyncio.Future] = set()
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.limit
+
+    def take(self, amount: int) -> None:
+        self.used += amount
+
+    def release(self, amount: int) -> None:
+        self.used -= amount
+        # Paused bridges re-check their limits whenever anything drains
+        waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def changed(self) -> asyncio.Future:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        return waiter
+
+
+output_budget = OutputBudget(settings.terminal_output_memory_limit)
+registry.gauge("terminal.output.buffered", lambda: output_budget.used)
+
+
+class OutputBridge:
+    """Hands PTY output to an asyncio consumer through a bounded buffer.
+
+    `put` may be called from the event loop (the async sandbox SDK) or from
+    any other thread; the consumer awaits `get`, so an idle terminal costs no
+    threads and no polling.
+
+    Once the buffer holds `limit` bytes, or the global budget is spent,
+    `overflow` decides what happens to more output: "pause" makes `put`
+    return an awaitable that resolves once there is room again (the SDK
+    awaits it, so the PTY stream stops being read), "drop" discards it and
+    marks the gap, and "refresh" throws the backlog away except for its tail.
+    Output arriving from other threads can't be paused and is dropped.
+    """
+
+    def __init__(
+        self,
+        limit: int = settings.terminal_output_buffer_size,
+        overflow: str = settings.terminal_output_overflow,
+        budget: OutputBudget = output_budget,
+    ):
+        if overflow not in ("pause", "drop", "refresh"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.limit = limit
+        self.overflow = overflow
+        self.budget = budget
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._chunks: Deque[bytes] = deque()
+        self._size = 0
+        self._dropped = 0
+        self._readable = asyncio.Event()
+        self._closed = False
+
+    @property
+    def full(self) -> bool:
+        return self._size >= self.limit or self.budget.exhausted
+
+    def put(self, data: bytes) -> Optional[Awaitable[None]]:
+        if threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._put, data, False)
+            return None
+        return self._put(data, self.overflow == "pause")
+
+    def prime(self, data: bytes) -> None:
+        """Queue output ahead of the live stream (a replay), regardless of the limit."""
+        if data:
+            self._append(data)
+
+    def _put(self, data: bytes, can_pause: bool) -> Optional[Awaitable[None]]:
+        if self._closed:
+            return None
+        if self.full and not can_pause:
+            if self.overflow == "refresh":
+                self._collapse(data)
+            else:
+                self._dropped += len(data)
+                _dropped.inc(len(data))
+            return None
+        self._append(data)
+        if can_pause and self.full:
+            _paused.inc(len(data))
+            return self._wait_for_room()
+        return None
+
+    def _append(self, data: bytes) -> None:
+        if self._dropped:
+            marker = TRUNCATION_MARKER.format(self._dropped).encode()
+            self._dropped = 0
+            self._append(marker)
+        self._chunks.append(data)
+        self._size += len(data)
+        self.budget.take(len(data))
+        self._readable.set()
+
+    def _collapse(self, data: bytes) -> None:
+        """Replace the backlog with a cleared screen and the last lines of output."""
+        keep = self.limit // 4
+        tail = (b"".join(self._chunks) + data)[-keep:]
+        line_start = tail.find(b"\n")
+        if 0 <= line_start < len(tail) - 1:
+            tail = tail[line_start + 1:]
+        _dropped.inc(self._size + len(data) - len(tail))
+        self._clear()
+        self._append(REFRESH_PREFIX + tail)
+
+    async def _wait_for_room(self) -> None:
+        started = time.monotonic()
+        while self.full and not self._closed:
+            await self.budget.changed()
+        _pause_time.observe(time.monotonic() - started)
+
+    def _pop(self) -> bytes:
+        chunk = self._chunks.popleft()
+        self._size -= len(chunk)
+        self.budget.release(len(chunk))
+        return chunk
+
+    def _clear(self) -> None:
+        self._chunks.clear()
+        self.budget.release(self._size)
+        self._size = 0
+
+    async def get(self) -> bytes:
+        while not self._chunks:
+            self._readable.clear()
+            await self._readable.wait()
+        return self._pop()
+
+    def get_ready(self, limit: int) -> List[bytes]:
+        """Take already-buffered chunks without waiting, stopping once `limit` bytes are taken."""
+        chunks = []
+        taken = 0
+        while taken < limit and self._chunks:
+            chunk = self._pop()
+            chunks.append(chunk)
+            taken += len(chunk)
+        return chunks
+
+    def close(self) -> None:
+        """Discard buffered output and release anything paused on this bridge."""
+        self._closed = True
+        self._clear()
+
+
+class ScrollbackBuffer:
+    """The most recent PTY output of a session, in a preallocated ring.
+
+    Output is addressed by its offset in the session's whole output stream:
+    `end` is the total number of bytes written so far, and the ring holds
+    the bytes from `start` up to `end`.
+    """
+
+    def __init__(self, capacity: int = settings.terminal_scrollback_bytes):
+        self.capacity = capacity
+        self.end = 0
+        self._ring = bytearray(capacity)
+
+    @property
+    def start(self) -> int:
+        return max(0, self.end - self.capacity)
+
+    def write(self, data: bytes) -> None:
+        size = len(data)
+        if not size or not self.capacity:
+            self.end += size
+            return
+        view = memoryview(data)
+        if size > self.capacity:
+            view = view[size - self.capacity:]
+        pos = (self.end + size - len(view)) % self.capacity
+        first = min(len(view), self.capacity - pos)
+        self._ring[pos:pos + first] = view[:first]
+        self._ring[:len(view) - first] = view[first:]
+        self.end += size
+
+    def read_since(self, offset: int) -> bytes:
+        """Output from `offset` (clamped to what the ring still holds) to the end."""
+        offset = min(max(offset, self.start), self.end)
+        size = self.end - offset
+        if not size:
+            return b""
+        pos = offset % self.capacity
+        if pos + size <= self.capacity:
+            return bytes(self._ring[pos:pos + size])
+        return bytes(self._ring[pos:]) + bytes(self._ring[:size - (self.capacity - pos)])
+
+
+class OutputFramer:
+    """Merges PTY output chunks into as few WebSocket frames as possible.
+
+    A chunk that arrives alone (a keystroke echo) is sent straight away. When
+    more output is already queued behind it the terminal is in a burst, so the
+    framer waits up to `flush_interval` for the rest of it, never letting a
+    frame grow past `max_frame_bytes`.
+
+    `send` receives the merged bytes of one frame.
+    """
+
+    def __init__(
+        self,
+        bridge: OutputBridge,
+        send: Callable[[bytes], Awaitable[None]],
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        max_frame_bytes: int = MAX_FRAME_BYTES,
+    ):
+        self.bridge = bridge
+        self.send = send
+        self.flush_interval = flush_interval
+        self.max_frame_bytes = max_frame_bytes
+
+    async def run(self) -> None:
+        while True:
+            chunks = [await self.bridge.get()]
+            size = len(chunks[0])
+            ready = self.bridge.get_ready(self.max_frame_bytes - size)
+            if ready:
+                chunks.extend(ready)
+                size += sum(len(c) for c in ready)
+                if size < self.max_frame_bytes and self.flush_interval > 0:
+                    await asyncio.sleep(self.flush_interval)
+                    more = self.bridge.get_ready(self.max_frame_bytes - size)
+                    chunks.extend(more)
+                    size += sum(len(c) for c in more)
+
+            await self.send(chunks[0] if len(chunks) == 1 else b"".join(chunks))
+            _frames_sent.inc()
+            _chunks_sent.inc(len(chunks))
+            _bytes_sent.inc(size)
+
+
+class InputPipeline:
+    """Ordered path from a session's clients to its PTY, in as few writes as possible.
+
+    `send` and `resize` only queue; one task drains the queue, so input
+    reaches the PTY in the order it arrived, whichever connection sent it.
+    Like OutputFramer, a keystroke that arrives alone is written straight
+    away, while input that piles up behind a write (a paste, a fast typist)
+    is collected for up to `coalesce_interval` and written in one call of at
+    most `max_batch_bytes`. A resize is applied in its place in the queue:
+    after the input queued before it, ahead of the input queued after it.
+    Of several pending resizes only the latest is applied, in its own place.
+
+    `write` and `resize` are the PTY calls; their errors are logged by the
+    caller-supplied `on_error` and don't stop the pipeline.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[bytes], Awaitable[None]],
+        resize: Callable[[int, int], Awaitable[None]],
+        on_error: Callable[[str, Exception], None],
+        coalesce_interval: float = INPUT_COALESCE_SECONDS,
+        max_batch_bytes: int = MAX_INPUT_BATCH_BYTES,
+    ):
+        self._write = write
+        self._resize = resize
+        self._on_error = on_error
+        self.coalesce_interval = coalesce_interval
+        self.max_batch_bytes = max_batch_bytes
+        self._pending: Deque[bytes] = deque()
+        self._size: Optional[Tuple[int, int]] = None
+        self._size_after = 0  # chunks in _pending queued before the resize
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def send(self, data: bytes) -> None:
+        if self._closed or not data:
+            return
+        self._pending.append(data)
+        _input_messages.inc()
+        _input_bytes.inc(len(data))
+        self._kick()
+
+    def resize(self, rows: int, cols: int) -> None:
+        if self._closed:
+            return
+        if self._size is not None:
+            _resizes_skipped.inc()
+        self._size = (rows, cols)
+        self._size_after = len(self._pending)
+        self._kick()
+
+    def close(self) -> None:
+        self._closed = True
+        self._pending.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+    def _kick(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+    def _ahead(self) -> int:
+        """Pending chunks that go before the pending resize, if any."""
+        return self._size_after if self._size is not None else len(self._pending)
+
+    def _take(self) -> bytes:
+        limit = self._ahead()
+        chunks = [self._pending.popleft()]
+        size = len(chunks[0])
+        while (
+            len(chunks) < limit
+            and self._pending
+            and size + len(self._pending[0]) <= self.max_batch_bytes
+        ):
+            chunk = self._pending.popleft()
+            chunks.append(chunk)
+            size += len(chunk)
+        if self._size is not None:
+            self._size_after -= len(chunks)
+        return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+    async def _drain(self) -> None:
+        while not self._closed and (self._size is not None or self._pending):
+            if self._size is not None and self._size_after == 0:
+                rows, cols = self._size
+                self._size = None
+                _resizes.inc()
+                try:
+                    await self._resize(rows, cols)
+                except Exception as e:
+                    self._on_error("resize", e)
+                continue
+
+            if self._ahead() > 1 and self.coalesce_interval > 0:
+                # A burst: give the rest of it a moment to arrive
+                await asyncio.sleep(self.coalesce_interval)
+            data = self._take()
+            _input_writes.inc()
+            try:
+                await self._write(data)
+            except Exception as e:
+                _input_failures.inc()
+                self._on_error("input", e)
+
+
+def output_sender(websocket, binary: bool) -> Callable[[bytes], Awaitable[None]]:
+    """Frame writer for a connection: raw binary frames, or legacy JSON.
+
+    PTY output stays bytes all the way to a binary client. JSON clients need
+    text, so their writer decodes incrementally: a multibyte character split
+    across frames is held back until the rest of it arrives.
+    """
+    if binary:
+        return websocket.send_bytes
+
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    async def send(data: bytes) -> None:
+        text = decoder.decode(data)
+        if text:
+            await websocket.send_json({"type": "output", "data": text})
+    return send
@@ -0,0 +1,55 @@
+"""Shared test setup.
+
+The API reads its settings when `config` is first imported, so the test
+environment is set here, before any test module imports it: a throwaway
+SQLite database, the local sandbox backend and no warm pool.
+"""
+
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="api-tests-")
+
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    SANDBOX_BACKEND="local",
+    SANDBOX_POOL_MIN_SIZE="0",
+    SANDBOX_POOL_MAX_SIZE="0",
+    TERMINAL_RECORDING="off",
+)
+
+import pytest
+from sqlalchemy import create_engine
+
+import models
+from database import engine
+
+models.Base.metadata.create_all(create_engine(os.environ["DATABASE_URL"]))
+
+
+@pytest.fixture
+async def db():
+    """The async engine, disposed after the test (its connections belong to the test's loop)."""
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    """Sandboxes from tests/fakes.py instead of the configured backend."""
+    from fakes import FakeBackend
+
+    backend = FakeBackend()
+    monkeypatch.setattr("session_manager.create_sandbox", backend.create_sandbox)
+    return backend
+
+
+@pytest.fixture
+async def manager(db):
+    """A started SessionManager, closed after the test."""
+    from session_manager import SessionManager
+
+    manager = SessionManager()
+    manager.start()
+    yield manager
+    await manager.close()
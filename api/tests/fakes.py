@@ -0,0 +1,99 @@
+"""In-memory stand-ins for sandboxes, for tests that don't need real processes."""
+
+import asyncio
+from types import SimpleNamespace
+from typing import List, Optional
+
+
+class FakeFiles:
+    def __init__(self, sandbox: "FakeSandbox"):
+        self.sandbox = sandbox
+
+    async def write(self, path: str, data) -> None:
+        self.sandbox.calls.append(("files.write", path))
+
+
+class FakeCommands:
+    def __init__(self, sandbox: "FakeSandbox"):
+        self.sandbox = sandbox
+
+    async def run(self, cmd: str, **_):
+        self.sandbox.calls.append(("commands.run", cmd))
+        return SimpleNamespace(stdout="", stderr="", exit_code=0)
+
+
+class FakePtyHandle:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.exit_code: Optional[int] = None
+        self._done = asyncio.get_running_loop().create_future()
+
+    async def wait(self) -> None:
+        await self._done
+
+
+class FakePty:
+    def __init__(self, sandbox: "FakeSandbox"):
+        self.sandbox = sandbox
+        self.handle: Optional[FakePtyHandle] = None
+
+    async def create(self, size, on_data, cwd=None, timeout=None, **_):
+        self.sandbox.calls.append(("pty.create", cwd))
+        await asyncio.sleep(self.sandbox.delay)
+        self.handle = FakePtyHandle(pid=1000 + len(self.sandbox.backend.created))
+        asyncio.get_running_loop().call_soon(on_data, b"$ ")
+        return self.handle
+
+    async def send_stdin(self, pid: int, data: bytes) -> None:
+        self.sandbox.calls.append(("pty.send_stdin", data))
+
+    async def resize(self, pid: int, size) -> None:
+        self.sandbox.calls.append(("pty.resize", (size.cols, size.rows)))
+
+    async def kill(self, pid: int) -> bool:
+        self.sandbox.calls.append(("pty.kill", pid))
+        if self.handle and not self.handle._done.done():
+            self.handle.exit_code = -9
+            self.handle._done.set_result(None)
+        return True
+
+
+class FakeSandbox:
+    def __init__(self, backend: "FakeBackend"):
+        self.backend = backend
+        self.delay = backend.delay
+        self.calls: List[tuple] = []
+        self.killed = False
+        self.files = FakeFiles(self)
+        self.commands = FakeCommands(self)
+        self.pty = FakePty(self)
+
+    async def set_timeout(self, timeout: int) -> None:
+        self.calls.append(("set_timeout", timeout))
+        if self.backend.fail_set_timeout:
+            raise RuntimeError("sandbox unreachable")
+
+    async def kill(self) -> bool:
+        self.killed = True
+        self.backend.killed.append(self)
+        return True
+
+
+class FakeBackend:
+    """Replaces create_sandbox; every step of provisioning takes `delay` seconds."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.fail_set_timeout = False
+        self.created: List[FakeSandbox] = []
+        self.killed: List[FakeSandbox] = []
+
+    async def create_sandbox(self, timeout: int) -> FakeSandbox:
+        await asyncio.sleep(self.delay)
+        sandbox = FakeSandbox(self)
+        self.created.append(sandbox)
+        return sandbox
+
+    @property
+    def alive(self) -> List[FakeSandbox]:
+        return [s for s in self.created if not s.killed]
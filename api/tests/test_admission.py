@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from admission import AdmissionQueue, UnknownTicket
+
+
+def test_waiting_callers_are_admitted_in_order():
+    queue = AdmissionQueue(limit=1)
+    assert queue.acquire().admitted
+
+    first, second = queue.acquire(), queue.acquire()
+    assert (first.admitted, first.position) == (False, 1)
+    assert (second.admitted, second.position) == (False, 2)
+
+    queue.release()
+    # The slot is the first ticket's, even if the second one asks first
+    assert queue.acquire(second.ticket).position == 2
+    assert queue.acquire(first.ticket).admitted
+    assert queue.acquire(second.ticket).position == 1
+    assert queue.in_use == 1
+
+
+def test_new_callers_queue_behind_waiting_tickets():
+    queue = AdmissionQueue(limit=1)
+    queue.acquire()
+    waiting = queue.acquire()
+    queue.release()
+
+    latecomer = queue.acquire()
+
+    assert not latecomer.admitted and latecomer.position == 2
+    assert queue.acquire(waiting.ticket).admitted
+
+
+def test_abandoned_ticket_gives_up_its_place():
+    queue = AdmissionQueue(limit=1, ticket_ttl_seconds=0.05)
+    queue.acquire()
+    stale = queue.acquire()
+    time.sleep(0.02)
+    polling = queue.acquire()
+    time.sleep(0.04)
+
+    assert queue.acquire(polling.ticket).position == 1
+    with pytest.raises(UnknownTicket):
+        queue.acquire(stale.ticket)
+
+
+def test_admitted_ticket_cant_be_used_twice():
+    queue = AdmissionQueue(limit=1)
+    queue.acquire()
+    waiting = queue.acquire()
+    queue.release()
+    queue.acquire(waiting.ticket)
+
+    with pytest.raises(UnknownTicket):
+        queue.acquire(waiting.ticket)
+
+
+def test_limit_of_zero_admits_everyone():
+    queue = AdmissionQueue(limit=0)
+
+    assert all(queue.acquire().admitted for _ in range(100))
@@ -0,0 +1,91 @@
+import gzip
+import uuid
+
+import httpx
+import pytest
+
+from config import settings
+from main import app
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api") as client:
+        yield client
+
+
+@pytest.mark.parametrize("field", ["timeout", "max_output_bytes"])
+@pytest.mark.parametrize("value", [0, -5])
+async def test_stream_rejects_limits_that_arent_positive(client, field, value):
+    response = await client.post(
+        "/api/terminal/session/execute/stream",
+        json={"session_token": "token", "command": "ls", field: value},
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", field]
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    """A finished recording on disk, served with the access token "secret"."""
+    from session_manager import session_manager
+
+    session_id = str(uuid.uuid4())
+    cast = b'{"version": 2, "width": 80, "height": 24}\n[0.1, "o", "hi"]\n'
+    (tmp_path / f"{session_id}.cast.gz").write_bytes(gzip.compress(cast))
+    monkeypatch.setattr(session_manager.recordings, "directory", str(tmp_path))
+    monkeypatch.setattr(settings, "terminal_recording_access_token", "secret")
+    return session_id, cast
+
+
+async def test_recording_is_served_with_the_access_token(client, recording):
+    session_id, cast = recording
+
+    response = await client.get(
+        f"/api/terminal/recordings/{session_id}",
+        headers={"Authorization": "Bearer secret", "Accept-Encoding": "identity"},
+    )
+
+    assert response.status_code == 200
+    assert response.content == cast
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer wrong", "Basic secret", "secret"])
+async def test_recording_needs_the_access_token(client, recording, authorization):
+    session_id, _ = recording
+    headers = {"Authorization": authorization} if authorization else {}
+
+    response = await client.get(f"/api/terminal/recordings/{session_id}", headers=headers)
+
+    assert response.status_code == 401
+
+
+async def test_recordings_arent_served_without_a_configured_token(client, recording, monkeypatch):
+    session_id, _ = recording
+    monkeypatch.setattr(settings, "terminal_recording_access_token", "")
+
+    response = await client.get(
+        f"/api/terminal/recordings/{session_id}", headers={"Authorization": "Bearer "}
+    )
+
+    assert response.status_code == 403
+
+
+async def test_metrics_need_the_access_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_access_token", "metrics-secret")
+
+    denied = await client.get("/api/metrics")
+    allowed = await client.get("/api/metrics", headers={"Authorization": "Bearer metrics-secret"})
+
+    assert denied.status_code == 401
+    assert allowed.status_code == 200
+    assert "terminal_pool" in allowed.json()
+
+
+async def test_metrics_arent_served_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_access_token", "")
+
+    response = await client.get("/api/metrics", headers={"Authorization": "Bearer "})
+
+    assert response.status_code == 403
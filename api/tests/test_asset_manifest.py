@@ -0,0 +1,57 @@
+import io
+import json
+
+from asset_manifest import ManifestCache
+
+
+class FakeS3:
+    def __init__(self):
+        self.reads = 0
+        self.manifest = None  # None: the read fails
+
+    def get_object(self, Bucket, Key):
+        self.reads += 1
+        if self.manifest is None:
+            raise ConnectionError("bucket unreachable")
+        return {"Body": io.BytesIO(json.dumps(self.manifest).encode())}
+
+
+def test_manifest_is_cached_for_its_ttl():
+    cache = ManifestCache(ttl_seconds=300)
+    s3 = FakeS3()
+    s3.manifest = {"assets": {}}
+
+    assert cache.get(s3, "bucket") == {"assets": {}}
+    assert cache.get(s3, "bucket") == {"assets": {}}
+    assert s3.reads == 1
+
+
+def test_failed_loads_are_not_retried_until_retry_seconds(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("asset_manifest.time.monotonic", lambda: now[0])
+    cache = ManifestCache(ttl_seconds=300, retry_seconds=30)
+    s3 = FakeS3()
+
+    assert cache.get(s3, "bucket") is None
+    assert cache.get(s3, "bucket") is None
+    assert s3.reads == 1
+
+    now[0] += 31
+    s3.manifest = {"assets": {"a.glb": {}}}
+    assert cache.get(s3, "bucket") == {"assets": {"a.glb": {}}}
+    assert s3.reads == 2
+
+
+def test_last_good_manifest_is_served_while_the_bucket_fails(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("asset_manifest.time.monotonic", lambda: now[0])
+    cache = ManifestCache(ttl_seconds=300, retry_seconds=30)
+    s3 = FakeS3()
+    s3.manifest = {"assets": {}}
+    cache.get(s3, "bucket")
+
+    now[0] += 301
+    s3.manifest = None
+    assert cache.get(s3, "bucket") == {"assets": {}}
+    assert cache.get(s3, "bucket") == {"assets": {}}
+    assert s3.reads == 2
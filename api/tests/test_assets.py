@@ -0,0 +1,58 @@
+from assets import PresignedUrlCache
+
+
+class FakeS3:
+    def __init__(self):
+        self.signed = 0
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.signed += 1
+        return f"https://bucket/{Params['Key']}?sig={self.signed}"
+
+
+def test_presigned_urls_are_reused():
+    cache = PresignedUrlCache(ttl_seconds=3600, refresh_margin_seconds=300)
+    s3 = FakeS3()
+
+    first = cache.get_url(s3, "bucket", "desk/a.glb")
+
+    assert cache.get_url(s3, "bucket", "desk/a.glb") == first
+    assert s3.signed == 1
+
+
+def test_presigned_url_cache_is_bounded_lru():
+    cache = PresignedUrlCache(ttl_seconds=3600, refresh_margin_seconds=300, max_entries=3)
+    s3 = FakeS3()
+
+    for name in "abc":
+        cache.get_url(s3, "bucket", f"desk/{name}.glb")
+    cache.get_url(s3, "bucket", "desk/a.glb")  # a is now the most recently used
+    cache.get_url(s3, "bucket", "desk/d.glb")
+
+    assert list(cache._urls) == ["desk/c.glb", "desk/a.glb", "desk/d.glb"]
+    assert s3.signed == 4
+
+
+def test_presigned_url_cache_drops_expired_urls(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("assets.time.monotonic", lambda: now[0])
+    cache = PresignedUrlCache(ttl_seconds=60, refresh_margin_seconds=10)
+    s3 = FakeS3()
+
+    cache.get_url(s3, "bucket", "desk/a.glb")
+    now[0] += 55  # past the refresh margin
+    cache.get_url(s3, "bucket", "desk/b.glb")
+
+    assert list(cache._urls) == ["desk/b.glb"]
+    assert cache.get_url(s3, "bucket", "desk/a.glb").endswith("sig=3")
+
+
+def test_object_sizes_are_bounded():
+    cache = PresignedUrlCache(ttl_seconds=3600, refresh_margin_seconds=300, max_entries=2)
+
+    for i in range(5):
+        cache.set_size(f"desk/{i}.glb", i)
+
+    assert cache.get_size("desk/0.glb") is None
+    assert cache.get_size("desk/4.glb") == 4
+    assert len(cache._sizes) == 2
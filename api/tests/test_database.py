@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from database import async_database_url, engine
+from main import app
+
+QUERY_SECONDS = 0.05
+
+
+@pytest.mark.parametrize(
+    "database_url, expected",
+    [
+        ("postgresql://u:p@db/site", "postgresql+asyncpg://u:p@db/site"),
+        ("postgresql+psycopg2://u:p@db/site", "postgresql+asyncpg://u:p@db/site"),
+        ("postgresql://u:p@db/site?sslmode=require", "postgresql+asyncpg://u:p@db/site?ssl=require"),
+        ("sqlite:///site.db", "sqlite+aiosqlite:///site.db"),
+    ],
+)
+def test_async_database_url_uses_the_async_driver(database_url, expected):
+    assert async_database_url(database_url).render_as_string(hide_password=False) == expected
+
+
+@pytest.fixture
+def slow_queries(db):
+    """Every query on the events table takes QUERY_SECONDS, like a distant server.
+
+    The sleep is in the driver's own thread, where a slow server would keep
+    it waiting, not on the event loop.
+    """
+    def on_connect(dbapi_connection, _):
+        def trace(statement):
+            if "FROM events" in statement:
+                time.sleep(QUERY_SECONDS)
+        dbapi_connection.run_async(lambda driver_connection: driver_connection.set_trace_callback(trace))
+
+    event.listen(engine.sync_engine, "connect", on_connect)
+    yield
+    event.remove(engine.sync_engine, "connect", on_connect)
+
+
+async def test_concurrent_requests_overlap_their_database_waits(slow_queries):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api") as client:
+        async def stats() -> float:
+            started = time.monotonic()
+            response = await client.get("/api/admin/stats")
+            assert response.status_code == 200
+            return time.monotonic() - started
+
+        alone = await stats()
+        started = time.monotonic()
+        await asyncio.gather(*(stats() for _ in range(8)))
+        together = time.monotonic() - started
+
+    assert alone >= QUERY_SECONDS * 5  # the stats page makes several queries
+    # Serialised, eight would take eight times as long as one
+    assert together < alone * 3
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from e2b_setup import BASHRC_LINES, PAYLOAD_FILES, PAYLOAD_VERSION, populate_example_files
+from sandbox_backend import LocalSandbox
+
+
+class RecordingSandbox:
+    """Counts files/commands round trips and passes them on to a local sandbox."""
+
+    def __init__(self, sandbox: LocalSandbox):
+        self.sandbox = sandbox
+        self.calls = []
+        self.files = self
+        self.commands = self
+
+    async def write(self, path, data):
+        self.calls.append("files.write")
+        return await self.sandbox.files.write(path, data)
+
+    async def run(self, cmd, **kwargs):
+        self.calls.append("commands.run")
+        return await self.sandbox.commands.run(cmd, **kwargs)
+
+
+@pytest.fixture
+async def sandbox():
+    local = await LocalSandbox.create()
+    yield RecordingSandbox(local)
+    await local.kill()
+
+
+async def test_populate_is_one_upload_and_one_command(sandbox):
+    await populate_example_files(sandbox)
+
+    assert sandbox.calls == ["files.write", "commands.run"]
+    home = sandbox.sandbox.home
+    for path, mode, content in PAYLOAD_FILES:
+        with open(os.path.join(home, path)) as f:
+            assert f.read() == content
+        assert os.stat(os.path.join(home, path)).st_mode & 0o777 == mode
+    with open(os.path.join(home, ".payload_version")) as f:
+        assert f.read().strip() == PAYLOAD_VERSION
+    assert not os.listdir(sandbox.sandbox.path("/tmp"))  # the archive is removed
+
+
+async def test_unchanged_payload_version_skips_the_extract(sandbox):
+    await populate_example_files(sandbox)
+    home = sandbox.sandbox.home
+    edited = os.path.join(home, PAYLOAD_FILES[0][0])
+    with open(edited, "w") as f:
+        f.write("edited by the visitor\n")
+
+    await populate_example_files(sandbox)
+
+    assert sandbox.calls == ["files.write", "commands.run"] * 2
+    with open(edited) as f:
+        assert f.read() == "edited by the visitor\n"
+    with open(os.path.join(home, ".bashrc")) as f:
+        assert f.read().count(BASHRC_LINES[0]) == 1
+    assert not os.listdir(sandbox.sandbox.path("/tmp"))
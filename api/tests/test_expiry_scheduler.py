@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from expiry_scheduler import ExpiryScheduler
+
+
+async def test_deadlines_fire_in_order():
+    expired = []
+    scheduler = ExpiryScheduler(expired.extend)
+    scheduler.start()
+    now = time.time()
+    scheduler.schedule("b", now + 0.04)
+    scheduler.schedule("a", now + 0.02)
+    scheduler.schedule("c", now + 0.06)
+    scheduler.cancel("c")
+
+    await asyncio.sleep(0.1)
+    await scheduler.close()
+
+    assert expired == ["a", "b"]
+
+
+async def test_close_stops_a_scheduler_that_is_waking_up():
+    for _ in range(50):
+        scheduler = ExpiryScheduler(lambda keys: None)
+        scheduler.start()
+        await asyncio.sleep(0)
+        scheduler.schedule("a", time.time() + 60)  # wakes the scheduler...
+        await asyncio.sleep(0)  # ...which is about to resume as it is cancelled
+        await asyncio.wait_for(scheduler.close(), timeout=1)
+
+
+async def test_failing_callback_doesnt_stop_later_deadlines():
+    expired = []
+
+    def on_expired(keys):
+        if not expired:
+            expired.append(None)
+            raise RuntimeError("store unavailable")
+        expired.extend(keys)
+
+    scheduler = ExpiryScheduler(on_expired)
+    scheduler.start()
+    now = time.time()
+    scheduler.schedule("a", now + 0.02)
+    scheduler.schedule("b", now + 0.05)
+
+    await asyncio.sleep(0.1)
+    await scheduler.close()
+
+    assert expired == [None, "b"]
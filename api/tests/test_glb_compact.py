@@ -0,0 +1,135 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from glb_compact import ARRAY_BUFFER, FLOAT, add_accessor, compact_glb, read_accessor, read_glb, repack, write_glb
+
+
+def _box(center):
+    corners = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=np.float32)
+    return corners * 0.5 + np.array(center, dtype=np.float32)
+
+
+def _mesh(gltf, views, center):
+    positions = _box(center)
+    index = add_accessor(
+        gltf, views, positions, FLOAT, "VEC3", ARRAY_BUFFER,
+        min=positions.min(axis=0).tolist(), max=positions.max(axis=0).tolist(),
+    )
+    gltf["meshes"].append({"name": f"Object_{len(gltf['meshes'])}", "primitives": [{"attributes": {"POSITION": index}}]})
+    return len(gltf["meshes"]) - 1
+
+
+def build_desk_glb() -> bytes:
+    gltf = {"asset": {"version": "2.0"}, "meshes": [], "scenes": [{"nodes": [0, 1, 3, 4]}], "scene": 0}
+    views = []
+    gltf["nodes"] = [
+        # A plain mesh node with a TRS transform: the dequantization folds into it
+        {"name": "Cube012_Material102_0", "mesh": _mesh(gltf, views, [3, 1, -2]),
+         "translation": [1, 2, 3], "rotation": [0, 0.7071068, 0, 0.7071068], "scale": [2, 2, 2]},
+        # A mesh node with children: the mesh moves onto a child node
+        {"name": "Torus002_Material002_0", "mesh": _mesh(gltf, views, [-4, 0, 5]), "children": [2],
+         "translation": [0, 1, 0]},
+        {"name": "Handle"},
+        # An animated mesh node: its transform belongs to the animation
+        {"name": "Spinner", "mesh": _mesh(gltf, views, [0, 7, 0])},
+        # A mesh node with a matrix transform
+        {"name": "cube_screen_0", "mesh": _mesh(gltf, views, [10, 0, 0]),
+         "matrix": [1, 0, 0, 0, 0, 0, -1, 0, 0, 1, 0, 0, 5, 6, 7, 1]},
+    ]
+    times = add_accessor(gltf, views, np.array([[0], [1]], dtype=np.float32), FLOAT, "SCALAR", None, min=[0], max=[1])
+    rotations = add_accessor(gltf, views, np.array([[0, 0, 0, 1], [0, 1, 0, 0]], dtype=np.float32), FLOAT, "VEC4", None)
+    gltf["animations"] = [{
+        "samplers": [{"input": times, "output": rotations}],
+        "channels": [{"sampler": 0, "target": {"node": 3, "path": "rotation"}}],
+    }]
+    return write_glb(gltf, repack(gltf, views))
+
+
+def _local_matrix(node):
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", [0, 0, 0, 1])
+    matrix = np.eye(4)
+    matrix[:3, :3] = [
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ]
+    matrix[:3, :3] *= node.get("scale", [1, 1, 1])
+    matrix[:3, 3] = node.get("translation", [0, 0, 0])
+    return matrix
+
+
+def world_meshes(data: bytes) -> dict:
+    """{node name: world-space vertex positions} for every node holding a mesh."""
+    gltf, binary = read_glb(data)
+    views = [binary[v.get("byteOffset", 0):v.get("byteOffset", 0) + v["byteLength"]] for v in gltf["bufferViews"]]
+    result = {}
+
+    def walk(index, parent):
+        node = gltf["nodes"][index]
+        world = parent @ _local_matrix(node)
+        if "mesh" in node:
+            primitive = gltf["meshes"][node["mesh"]]["primitives"][0]
+            positions = read_accessor(gltf, views, primitive["attributes"]["POSITION"]).astype(np.float64)
+            result[node["name"]] = (world @ np.c_[positions, np.ones(len(positions))].T).T[:, :3]
+        for child in node.get("children", []):
+            walk(child, world)
+
+    for root in gltf["scenes"][0]["nodes"]:
+        walk(root, np.eye(4))
+    return result
+
+
+def test_mesh_node_names_survive_compaction():
+    original = build_desk_glb()
+
+    compacted, stats = compact_glb(original)
+
+    assert stats["meshes_quantized"] == 4
+    before, after = world_meshes(original), world_meshes(compacted)
+    assert sorted(after) == sorted(before)
+    for name, positions in before.items():
+        np.testing.assert_allclose(after[name], positions, atol=1e-3)
+
+
+def test_animated_node_keeps_its_transform():
+    compacted, _ = compact_glb(build_desk_glb())
+
+    gltf, _ = read_glb(compacted)
+    spinner = next(n for n in gltf["nodes"] if n.get("children") and "mesh" not in n
+                   and gltf["nodes"][n["children"][0]].get("name") == "Spinner")
+    assert "translation" not in spinner and "scale" not in spinner
+    assert gltf["animations"][0]["channels"][0]["target"]["node"] == gltf["nodes"].index(spinner)
+
+
+def _world_bounds(data: bytes):
+    stacked = np.concatenate(list(world_meshes(data).values()))
+    return stacked.min(axis=0), stacked.max(axis=0)
+
+
+def test_compacted_model_keeps_its_world_space_bounds():
+    original = build_desk_glb()
+
+    compacted, _ = compact_glb(original)
+
+    for before, after in zip(_world_bounds(original), _world_bounds(compacted)):
+        np.testing.assert_allclose(after, before, atol=1e-3)
+
+
+def test_kept_positions_leave_local_bounds_and_transforms_alone():
+    original = build_desk_glb()
+
+    compacted, stats = compact_glb(original, quantize_positions=False)
+
+    assert stats["meshes_quantized"] == 0  # the test meshes have no normals
+    before, _ = read_glb(original)
+    after, _ = read_glb(compacted)
+    assert after["nodes"] == before["nodes"]
+    for mesh_before, mesh_after in zip(before["meshes"], after["meshes"]):
+        position_before = before["accessors"][mesh_before["primitives"][0]["attributes"]["POSITION"]]
+        position_after = after["accessors"][mesh_after["primitives"][0]["attributes"]["POSITION"]]
+        assert position_after["componentType"] == FLOAT
+        assert (position_after["min"], position_after["max"]) == (position_before["min"], position_before["max"])
+    assert "KHR_mesh_quantization" not in after.get("extensionsUsed", [])
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+
+from sandbox_pool import SandboxPool, WarmSandbox
+
+
+async def until(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.005)
+
+
+class FakeBackend:
+    """create/kill for the pool, recording which sandboxes were made and killed."""
+
+    def __init__(self):
+        self.created = []
+        self.killed = []
+
+    async def create(self) -> WarmSandbox:
+        await asyncio.sleep(0.01)
+        warm = WarmSandbox(session=f"sandbox-{len(self.created)}")
+        self.created.append(warm)
+        return warm
+
+    async def kill(self, warm: WarmSandbox) -> None:
+        self.killed.append(warm)
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+def make_pool(backend, min_size=1, max_size=3, max_age_seconds=60.0):
+    return SandboxPool(backend.create, backend.kill, min_size, max_size, max_age_seconds)
+
+
+async def test_pool_fills_to_min_size(backend):
+    pool = make_pool(backend, min_size=2)
+    pool.start()
+    try:
+        await until(lambda: pool.stats()["ready"] == 2)
+        await asyncio.sleep(0.05)
+        assert len(backend.created) == 2
+    finally:
+        await pool.close()
+    assert sorted(w.session for w in backend.killed) == ["sandbox-0", "sandbox-1"]
+
+
+async def test_pool_refills_after_a_hit(backend):
+    pool = make_pool(backend, min_size=1)
+    pool.start()
+    try:
+        await until(lambda: pool.stats()["ready"] == 1)
+        assert pool.acquire().session == "sandbox-0"
+        await until(lambda: pool.stats()["ready"] == 1)
+        assert len(backend.created) == 2
+    finally:
+        await pool.close()
+
+
+async def test_pool_grows_on_a_miss(backend):
+    pool = make_pool(backend, min_size=0, max_size=2)
+    pool.start()
+    try:
+        assert pool.acquire() is None
+        assert pool.stats()["target"] == 1
+        await until(lambda: pool.stats()["ready"] == 1)
+
+        assert pool.acquire() is not None
+        assert pool.acquire() is None
+        assert pool.acquire() is None
+        assert pool.stats()["target"] == 2  # capped at max_size
+        await until(lambda: pool.stats()["ready"] == 2)
+    finally:
+        await pool.close()
+
+
+async def test_pool_replaces_sandboxes_before_max_age(backend):
+    pool = make_pool(backend, min_size=1, max_size=1, max_age_seconds=0.2)
+    pool.start()
+    try:
+        await until(lambda: pool.stats()["ready"] == 1)
+        first = backend.created[0]
+
+        await until(lambda: first in backend.killed, timeout=1.0)
+        await until(lambda: pool.stats()["ready"] == 1)
+
+        warm = pool.acquire()
+        assert warm is not first
+        assert time.monotonic() - warm.created_at < pool.max_age_seconds
+    finally:
+        await pool.close()
+
+
+async def test_acquire_skips_sandboxes_past_max_age(backend):
+    pool = make_pool(backend, min_size=1, max_age_seconds=10)
+    stale = WarmSandbox(session="stale", created_at=time.monotonic() - 11)
+    pool._ready.append(stale)
+
+    assert pool.acquire() is None
+    await until(lambda: stale in backend.killed)
+
+
+async def test_pool_counts_hits_and_misses(backend):
+    pool = make_pool(backend, min_size=1)
+    before = pool.stats()
+    pool.start()
+    try:
+        await until(lambda: pool.stats()["ready"] == 1)
+        pool.acquire()  # hit
+        pool.acquire()  # miss: the replacement isn't ready yet
+        after = pool.stats()
+        assert after["hits"] - before["hits"] == 1
+        assert after["misses"] - before["misses"] == 1
+    finally:
+        await pool.close()
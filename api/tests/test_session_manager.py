@@ -0,0 +1,241 @@
+import asyncio
+import time
+
+import pytest
+
+from sandbox_pool import WarmSandbox
+
+
+async def test_failed_set_timeout_kills_the_pooled_sandbox(fake_backend, manager):
+    sandbox = await fake_backend.create_sandbox(timeout=60)
+    manager.pool._ready.append(WarmSandbox(session=await _pty_session(manager, sandbox)))
+    fake_backend.fail_set_timeout = True
+
+    with pytest.raises(Exception, match="Failed to create session"):
+        await manager.start_session()
+
+    assert sandbox.killed
+    assert manager.sessions == {}
+    assert manager.admission.in_use == 0
+
+
+async def test_failed_start_kills_a_cold_sandbox(fake_backend, manager, monkeypatch):
+    def fail(_):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(manager.recordings, "open", fail)
+
+    with pytest.raises(Exception, match="disk full"):
+        await manager.start_session()
+
+    assert len(fake_backend.created) == 1
+    assert fake_backend.alive == []
+    assert manager.admission.in_use == 0
+
+
+async def _pty_session(manager, sandbox):
+    """What the pool would hold for `sandbox`: provisioned and with a PTY."""
+    from session_manager import PtySession
+
+    session = PtySession(sandbox=sandbox)
+    session.pty_handle = await sandbox.pty.create(size=None, on_data=lambda data: None)
+    session.pty_pid = session.pty_handle.pid
+    session.input = manager._input_pipeline(session)
+    return session
+
+
+class LoopLag:
+    """Measures how late a 5 ms ticker wakes up: the event loop's lag."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.worst = 0.0
+        self._task = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.worst = max(self.worst, loop.time() - expected)
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._tick())
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+
+
+async def test_concurrent_starts_overlap_without_blocking_the_loop(fake_backend, manager):
+    fake_backend.delay = 0.05  # each of create, pty.create: 50 ms of sandbox latency
+
+    async with LoopLag() as lag:
+        started = time.monotonic()
+        results = await asyncio.gather(*(manager.start_session() for _ in range(20)))
+        elapsed = time.monotonic() - started
+
+    assert len({r["session_token"] for r in results}) == 20
+    assert elapsed < 0.5  # 20 sessions in series would take 2 s
+    assert lag.worst < 0.05
+
+
+async def test_concurrent_local_sandbox_starts_keep_the_loop_responsive(manager):
+    # Real PTYs and processes: spawning them takes a few ms of loop time
+    # each, but nothing may hold the loop for a whole start
+    async with LoopLag() as lag:
+        results = await asyncio.gather(*(manager.start_session() for _ in range(10)))
+
+    assert len(manager.sessions) == 10
+    assert all("session_token" in r for r in results)
+    assert lag.worst < 0.25
+
+
+async def test_start_fails_when_the_routing_row_cant_be_written(fake_backend, manager, monkeypatch):
+    monkeypatch.setattr("session_manager.settings.worker_url", "http://127.0.0.1:9")
+
+    async def fail(operations):
+        raise ConnectionError("database unreachable")
+    monkeypatch.setattr(manager.store, "_write", fail)
+
+    with pytest.raises(Exception, match="database unreachable"):
+        await manager.start_session()
+
+    assert manager.sessions == {}
+    assert fake_backend.alive == []
+    assert manager.admission.in_use == 0
+
+
+async def test_start_without_routing_survives_a_failed_write(fake_backend, manager, monkeypatch):
+    async def fail(operations):
+        raise ConnectionError("database unreachable")
+    monkeypatch.setattr(manager.store, "_write", fail)
+
+    result = await manager.start_session()
+    await asyncio.sleep(0.05)  # let the write fail
+
+    assert result["session_token"] in manager.sessions
+
+
+async def test_full_manager_queues_callers_over_http(fake_backend, manager, monkeypatch):
+    import httpx
+
+    import main
+
+    monkeypatch.setattr(main, "session_manager", manager)
+    monkeypatch.setattr(manager.admission, "limit", 1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://api") as client:
+        started = await client.post("/api/terminal/session/start")
+        queued = await client.post("/api/terminal/session/start")
+        behind = await client.post("/api/terminal/session/start")
+        assert started.status_code == 200
+        assert queued.status_code == behind.status_code == 202
+        assert (queued.json()["position"], behind.json()["position"]) == (1, 2)
+        assert queued.json()["retry_after"] > 0
+
+        still_queued = await client.post("/api/terminal/session/start", json={"ticket": queued.json()["ticket"]})
+        assert still_queued.status_code == 202 and still_queued.json()["position"] == 1
+
+        await manager.close_session(started.json()["session_token"])
+        admitted = await client.post("/api/terminal/session/start", json={"ticket": queued.json()["ticket"]})
+        assert admitted.status_code == 200 and "session_token" in admitted.json()
+
+        stale = await client.post("/api/terminal/session/start", json={"ticket": "not-a-ticket"})
+        assert stale.status_code == 404
+
+
+async def test_idle_session_is_closed(fake_backend, manager, monkeypatch):
+    from config import settings
+    from metrics import registry
+
+    idle_closed = registry.counter("terminal.sessions.idle_closed")
+    before = idle_closed.value
+    monkeypatch.setattr(settings, "terminal_idle_timeout_seconds", 0.1)
+    token = (await manager.start_session())["session_token"]
+    active = (await manager.start_session())["session_token"]
+
+    for _ in range(4):
+        await asyncio.sleep(0.05)
+        await manager.send_input(active, "x")
+    await asyncio.sleep(0.05)
+
+    assert token not in manager.sessions
+    assert active in manager.sessions
+    assert idle_closed.value == before + 1
+    assert manager.admission.in_use == 1
+
+
+async def test_sliding_ttl_is_capped_at_the_max_lifetime(fake_backend, manager, monkeypatch):
+    from datetime import datetime
+
+    from config import settings
+
+    monkeypatch.setattr(settings, "terminal_sliding_ttl", True)
+    monkeypatch.setattr(settings, "terminal_max_lifetime_seconds", 900)
+    token = (await manager.start_session())["session_token"]
+    session = manager.sessions[token]
+    now = time.time()
+    session.started_at = now - 800
+    session.last_activity = now
+
+    assert manager._extend(token, session, now)
+    # A full TTL from the last activity would be 600 s; the lifetime leaves 100 s
+    assert session.expires_at == datetime.fromtimestamp(session.started_at + 900, session.expires_at.tzinfo)
+
+    session.started_at = now - 900
+    assert not manager._extend(token, session, now)
+
+
+async def test_expired_session_with_sliding_ttl_off_is_closed(fake_backend, manager):
+    from datetime import datetime, timedelta, timezone
+
+    token = (await manager.start_session())["session_token"]
+    session = manager.sessions[token]
+    session.expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    manager._expire([token])
+    await asyncio.sleep(0.05)
+
+    assert token not in manager.sessions
+
+
+async def test_http_only_session_outlives_the_detach_grace(fake_backend, manager, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "terminal_detach_grace_seconds", 0.1)
+    token = (await manager.start_session())["session_token"]
+
+    for _ in range(6):
+        assert "error" not in await manager.execute_command(token, "ls")
+        await asyncio.sleep(0.05)
+
+    assert token in manager.sessions
+
+
+async def test_session_is_closed_once_the_grace_after_its_last_client_runs_out(fake_backend, manager, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "terminal_detach_grace_seconds", 0.1)
+    token = (await manager.start_session())["session_token"]
+
+    def client(data):
+        return None
+    manager.attach_output(token, client)
+    await asyncio.sleep(0.15)
+    assert token in manager.sessions
+
+    manager.detach_output(token, client)
+    await asyncio.sleep(0.15)
+    assert token not in manager.sessions
+
+
+async def test_phase_timings_are_logged(fake_backend, manager, caplog):
+    import logging
+
+    with caplog.at_level(logging.INFO, logger="session_manager"):
+        token = (await manager.start_session())["session_token"]
+        await manager.close_session(token)
+
+    messages = [r.getMessage() for r in caplog.records if r.name == "session_manager"]
+    assert any(f"[{token[:8]}] started in" in m and "sandbox_create=" in m for m in messages)
+    assert any(f"[{token[:8]}] closed after" in m and "sandbox_kill=" in m for m in messages)
@@ -0,0 +1,114 @@
+import asyncio
+import gzip
+import json
+import os
+
+import pytest
+
+from session_recording import TRUNCATED_NOTICE, RecordingWriter, SessionRecorder
+
+
+def events(path: str) -> list:
+    """The recording's header and events, from its gzipped file."""
+    with gzip.open(path, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+async def writer(tmp_path):
+    writer = RecordingWriter("disk", str(tmp_path), max_bytes=1024 * 1024, flush_interval=0.01)
+    writer.start()
+    yield writer
+    await writer.close()
+
+
+async def test_recording_is_written_as_part_then_renamed(writer, tmp_path):
+    recorder = writer.open("session-1")
+    recorder.output(b"$ ls\r\n")
+    recorder.resize(120, 40)
+    await asyncio.sleep(0.05)
+
+    assert os.path.exists(recorder.path + ".part")
+    assert not os.path.exists(recorder.path)
+
+    recorder.output(b"notes.txt\r\n")
+    writer.finish(recorder)
+    await writer.close()
+
+    assert recorder.path == str(tmp_path / "session-1.cast.gz")
+    assert not os.path.exists(recorder.path + ".part")
+    header, *rest = events(recorder.path)
+    assert header["version"] == 2
+    assert [(kind, data) for _, kind, data in rest] == [("o", "$ ls\r\n"), ("r", "120x40"), ("o", "notes.txt\r\n")]
+
+
+def test_character_split_across_output_is_recorded_whole(tmp_path):
+    recorder = SessionRecorder("s", str(tmp_path / "s.cast.gz"), max_bytes=1024)
+    recorder.output(b"caf\xc3")
+    recorder.output(b"\xa9")
+
+    recorder.finish(recorder.take())
+
+    assert [data for _, _, data in events(recorder.path)[1:]] == ["caf", "é"]
+
+
+def test_output_over_the_cap_ends_the_recording_with_a_notice(tmp_path):
+    recorder = SessionRecorder("s", str(tmp_path / "s.cast.gz"), max_bytes=16)
+    recorder.output(b"0123456789")
+    recorder.output(b"abcdefghij")  # Would take the queue past 16 bytes
+    recorder.output(b"ignored")
+
+    recorder.finish(recorder.take())
+
+    assert recorder.stopped
+    assert [data for _, _, data in events(recorder.path)[1:]] == ["0123456789", TRUNCATED_NOTICE]
+
+
+def test_file_reaching_the_cap_ends_the_recording_with_a_notice(tmp_path):
+    recorder = SessionRecorder("s", str(tmp_path / "s.cast.gz"), max_bytes=2048)
+    for _ in range(64):
+        recorder.output(os.urandom(512).hex().encode()[:1024])
+        recorder.write(recorder.take())
+        if recorder.stopped:
+            break
+    recorder.output(b"ignored")
+
+    recorder.finish(recorder.take())
+
+    assert recorder.stopped
+    recorded = events(recorder.path)
+    assert recorded[-1][2] == TRUNCATED_NOTICE
+    assert sum(1 for event in recorded[1:] if event[2] == TRUNCATED_NOTICE) == 1
+    assert len(recorded) < 64  # stopped well before running out of output
+    # The write that crossed the cap, then the one that found it crossed and ended it
+    assert os.path.getsize(recorder.path) < 2048 + 2 * 1024
+
+
+async def test_playback_gzipped_or_inflated(writer):
+    recorder = writer.open("session-2")
+    recorder.output(b"hello\r\n")
+    writer.finish(recorder)
+    await writer.close()
+
+    with open(recorder.path, "rb") as f:
+        stored = f.read()
+    compressed = b"".join(writer.playback("session-2", decompress=False))
+    inflated = b"".join(writer.playback("session-2", decompress=True))
+
+    assert compressed == stored
+    assert inflated == gzip.decompress(stored)
+    assert inflated.decode().splitlines()[1].endswith('"o", "hello\\r\\n"]')
+
+
+def test_playback_of_a_missing_recording_is_none(tmp_path):
+    writer = RecordingWriter("disk", str(tmp_path), max_bytes=1024)
+
+    assert writer.playback("missing", decompress=True) is None
+
+
+def test_recording_off_opens_nothing(tmp_path):
+    writer = RecordingWriter("off", str(tmp_path), max_bytes=1024)
+
+    assert writer.open("session") is None
+    with pytest.raises(ValueError):
+        RecordingWriter("tape", str(tmp_path), max_bytes=1024)
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from session_store import SessionStore
+
+
+def in_minutes(minutes: int) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+
+async def test_lifecycle_is_written_behind(db):
+    store = SessionStore()
+    store.start()
+    try:
+        await store.created("store-session", "store-token", in_minutes(5), "worker-a", "http://a")
+        assert await store.lookup_owner("store-token") == ("worker-a", "http://a")
+
+        store.deactivated("store-token")
+        await store.close()
+        assert await store.lookup_owner("store-token") is None
+    finally:
+        await store.close()
+
+
+async def test_failed_write_fails_the_created_future(db, monkeypatch):
+    store = SessionStore()
+
+    async def fail(operations):
+        raise ConnectionError("database unreachable")
+    monkeypatch.setattr(store, "_write", fail)
+    store.start()
+    try:
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(store.created("s", "t", in_minutes(5), "worker-a"), timeout=1)
+    finally:
+        await store.close()
+
+
+def fail_writes(store, monkeypatch, times: int):
+    """Make the next `times` batch writes fail; returns the batches attempted."""
+    write = store._write
+    batches = []
+
+    async def flaky(operations):
+        batches.append(list(operations))
+        if len(batches) <= times:
+            raise ConnectionError("database unreachable")
+        await write(operations)
+    monkeypatch.setattr(store, "_write", flaky)
+    return batches
+
+
+async def test_failed_updates_are_retried_before_newer_ones(db, monkeypatch):
+    store = SessionStore(retry_seconds=0.01)
+    store.start()
+    try:
+        await store.created("retry-session", "retry-token", in_minutes(5), "worker-a")
+        batches = fail_writes(store, monkeypatch, times=2)
+
+        store.extended("retry-token", in_minutes(1))
+        for _ in range(100):
+            if len(batches) > 1:
+                break
+            await asyncio.sleep(0.01)
+        store.deactivated("retry-token")
+        await store.close()
+
+        assert [type(op).__name__ for op in batches[0]] == ["ExtendSession"]
+        assert [type(op).__name__ for op in batches[-1]] == ["ExtendSession", "DeactivateSessions"]
+        assert await store.lookup_owner("retry-token") is None
+    finally:
+        await store.close()
+
+
+async def test_updates_are_dropped_and_counted_after_max_attempts(db, monkeypatch):
+    from metrics import registry
+
+    dropped = registry.counter("terminal.store.dropped_updates")
+    before = dropped.value
+    store = SessionStore(max_attempts=3, retry_seconds=0.01)
+    store.start()
+    try:
+        await store.created("drop-session", "drop-token", in_minutes(5), "worker-a")
+        batches = fail_writes(store, monkeypatch, times=3)
+
+        store.deactivated("drop-token")
+        for _ in range(100):
+            if dropped.value > before:
+                break
+            await asyncio.sleep(0.01)
+
+        assert len(batches) == 3
+        assert dropped.value == before + 1
+        # The writer carries on with what comes next
+        await store.created("next-session", "next-token", in_minutes(5), "worker-b")
+        assert await store.lookup_owner("next-token") == ("worker-b", None)
+    finally:
+        await store.close()
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from asset_manifest import MANIFEST_NAME, hash_file
+from sync_assets import ASSET_CACHE_CONTROL, sync
+
+BUCKET = "site-assets"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """A moto S3 with an empty bucket."""
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def assets(tmp_path):
+    root = tmp_path / "public"
+    (root / "models").mkdir(parents=True)
+    (root / "door.glb").write_bytes(b"glTF door")
+    (root / "models" / "desk.glb").write_bytes(b"glTF desk")
+    (root / "notes.txt").write_text("hello")
+    return root
+
+
+def keys(s3, prefix="desk"):
+    response = s3.list_objects_v2(Bucket=BUCKET, Prefix=f"{prefix}/")
+    return sorted(obj["Key"] for obj in response.get("Contents", []))
+
+
+def test_first_sync_uploads_everything_with_metadata(s3, assets):
+    result = sync(s3, BUCKET, str(assets), "desk")
+
+    assert sorted(result.uploaded) == ["door.glb", "models/desk.glb", "notes.txt"]
+    assert keys(s3) == ["desk/door.glb", f"desk/{MANIFEST_NAME}", "desk/models/desk.glb", "desk/notes.txt"]
+    head = s3.head_object(Bucket=BUCKET, Key="desk/door.glb")
+    assert head["ContentType"] == "model/gltf-binary"
+    assert head["CacheControl"] == ASSET_CACHE_CONTROL
+    assert head["Metadata"]["sha256"] == hash_file(str(assets / "door.glb"))
+    manifest = json.loads(s3.get_object(Bucket=BUCKET, Key=f"desk/{MANIFEST_NAME}")["Body"].read())
+    assert manifest["assets"]["door.glb"]["sha256"] == head["Metadata"]["sha256"]
+
+
+def test_only_changed_files_are_uploaded_again(s3, assets):
+    sync(s3, BUCKET, str(assets), "desk")
+    (assets / "door.glb").write_bytes(b"glTF door, repainted")
+
+    result = sync(s3, BUCKET, str(assets), "desk")
+
+    assert result.uploaded == ["door.glb"]
+    assert sorted(result.unchanged) == ["models/desk.glb", "notes.txt"]
+    assert s3.get_object(Bucket=BUCKET, Key="desk/door.glb")["Body"].read() == b"glTF door, repainted"
+
+
+def test_file_missing_from_the_bucket_is_uploaded_again(s3, assets):
+    sync(s3, BUCKET, str(assets), "desk")
+    s3.delete_object(Bucket=BUCKET, Key="desk/notes.txt")
+
+    result = sync(s3, BUCKET, str(assets), "desk")
+
+    assert result.uploaded == ["notes.txt"]
+
+
+def test_keys_not_in_the_local_tree_are_pruned(s3, assets):
+    # Left behind by an older sync that published no manifest
+    s3.put_object(Bucket=BUCKET, Key="desk/old/chair.glb", Body=b"glTF chair")
+    s3.put_object(Bucket=BUCKET, Key="blog/post.md", Body=b"# other prefix")
+    sync(s3, BUCKET, str(assets), "desk")
+    (assets / "notes.txt").unlink()
+
+    result = sync(s3, BUCKET, str(assets), "desk")
+
+    assert result.deleted == ["notes.txt"]
+    assert keys(s3) == ["desk/door.glb", f"desk/{MANIFEST_NAME}", "desk/models/desk.glb"]
+    assert keys(s3, "blog") == ["blog/post.md"]
+
+
+def test_first_sync_prunes_stray_keys(s3, assets):
+    s3.put_object(Bucket=BUCKET, Key="desk/old/chair.glb", Body=b"glTF chair")
+
+    result = sync(s3, BUCKET, str(assets), "desk")
+
+    assert result.deleted == ["old/chair.glb"]
+
+
+def test_no_prune_keeps_stray_keys(s3, assets):
+    s3.put_object(Bucket=BUCKET, Key="desk/old/chair.glb", Body=b"glTF chair")
+
+    result = sync(s3, BUCKET, str(assets), "desk", prune=False)
+
+    assert result.deleted == []
+    assert "desk/old/chair.glb" in keys(s3)
+
+
+def test_corrupt_manifest_uploads_everything_and_still_prunes(s3, assets):
+    sync(s3, BUCKET, str(assets), "desk")
+    s3.put_object(Bucket=BUCKET, Key=f"desk/{MANIFEST_NAME}", Body=b"{not json")
+    (assets / "notes.txt").unlink()
+
+    result = sync(s3, BUCKET, str(assets), "desk")
+
+    assert sorted(result.uploaded) == ["door.glb", "models/desk.glb"]
+    assert result.deleted == ["notes.txt"]
+    manifest = json.loads(s3.get_object(Bucket=BUCKET, Key=f"desk/{MANIFEST_NAME}")["Body"].read())
+    assert sorted(manifest["assets"]) == ["door.glb", "models/desk.glb"]
+
+
+def test_dry_run_changes_nothing(s3, assets):
+    s3.put_object(Bucket=BUCKET, Key="desk/old/chair.glb", Body=b"glTF chair")
+
+    result = sync(s3, BUCKET, str(assets), "desk", dry_run=True)
+
+    assert sorted(result.uploaded) == ["door.glb", "models/desk.glb", "notes.txt"]
+    assert result.deleted == ["old/chair.glb"]
+    assert keys(s3) == ["desk/old/chair.glb"]
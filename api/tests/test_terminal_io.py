@@ -0,0 +1,280 @@
+import asyncio
+import threading
+
+import pytest
+
+from terminal_io import (
+    REFRESH_PREFIX,
+    TRUNCATION_MARKER,
+    InputPipeline,
+    OutputBridge,
+    OutputBudget,
+    ScrollbackBuffer,
+    output_sender,
+)
+
+
+class RecordingPty:
+    """write/resize for an InputPipeline; the first write blocks until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+        self.done = asyncio.Event()
+
+    async def write(self, data: bytes) -> None:
+        first = not self.calls
+        self.calls.append(("write", data))
+        if first:
+            await self.release.wait()
+        if data.endswith(b"\n"):
+            self.done.set()
+
+    async def resize(self, rows: int, cols: int) -> None:
+        self.calls.append(("resize", (rows, cols)))
+
+
+def pipeline(pty: RecordingPty) -> InputPipeline:
+    def on_error(what, error):
+        raise AssertionError(f"{what} failed: {error}")
+    return InputPipeline(pty.write, pty.resize, on_error, coalesce_interval=0)
+
+
+async def drain(pty: RecordingPty) -> None:
+    await asyncio.sleep(0)
+    pty.release.set()
+    await asyncio.wait_for(pty.done.wait(), 1)
+
+
+async def test_resize_waits_for_the_input_queued_before_it():
+    pty = RecordingPty()
+    pipe = pipeline(pty)
+    pipe.send(b"x")
+    await asyncio.sleep(0)  # the first write is now blocked
+
+    pipe.send(b"before")
+    pipe.resize(40, 120)
+    pipe.send(b"after\n")
+    await drain(pty)
+
+    assert pty.calls == [
+        ("write", b"x"),
+        ("write", b"before"),
+        ("resize", (40, 120)),
+        ("write", b"after\n"),
+    ]
+
+
+async def test_latest_of_several_resizes_is_applied_in_its_own_place():
+    pty = RecordingPty()
+    pipe = pipeline(pty)
+    pipe.send(b"x")
+    await asyncio.sleep(0)
+
+    pipe.send(b"a")
+    pipe.resize(30, 90)
+    pipe.send(b"b")
+    pipe.resize(40, 120)
+    pipe.send(b"c\n")
+    await drain(pty)
+
+    assert pty.calls == [
+        ("write", b"x"),
+        ("write", b"ab"),
+        ("resize", (40, 120)),
+        ("write", b"c\n"),
+    ]
+
+
+async def test_resize_with_nothing_queued_is_applied_at_once():
+    pty = RecordingPty()
+    pipe = pipeline(pty)
+    pty.release.set()
+
+    pipe.resize(40, 120)
+    pipe.send(b"ls\n")
+    await asyncio.wait_for(pty.done.wait(), 1)
+
+    assert pty.calls == [("resize", (40, 120)), ("write", b"ls\n")]
+
+
+def bridge(overflow: str, limit: int = 8, budget: int = 1024) -> OutputBridge:
+    return OutputBridge(limit=limit, overflow=overflow, budget=OutputBudget(budget))
+
+
+async def drained(output: OutputBridge) -> bytes:
+    return b"".join(output.get_ready(1 << 20))
+
+
+async def test_pause_holds_the_producer_until_the_consumer_makes_room():
+    output = bridge("pause")
+
+    assert output.put(b"1234") is None
+    waiter = asyncio.ensure_future(output.put(b"5678"))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    assert await output.get() == b"1234"
+    await asyncio.wait_for(waiter, 1)
+    assert await drained(output) == b"5678"
+
+
+async def test_pause_also_waits_on_the_global_budget():
+    budget = OutputBudget(8)
+    first, second = (OutputBridge(limit=1024, overflow="pause", budget=budget) for _ in range(2))
+    first.put(b"12345678").close()  # the producer that filled the budget
+
+    waiter = asyncio.ensure_future(second.put(b"x"))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    await first.get()
+    await asyncio.wait_for(waiter, 1)
+
+
+async def test_output_from_another_thread_is_dropped_instead_of_paused():
+    output = bridge("pause")
+    output.put(b"12345678").close()
+
+    thread = threading.Thread(target=output.put, args=(b"lost",))
+    thread.start()
+    thread.join()
+    await asyncio.sleep(0.01)
+
+    assert await drained(output) == b"12345678"
+    output.put(b"next").close()  # the marker alone fills the buffer
+    assert await drained(output) == TRUNCATION_MARKER.format(4).encode() + b"next"
+
+
+async def test_drop_discards_overflow_and_marks_the_gap():
+    output = bridge("drop")
+
+    assert output.put(b"12345678") is None
+    assert output.put(b"lost") is None
+    assert output.put(b"more") is None
+    assert await drained(output) == b"12345678"
+
+    output.put(b"after")
+    assert await drained(output) == TRUNCATION_MARKER.format(8).encode() + b"after"
+
+
+async def test_refresh_keeps_only_the_last_lines():
+    output = bridge("refresh", limit=32)
+    output.put(b"line one\nline two\nline three\nline four\n")
+    output.put(b"five\n")
+
+    assert await drained(output) == REFRESH_PREFIX + b"five\n"
+
+
+async def test_closed_bridge_releases_its_budget():
+    budget = OutputBudget(1024)
+    output = OutputBridge(limit=8, overflow="pause", budget=budget)
+    waiter = asyncio.ensure_future(output.put(b"12345678"))
+
+    output.close()
+
+    await asyncio.wait_for(waiter, 1)
+    assert budget.used == 0
+    assert output.put(b"ignored") is None
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        OutputBridge(overflow="block", budget=OutputBudget(1))
+
+
+def test_scrollback_wraps_around_its_ring():
+    scrollback = ScrollbackBuffer(capacity=8)
+    scrollback.write(b"abcdef")
+    scrollback.write(b"ghij")
+
+    assert (scrollback.start, scrollback.end) == (2, 10)
+    assert scrollback.read_since(0) == b"cdefghij"
+    assert scrollback.read_since(5) == b"fghij"
+    assert scrollback.read_since(10) == b""
+
+
+def test_scrollback_keeps_the_tail_of_a_write_larger_than_itself():
+    scrollback = ScrollbackBuffer(capacity=4)
+    scrollback.write(b"ab")
+    scrollback.write(b"0123456789")
+
+    assert scrollback.end == 12
+    assert scrollback.read_since(0) == b"6789"
+
+
+def test_scrollback_of_zero_bytes_only_counts():
+    scrollback = ScrollbackBuffer(capacity=0)
+    scrollback.write(b"abc")
+
+    assert scrollback.end == 3
+    assert scrollback.read_since(0) == b""
+
+
+async def started_session(manager, capacity: int):
+    token = (await manager.start_session())["session_token"]
+    session = manager.sessions[token]
+    session.scrollback = ScrollbackBuffer(capacity)
+    return token, session
+
+
+async def test_reconnect_replays_output_since_its_offset(fake_backend, manager):
+    token, session = await started_session(manager, capacity=64)
+    first = []
+    start, replay = manager.attach_output(token, first.append, 0)
+    manager._handle_pty_output(session, b"$ ls\r\n")
+    manager.detach_output(token, first.append)
+    manager._handle_pty_output(session, b"notes.txt\r\n")
+
+    start, replay = manager.attach_output(token, lambda data: None, len(b"$ ls\r\n"))
+
+    assert (start, replay) == (6, b"notes.txt\r\n")
+    assert first == [b"$ ls\r\n"]
+
+
+async def test_reconnect_after_the_ring_wrapped_skips_a_split_character(fake_backend, manager):
+    token, session = await started_session(manager, capacity=8)
+    manager._handle_pty_output(session, b"abcd")
+    manager._handle_pty_output(session, "\u00e9t\u00e9!!!!".encode())  # é is 2 bytes
+
+    # The ring holds the last 8 bytes, starting inside the first "é"
+    start, replay = manager.attach_output(token, lambda data: None, 0)
+
+    assert replay == "t\u00e9!!!!".encode()
+    assert start == session.scrollback.end - len(replay)
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, message):
+        self.frames.append(message)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+
+async def test_json_clients_get_characters_split_across_reads_whole():
+    websocket = RecordingWebSocket()
+    send = output_sender(websocket, binary=False)
+
+    await send(b"caf\xc3")
+    await send(b"\xa9 \xe2\x82")
+    await send(b"\xac")
+
+    assert websocket.frames == [
+        {"type": "output", "data": "caf"},
+        {"type": "output", "data": "\u00e9 "},
+        {"type": "output", "data": "\u20ac"},
+    ]
+
+
+async def test_binary_clients_get_the_bytes_as_they_are():
+    websocket = RecordingWebSocket()
+    send = output_sender(websocket, binary=True)
+
+    await send(b"caf\xc3")
+    await send(b"\xa9")
+
+    assert websocket.frames == [b"caf\xc3", b"\xa9"]
@@ -0,0 +1,110 @@
+"""The terminal WebSocket against a real server, on the local sandbox backend."""
+
+import asyncio
+import json
+import socket
+import time
+
+import httpx
+import pytest
+import uvicorn
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+from config import settings
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+async def server(db, monkeypatch):
+    """The app served by uvicorn in this loop, with heartbeats in tenths of a second."""
+    monkeypatch.setattr(settings, "terminal_heartbeat_interval_seconds", 0.1)
+    monkeypatch.setattr(settings, "terminal_heartbeat_timeout_seconds", 0.3)
+    monkeypatch.setattr(settings, "terminal_detach_grace_seconds", 1.0)
+    from main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    yield f"127.0.0.1:{port}"
+    server.should_exit = True
+    await task
+
+
+async def receive(ws, kind: str, timeout: float = 5.0) -> dict:
+    """Next JSON message of type `kind`, skipping output and pings."""
+    deadline = time.monotonic() + timeout
+    while True:
+        message = await asyncio.wait_for(ws.recv(), timeout=deadline - time.monotonic())
+        if isinstance(message, str):
+            message = json.loads(message)
+            if message.get("type") == kind:
+                return message
+
+
+async def test_stalled_client_is_detached_and_can_reattach_within_the_grace(server):
+    from main import session_manager
+
+    async with httpx.AsyncClient(base_url=f"http://{server}") as http:
+        token = (await http.post("/api/terminal/session/start")).json()["session_token"]
+    session = session_manager.sessions[token]
+    url = f"ws://{server}/api/terminal/ws/{token}"
+
+    # Answer one ping, then go quiet without closing the connection
+    async with connect(url) as ws:
+        await receive(ws, "attached")
+        ping = await receive(ws, "ping")
+        await ws.send(json.dumps({"type": "pong", "id": ping["id"]}))
+        stalled_at = time.monotonic()
+        with pytest.raises(ConnectionClosed):
+            while True:
+                await asyncio.wait_for(ws.recv(), timeout=5)
+        assert ws.close_code == 4002
+        assert 0.3 <= time.monotonic() - stalled_at < 2
+
+    # Detached, not torn down: the same session takes a new connection
+    assert session_manager.sessions.get(token) is session
+    async with connect(url) as ws:
+        await receive(ws, "attached")
+        await ws.send(json.dumps({"type": "input", "data": "echo reattached-$((6*7))\r"}))
+        output = b""
+        while b"reattached-42" not in output:
+            message = await asyncio.wait_for(ws.recv(), timeout=5)
+            if isinstance(message, str) and json.loads(message).get("type") == "output":
+                output += json.loads(message)["data"].encode()
+
+    # Gone for longer than the grace: the session and its sandbox are killed
+    await asyncio.sleep(settings.terminal_detach_grace_seconds + 0.5)
+    assert token not in session_manager.sessions
+    assert session.sandbox._killed
+    async with connect(url) as ws:
+        assert (await receive(ws, "error"))["message"] == "Session not found or expired"
+        with pytest.raises(ConnectionClosed):
+            await ws.recv()
+        assert ws.close_code == 4001
+
+
+async def test_client_that_never_answers_pings_is_detached(server):
+    from main import session_manager
+
+    async with httpx.AsyncClient(base_url=f"http://{server}") as http:
+        token = (await http.post("/api/terminal/session/start")).json()["session_token"]
+
+    async with connect(f"ws://{server}/api/terminal/ws/{token}") as ws:
+        connected_at = time.monotonic()
+        with pytest.raises(ConnectionClosed):
+            while True:
+                await asyncio.wait_for(ws.recv(), timeout=5)
+        assert ws.close_code == 4002
+        # First ping after 0.1 s, then 0.3 s without an answer
+        assert 0.4 <= time.monotonic() - connected_at < 2
+
+    assert token in session_manager.sessions
+    await session_manager.close_session(token)
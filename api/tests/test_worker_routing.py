@@ -0,0 +1,128 @@
+"""Two API processes sharing one database: requests reach the session's owner.
+
+Both workers run on the local sandbox backend and share a SQLite file, so
+the session started on worker A is only found on worker B through its row.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from websockets.asyncio.client import connect
+
+import models
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_worker(port: int, database_url: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "WORKER_URL": f"http://127.0.0.1:{port}",
+        "SANDBOX_BACKEND": "local",
+        "SANDBOX_POOL_MIN_SIZE": "0",
+        "SANDBOX_POOL_MAX_SIZE": "0",
+        "METRICS_ACCESS_TOKEN": "metrics-token",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=API_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"worker at {url} exited with {process.returncode}")
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"worker at {url} did not start")
+
+
+@pytest.fixture
+async def workers(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'shared.db'}"
+    models.Base.metadata.create_all(create_engine(database_url))
+    ports = [free_port(), free_port()]
+    processes = [start_worker(port, database_url) for port in ports]
+    try:
+        urls = [f"http://127.0.0.1:{port}" for port in ports]
+        for url, process in zip(urls, processes):
+            await wait_until_up(url, process)
+        yield urls
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def test_requests_on_another_worker_reach_the_owner(workers):
+    owner, other = workers
+    async with httpx.AsyncClient(timeout=10) as http:
+        token = (await http.post(f"{owner}/api/terminal/session/start")).json()["session_token"]
+
+        # Execute, through the worker without the session
+        response = await http.post(
+            f"{other}/api/terminal/session/execute",
+            json={"session_token": token, "command": "echo routed-$((6*7))"},
+        )
+        assert response.status_code == 200
+        assert response.json()["output"].strip() == "routed-42"
+
+        async with http.stream(
+            "POST", f"{other}/api/terminal/session/execute/stream",
+            json={"session_token": token, "command": "echo streamed"},
+        ) as stream:
+            frames = [json.loads(line) async for line in stream.aiter_lines() if line]
+        assert {"type": "stdout", "data": "streamed\n"} in frames
+        assert frames[-1] == {"type": "exit", "exit_code": 0}
+
+        # WebSocket, relayed to the owner's PTY
+        async with connect(f"{other.replace('http', 'ws')}/api/terminal/ws/{token}") as ws:
+            output = ""
+            await ws.send(json.dumps({"type": "input", "data": "echo relayed-$((6*7))\r"}))
+            while "relayed-42" not in output:
+                message = json.loads(await asyncio.wait_for(ws.recv(), timeout=10))
+                if message.get("type") == "output":
+                    output += message["data"]
+
+        # End, through the other worker: the owner closes the session
+        response = await http.request("DELETE", f"{other}/api/terminal/session/end", json={"session_token": token})
+        assert response.status_code == 200
+        response = await http.post(
+            f"{owner}/api/terminal/session/execute", json={"session_token": token, "command": "true"},
+        )
+        assert response.status_code == 400
+
+        metrics = (await http.get(
+            f"{other}/api/metrics", headers={"Authorization": "Bearer metrics-token"},
+        )).json()
+        assert metrics["counters"]["terminal.routing.forwarded_requests"] == 3
+        assert metrics["counters"]["terminal.routing.forwarded_websockets"] == 1
@@ -7,6 +7,8 @@ const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 const WS_BASE = API_BASE.replace(/^http/, 'ws')
 const SESSION_TOKEN_KEY = 'terminal_session_token'
 const SESSION_EXPIRY_KEY = 'terminal_session_expiry'
+// Server sends PTY output as binary frames when this subprotocol is negotiated
+const BINARY_SUBPROTOCOL = 'terminal.v2'
 
 interface SessionResponse {
     session_token: string
@@ -14,6 +16,13 @@ interface SessionResponse {
     expires_in: number
 }
 
+interface QueuedResponse {
+    status: 'queued'
+    ticket: string
+    position: number
+    retry_after: number
+}
+
 type OutputCallback = (data: string) => void
 
 export class TerminalSession {
@@ -27,6 +36,10 @@ export class TerminalSession {
     private isCreatingSession = false
     private sessionPromise: Promise<boolean> | null = null
     private pendingInput: string[] = []
+    private outputDecoder = new TextDecoder()
+    private outputEncoder = new TextEncoder()
+    // Byte offset into the session's output stream, used to resume after a reconnect
+    private outputOffset = 0
 
     constructor() {
         this.loadFromStorage()
@@ -105,12 +118,27 @@ export class TerminalSession {
     private async _createSession(): Promise<boolean> {
         try {
             console.log('Creating new terminal session...')
-            const response = await fetch(`${API_BASE}/api/terminal/session/start`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-            })
+            let ticket: string | null = null
+            let response: Response
+            // All terminals busy: wait our turn in the server's queue
+            while (true) {
+                response = await fetch(`${API_BASE}/api/terminal/session/start`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ ticket }),
+                })
+                if (response.status !== 202) break
+
+                const queued: QueuedResponse = await response.json()
+                ticket = queued.ticket
+                this.notifyOutput(`\r\x1b[KAll terminals are busy. You are number ${queued.position} in line...`)
+                await new Promise(resolve => setTimeout(resolve, queued.retry_after * 1000))
+            }
+            if (ticket) {
+                this.notifyOutput('\r\n')
+            }
 
             if (!response.ok) {
                 throw new Error(`Failed to start session: ${response.statusText}`)
@@ -121,6 +149,7 @@ export class TerminalSession {
             this.expiresAt = new Date(data.expires_at)
             this.saveToStorage()
             this.reconnectAttempts = 0
+            this.outputOffset = 0
 
             console.log('Session created, connecting WebSocket...')
             // Connect WebSocket
@@ -157,10 +186,12 @@ export class TerminalSession {
                 this.ws = null
             }
 
-            const wsUrl = `${WS_BASE}/api/terminal/ws/${this.token}`
+            const wsUrl = `${WS_BASE}/api/terminal/ws/${this.token}?since=${this.outputOffset}`
             console.log('Connecting to WebSocket:', wsUrl)
 
-            this.ws = new WebSocket(wsUrl)
+            this.ws = new WebSocket(wsUrl, [BINARY_SUBPROTOCOL])
+            this.outputDecoder = new TextDecoder()
+            this.ws.binaryType = 'arraybuffer'
 
             this.ws.onopen = () => {
                 console.log('WebSocket connected')
@@ -177,10 +208,23 @@ export class TerminalSession {
             }
 
             this.ws.onmessage = (event) => {
+                if (event.data instanceof ArrayBuffer) {
+                    // Binary frames are raw PTY output; a character may be split across frames
+                    this.outputOffset += event.data.byteLength
+                    this.notifyOutput(this.outputDecoder.decode(event.data, { stream: true }))
+                    return
+                }
                 try {
                     const message = JSON.parse(event.data)
                     if (message.type === 'output') {
+                        this.outputOffset += this.outputEncoder.encode(message.data).length
                         this.notifyOutput(message.data)
+                    } else if (message.type === 'ping') {
+                        // Heartbeat: answer so the server knows we're still here
+                        this.ws?.send(JSON.stringify({ type: 'pong', id: message.id }))
+                    } else if (message.type === 'attached') {
+                        // Output replayed from the server's scrollback starts here
+                        this.outputOffset = message.offset
                     } else if (message.type === 'error') {
                         console.error('Terminal error:', message.message)
                         this.notifyOutput(`\r\nError: ${message.message}\r\n`)
@@ -321,6 +365,7 @@ export class TerminalSession {
         this.expiresAt = null
         this.reconnectAttempts = 0
         this.pendingInput = []
+        this.outputOffset = 0
         localStorage.removeItem(SESSION_TOKEN_KEY)
         localStorage.removeItem(SESSION_EXPIRY_KEY)
         if (this.ws) {